@@ -0,0 +1,1646 @@
+import sys
+import os
+import json
+import subprocess
+import tempfile
+import time
+import random
+import platform
+import wave
+import pickle
+import difflib
+from string                         import punctuation
+from collections                    import Counter
+from heapq                          import nlargest
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))   # so the child processes can import the scripts
+
+FIXTURES = os.path.join(tempfile.gettempdir(), "youtube-summarizer-fixtures")  # generated once and reused by the suite
+AUDIO_LENGTHS = (30, 120, 600)          # seconds of synthetic audio the suite transcribes
+TRANSCRIPT_SIZES = (100, 1000, 10000)   # sentences of synthetic text the suite punctuates and summarizes
+REGRESSION_THRESHOLD = 0.10             # a metric more than 10% worse than the baseline is a regression
+REPEATS = 5                             # times every measurement of the suite is taken, the best one is kept
+NOISE_FLOOR = {"seconds": 0.02, "rtf": 0.005, "peak_rss_kb": 16 * 1024}    # changes this small are never a regression
+WHOLE_SIMILARITY = 0.95                 # the share of words the pieces of transcribe_segments must share with the whole file
+
+# the libraries every kind of run ends up needing, used to start each kind of run without doing any real work
+STARTUP_SCENARIOS = {
+    "download": ["pytube"],
+    "transcribe": ["pytube", "pydub", "vosk"],
+    "summary": ["pytube", "pydub", "vosk", "deepmultilingualpunctuation", "spacy", "spacy.lang.en.stop_words"],
+}
+
+
+def make_audio(filename: str, seconds: int, frequency: int = 440) -> str:
+    """
+    Generates a synthetic .mp3 file (a sine tone) with ffmpeg so the checks never need to download anything.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the .mp3 file that will be created.
+    seconds: int
+        The length of the audio in seconds.
+    frequency: int
+        The frequency of the tone in Hz.
+
+    Returns
+    -------
+    str
+        The name of the file that was created.
+    """
+    command = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"sine=frequency={frequency}:duration={seconds}:sample_rate=44100",
+        "-ac", "2", "-b:a", "64k", filename,
+    ]
+    subprocess.run(command, check=True)
+
+    return filename
+
+
+def make_speech_audio(filename: str, seconds: int, seed: int = 0) -> str:
+    """
+    Generates a synthetic 16 kHz mono .wav file that stands in for a talk: a silent intro, then bursts of 
+    sound (a tone with a syllable-like rhythm) between pauses of silence, so the voice-activity detection has 
+    something to skip. It is written with the wave module, ffmpeg is not needed.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the .wav file that will be created.
+    seconds: int
+        The length of the audio in seconds.
+    seed: int
+        The seed of the random generator that picks the length of the bursts and pauses.
+
+    Returns
+    -------
+    str
+        The name of the file that was created.
+    """
+    import numpy as np
+
+    rate = 16000
+    generator = random.Random(seed)
+    audio = np.zeros(seconds * rate)
+    position = int(min(20, seconds / 6) * rate)     # the intro
+
+    while position < len(audio):
+        length = int(generator.uniform(2, 8) * rate)
+        t = np.arange(min(length, len(audio) - position)) / rate
+        audio[position:(position+len(t))] = 0.3 * np.sin(2 * np.pi * 220 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+        position += length + int(generator.uniform(0.5, 4) * rate)
+
+    with wave.open(filename, "wb") as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(rate)
+        file.writeframes((audio * 32767).astype("<i2").tobytes())
+
+    return filename
+
+
+def make_spoken_audio(filename: str, seconds: int, seed: int = 0) -> str:
+    """
+    Generates a .wav file of real speech by reading a synthetic transcript (see make_transcript) out loud with 
+    espeak-ng (or espeak), so a transcription of it is not empty like the one of a tone.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the .wav file that will be created.
+    seconds: int
+        About how long the speech should be, in seconds.
+    seed: int
+        The seed of the transcript that is read.
+
+    Returns
+    -------
+    str
+        The name of the file that was created.
+    """
+    import shutil
+
+    program = shutil.which("espeak-ng") or shutil.which("espeak")
+
+    if program is None:
+        raise FileNotFoundError("espeak-ng is not installed")
+
+    # a sentence takes about 4 seconds to say
+    text = make_transcript(max(1, seconds // 4), seed=seed)
+    subprocess.run([program, "-w", filename, text], check=True, capture_output=True)
+
+    return filename
+
+
+def audio_seconds(filename: str) -> float:
+    """
+    Returns the length of an audio file in seconds, read with ffprobe.
+    """
+    command = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", filename]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+
+    return float(result.stdout.strip())
+
+
+def peak_rss(code: str) -> int:
+    """
+    Runs a piece of Python code in a fresh interpreter and returns the peak resident memory it reached.
+
+    Parameters
+    ----------
+    code: str
+        The code to run, it is run from the folder of this script so it may import the other scripts.
+
+    Returns
+    -------
+    int
+        The peak resident set size of the child in kilobytes.
+    """
+    script = code + "\nimport resource\nprint(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True, cwd=HERE)
+
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+def skipped(reason: str) -> dict:
+    """
+    Prints and returns the result of a check that could not run here (e.g. ffmpeg or Vosk is not installed): 
+    it neither passed nor failed, so "passed" is None.
+    """
+    results = {"status": "skipped", "skipped": reason, "passed": None}
+    print(json.dumps(results))
+
+    return results
+
+
+def check_stream_memory(short: int = 600, long: int = 10800, tolerance: int = 32, transcribe: bool = True) -> dict:
+    """
+    Checks that streaming transcription (mp3_to_text with stream=True) keeps a flat memory profile by comparing 
+    the peak RSS of a short and a long synthetic file.
+
+    Parameters
+    ----------
+    short: int
+        The length of the short file in seconds (10 minutes by default).
+    long: int
+        The length of the long file in seconds (3 hours by default).
+    tolerance: int
+        How many megabytes more the long file may use than the short one.
+    transcribe: bool
+        Set it to false to only measure the decoding, e.g. where the Vosk model is not installed.
+
+    Returns
+    -------
+    dict
+        The growth in MB and whether the check passed, or why it was skipped.
+    """
+    import shutil
+    import youtube_summarizer as ys
+
+    if shutil.which("ffmpeg") is None:
+        return skipped("ffmpeg is not installed")
+
+    if transcribe:
+        try:
+            ys.models.get()
+        except SystemExit:
+            return skipped("the Vosk model is not installed, use --decode-only")
+
+    peaks = {}
+
+    with tempfile.TemporaryDirectory() as folder:
+        for seconds in (short, long):
+            filename = make_audio(os.path.join(folder, f"synthetic_{seconds}.mp3"), seconds)
+
+            if transcribe:
+                code = f"import youtube_summarizer as ys\nys.mp3_to_text({filename!r}, stream=True, use_cache=False)"
+            else:
+                code = f"import youtube_summarizer as ys\nfor block in ys.stream_pcm({filename!r}): pass"
+
+            peaks[seconds] = peak_rss(code)
+            print(f"{seconds:>6} seconds of audio -> peak RSS {peaks[seconds] / 1024:.1f} MB")
+
+    growth = (peaks[long] - peaks[short]) / 1024
+    results = {"check": "stream_memory", "growth_mb": round(growth, 1), "passed": growth <= tolerance}
+
+    print(json.dumps(results))
+    return results
+
+
+def benchmark_workers(filename: str = None, counts: tuple = (1, 2, 4), seconds: int = 600) -> dict:
+    """
+    Measures the real-time factor (processing time / audio length, lower is faster) of transcribe_segments for 
+    different numbers of workers, checks that every count gives the same transcript as the serial run and that 
+    the pieces joined together give nearly the same words as mp3_to_text streaming the whole file. It needs 
+    speech for that, a tone gives no words and every check would pass. Both read the same PCM file (decoded 
+    once, not timed), so only the cuts between the pieces can change words, WHOLE_SIMILARITY allows for that.
+
+    Parameters
+    ----------
+    filename: str
+        The audio file with speech to transcribe, by default `seconds` seconds are spoken with make_spoken_audio.
+    counts: tuple
+        The numbers of workers to try.
+    seconds: int
+        The length of the spoken file.
+
+    Returns
+    -------
+    dict
+        The real-time factor for every worker count, how similar the words are to the whole-file transcript (see 
+        difflib.SequenceMatcher) and whether the transcripts matched, or why it was skipped.
+    """
+    import youtube_summarizer as ys
+
+    try:
+        ys.models.get()
+    except SystemExit:
+        return skipped("the Vosk model is not installed")
+
+    with tempfile.TemporaryDirectory() as folder:
+        if filename is None:
+            try:
+                filename = make_spoken_audio(os.path.join(folder, "speech.wav"), seconds)
+            except FileNotFoundError:
+                return skipped("espeak-ng is not installed, give a file with speech instead")
+
+        length = audio_seconds(filename)
+        pcm = ys.decode_to_pcm(filename, os.path.join(folder, "speech.pcm"))
+        whole = " ".join(ys.mp3_to_text(filename, stream=True, use_cache=False, pcm=pcm)).split()
+        results = {"audio_seconds": length, "words": len(whole), "rtf": {}, "similarity": {}, "matches_serial": True, "matches_whole": True}
+        serial = None
+
+        for workers in counts:
+            start = time.perf_counter()
+            transcript = ys.transcribe_segments(pcm, workers=workers, use_cache=False)
+            elapsed = time.perf_counter() - start
+
+            if serial is None:
+                serial = transcript
+            elif transcript != serial:
+                results["matches_serial"] = False
+
+            # the recognizer starts over at every cut, which may change a word or two there
+            similarity = difflib.SequenceMatcher(None, " ".join(transcript).split(), whole, autojunk=False).ratio()
+            results["similarity"][workers] = round(similarity, 4)
+
+            if similarity < WHOLE_SIMILARITY:
+                results["matches_whole"] = False
+
+            results["rtf"][workers] = round(elapsed / length, 4)
+            print(f"{workers:>3} worker(s): RTF {elapsed / length:.4f}")
+
+    results["passed"] = len(whole) > 0 and results["matches_serial"] and results["matches_whole"]
+    print(json.dumps(results))
+    return results
+
+
+def startup_time(folder: str, scenario: str) -> dict:
+    """
+    Starts one kind of run with `python -X importtime` and measures how long the imports took.
+
+    Parameters
+    ----------
+    folder: str
+        The folder holding the youtube_summarizer.py to measure.
+    scenario: str
+        One of the keys of STARTUP_SCENARIOS.
+
+    Returns
+    -------
+    dict
+        The total import time in ms (from -X importtime) and the wall time in ms of the whole start up.
+    """
+    # older versions import everything at the top, newer ones only once a stage asks for it
+    code = (
+        "import youtube_summarizer as ys\n"
+        "if hasattr(ys, '_load'):\n"
+        f"    for module in {STARTUP_SCENARIOS[scenario]!r}: ys._load(module)\n"
+        f"    if {scenario == 'summary'}: ys.get_punctuation_model()\n"
+    )
+
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True, cwd=folder)
+    wall = (time.perf_counter() - start) * 1000
+
+    # lines look like "import time:       self |  cumulative | name", nested imports have an indented name
+    imports = 0
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+
+        if not name.startswith("  "):
+            imports += int(cumulative)
+
+    return {"imports_ms": round(imports / 1000, 1), "wall_ms": round(wall, 1)}
+
+
+def lazy_import_baseline() -> str:
+    """
+    Returns the last git revision before youtube_summarizer.py started importing its libraries lazily (the first 
+    one defining _load), the one worth comparing the start up time against.
+    """
+    log = subprocess.run(
+        ["git", "log", "-S", "def _load(", "--reverse", "--format=%H", "--", "youtube_summarizer.py"], 
+        capture_output=True, text=True, check=True, cwd=HERE,
+    )
+    commits = log.stdout.split()
+
+    if len(commits) == 0:
+        raise ValueError("the commit that made the imports lazy is not in the history, give a revision to compare against")
+
+    return commits[0] + "~1"
+
+
+def compare_startup(baseline: str = None) -> dict:
+    """
+    Compares the start up time of download-only, transcribe-only and full-summary runs between the current 
+    youtube_summarizer.py and the one in an older git revision.
+
+    Parameters
+    ----------
+    baseline: str
+        The git revision to compare against, by default the last one before the imports were made lazy (see 
+        lazy_import_baseline).
+
+    Returns
+    -------
+    dict
+        The measurements of both versions for every kind of run.
+    """
+    baseline = baseline or lazy_import_baseline()
+    results = {"baseline": baseline}
+
+    with tempfile.TemporaryDirectory() as folder:
+        old = subprocess.run(["git", "show", f"{baseline}:youtube_summarizer.py"], capture_output=True, text=True, check=True, cwd=HERE)
+
+        with open(os.path.join(folder, "youtube_summarizer.py"), "w") as file:
+            file.write(old.stdout)
+
+        for scenario in STARTUP_SCENARIOS:
+            results[scenario] = {"before": startup_time(folder, scenario), "after": startup_time(HERE, scenario)}
+            print(f"{scenario:>10}: {results[scenario]['before']} -> {results[scenario]['after']}")
+
+    print(json.dumps(results))
+    return results
+
+
+def make_transcript(sentences: int, seed: int = 0) -> str:
+    """
+    Generates a synthetic punctuated transcript from a small fixed vocabulary, the same seed always gives the same text.
+
+    Parameters
+    ----------
+    sentences: int
+        The number of sentences.
+    seed: int
+        The seed of the random generator.
+
+    Returns
+    -------
+    str
+        The transcript.
+    """
+    vocabulary = (
+        "the a of and to in is that it for on with as this was are be at by we you they video audio people "
+        "model speech text summary lecture student question answer data network music time world idea "
+        "learn explain build talk show think know make find start important simple different new good"
+    ).split()
+    generator = random.Random(seed)
+    text = list()
+
+    for _ in range(sentences):
+        words = generator.choices(vocabulary, k=generator.randint(6, 18))
+        text.append(" ".join(words).capitalize() + ".")
+
+    return " ".join(text)
+
+
+def _loop_rank(doc, version: int, sentences: int) -> list[int]:
+    """
+    The original nested-loop scoring of summarize_text (1) and summarize_text_2 (2), kept as the reference 
+    for the vectorized engine. Returns the start token of the chosen sentences.
+    """
+    import youtube_summarizer as ys
+
+    STOP_WORDS = ys._load("spacy.lang.en.stop_words").STOP_WORDS
+
+    if version == 1:
+        keyword = [token.text for token in doc if token.text not in STOP_WORDS and token.text not in punctuation and token.pos_ in ['PROPN', 'ADJ', 'NOUN', 'VERB']]
+        freq_words = Counter(keyword)
+        max_freq = Counter(keyword).most_common(1)[0][1]
+
+        for word in freq_words.keys():
+            freq_words[word] = (freq_words[word]/max_freq)
+
+        sentence_strength = {}
+
+        for sent in doc.sents:
+            for word in sent:
+                if word.text in freq_words.keys():
+                    if sent in sentence_strength.keys():
+                        sentence_strength[sent] += freq_words[word.text]
+                    else:
+                        sentence_strength[sent] = freq_words[word.text]
+
+        chosen = nlargest(sentences, sentence_strength, key=sentence_strength.get)
+    else:
+        word_frequencies = {}
+
+        for token in doc:
+            if token.text not in STOP_WORDS and token.text not in punctuation:
+                word_frequencies[token.text] = word_frequencies.get(token.text, 0) + 1
+
+        chosen = sorted(doc.sents, key=lambda sent: sum(word_frequencies[token.text] for token in sent if token.text in word_frequencies), reverse=True)[:sentences]
+
+    return [sent.start for sent in chosen]
+
+
+def benchmark_scoring(sentences: int = 10000, top: int = 3) -> dict:
+    """
+    Compares the nested-loop sentence scoring with the vectorized engine on a synthetic transcript and checks 
+    that both pick the same sentences. Version 1 needs en_core_web_sm for the part-of-speech tags and is 
+    skipped when it is not installed.
+
+    Parameters
+    ----------
+    sentences: int
+        The number of sentences in the transcript.
+    top: int
+        The number of sentences in the summary.
+
+    Returns
+    -------
+    dict
+        The time of both scorers and whether the rankings matched, for each version.
+    """
+    import youtube_summarizer as ys
+
+    text = make_transcript(sentences).lower()
+    results = {}
+
+    for version, name, summarize in ((1, "en_core_web_sm", ys._summarize_doc), (2, "sentencizer", ys._summarize_doc_2)):
+        try:
+            doc = ys.get_nlp(name)(text)
+        except OSError:
+            print(f"version {version}: skipped, {name} is not installed")
+            continue
+
+        # the first call pays for importing numpy and scipy, which is not what is measured here
+        summarize(doc[:1].as_doc(), top)
+
+        start = time.perf_counter()
+        expected = _loop_rank(doc, version, top)
+        loop = time.perf_counter() - start
+
+        start = time.perf_counter()
+        summary = summarize(doc, top)
+        vectorized = time.perf_counter() - start
+
+        sents = {sent.start: sent.text for sent in doc.sents}
+        identical = summary == ' '.join(sents[i] for i in expected)
+
+        results[version] = {"loop_s": round(loop, 4), "vectorized_s": round(vectorized, 4), "speedup": round(loop / vectorized, 1), "identical": identical}
+        print(f"version {version}: {results[version]}")
+
+    print(json.dumps(results))
+    return results
+
+
+def benchmark_downloads(count: int = 200, workers: int = 16, per_host: int = 4) -> dict:
+    """
+    Downloads `count` videos from a local stand-in for YouTube with download_many and checks that every one 
+    arrived and that a broken link only fails itself.
+
+    Parameters
+    ----------
+    count: int
+        The number of videos.
+    workers: int
+        The most videos downloaded at the same time.
+    per_host: int
+        The most videos downloaded at the same time from one host.
+
+    Returns
+    -------
+    dict
+        The time taken, the number of failures and whether the check passed.
+    """
+    import youtube_download as yd
+    import stand_in_server
+
+    server = stand_in_server.StandInServer(stand_in_server.make_videos(count)).start()
+    videos = [server.watch_url(video_id) for video_id in server.videos] + [server.watch_url("missing")]
+
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        results = yd.download_many(videos, directory=folder, workers=workers, per_host=per_host, fetch=stand_in_server.stand_in_download, resolve_first=False)
+        elapsed = time.perf_counter() - start
+
+    server.shutdown()
+
+    failed = [result["video"] for result in results if result["error"] is not None]
+    summary = {"videos": count, "seconds": round(elapsed, 3), "failed": len(failed), "passed": failed == videos[-1:]}
+    print(json.dumps(summary))
+
+    return summary
+
+
+def check_resume(size: int = 4 * 1024 * 1024, chunk_size: int = 256 * 1024) -> bool:
+    """
+    Checks range_download against a local stand-in server that drops connections: dropped chunks are fetched 
+    again, and a download that gives up part way resumes from the chunks it already has.
+
+    Parameters
+    ----------
+    size: int
+        The size in bytes of the stream to download.
+    chunk_size: int
+        The size of each Range request.
+
+    Returns
+    -------
+    bool
+        True if the check passed.
+    """
+    import youtube_download as yd
+    import stand_in_server
+
+    videos = {"resume": {"title": "Resume", "streams": [{"itag": 251, "mime_type": "audio/webm", "abr": "160kbps", "filesize": size}]}}
+    expected = stand_in_server.fake_audio("resume", 251, size)
+    chunks = size // chunk_size
+    results = {}
+
+    with tempfile.TemporaryDirectory() as folder:
+        # a few dropped connections while fetching 4 chunks at a time
+        server = stand_in_server.StandInServer(videos, disconnects=3).start()
+        path = yd.range_download(f"{server.base_url}/audio/resume/251", os.path.join(folder, "retried.webm"), chunk_size=chunk_size, parallel=4)
+
+        with open(path, "rb") as file:
+            results["retried"] = file.read() == expected
+
+        server.shutdown()
+
+        # the connection drops for good half way through, then the download is started again
+        server = stand_in_server.StandInServer(videos, disconnects=1, disconnect_after=chunks // 2).start()
+        url = f"{server.base_url}/audio/resume/251"
+        path = os.path.join(folder, "resumed.webm")
+
+        try:
+            yd.range_download(url, path, size=size, chunk_size=chunk_size, retries=0)
+            results["interrupted"] = False
+        except Exception:
+            results["interrupted"] = True
+
+        with open(path + ".part.json") as file:
+            saved = len(json.load(file)["done"])
+
+        before = server.requests["audio"]
+        yd.range_download(url, path, size=size, chunk_size=chunk_size)
+
+        with open(path, "rb") as file:
+            results["resumed"] = file.read() == expected
+
+        # only the chunks that were missing should have been fetched again
+        results["refetched_chunks"] = server.requests["audio"] - before
+        results["passed"] = results["retried"] and results["interrupted"] and results["resumed"] and 0 < saved < chunks and results["refetched_chunks"] == chunks - saved
+
+        server.shutdown()
+
+    print(json.dumps(results))
+    return results["passed"]
+
+
+def benchmark_cache(count: int = 20) -> dict:
+    """
+    Downloads the same stand-in videos into two folders with a fresh audio cache, the second round should be 
+    served entirely from the cache.
+
+    Parameters
+    ----------
+    count: int
+        The number of videos.
+
+    Returns
+    -------
+    dict
+        The cache statistics, the audio requests the server saw and whether the check passed.
+    """
+    import youtube_download as yd
+    import stand_in_server
+
+    server = stand_in_server.StandInServer(stand_in_server.make_videos(count)).start()
+    videos = [server.watch_url(video_id) for video_id in server.videos]
+
+    with tempfile.TemporaryDirectory() as folder:
+        # a cache of its own, so the real one is neither filled with stand-in IDs nor gives hits in the first round
+        shared = yd.audio_cache, yd.manifest_cache
+        yd.audio_cache = yd.AudioCache(folder=os.path.join(folder, "cache"))
+        yd.manifest_cache = yd.ManifestCache(folder=os.path.join(folder, "manifests"))
+
+        try:
+            for round in ("first", "second"):
+                os.makedirs(os.path.join(folder, round))
+                yd.download_many(videos, directory=os.path.join(folder, round), fetch=lambda **kwargs: stand_in_server.stand_in_download(use_cache=True, **kwargs), resolver=stand_in_server.stand_in_manifest)
+
+            stats = dict(yd.audio_cache.stats)
+            print(yd.audio_cache.report())
+        finally:
+            yd.audio_cache, yd.manifest_cache = shared
+
+    server.shutdown()
+
+    results = {"cache": stats, "audio_requests": server.requests["audio"]}
+    results["passed"] = stats["hits"] == count and stats["misses"] == count
+    print(json.dumps(results))
+
+    return results
+
+
+def benchmark_metrics(spans: int = 100000, count: int = 20) -> dict:
+    """
+    Measures what the instrumentation of metrics.py costs per stage call, with only the in-memory totals and with 
+    the JSON lines trace on, then downloads stand-in videos with the trace on and writes the Prometheus file.
+
+    Parameters
+    ----------
+    spans: int
+        The number of empty spans timed in each mode.
+    count: int
+        The number of stand-in videos downloaded with the trace on.
+
+    Returns
+    -------
+    dict
+        The cost of a span in microseconds in each mode, the stages seen in the trace and whether the check passed 
+        (a span must cost well under a millisecond, which is nothing next to any of the stages it measures).
+    """
+    import metrics
+    import youtube_download as yd
+    import stand_in_server
+
+    results = {}
+
+    with tempfile.TemporaryDirectory() as folder:
+        trace_file = os.path.join(folder, "trace.jsonl")
+
+        for mode, path in (("totals_only", None), ("with_trace", trace_file)):
+            metrics.TRACE_FILE = path
+            start = time.perf_counter()
+
+            for _ in range(spans):
+                with metrics.trace("benchmark.empty"):
+                    pass
+
+            results[f"{mode}_us"] = round((time.perf_counter() - start) / spans * 1e6, 2)
+
+        # start the trace of the downloads afresh
+        metrics._trace.close()
+        metrics._trace = None
+        os.remove(trace_file)
+
+        server = stand_in_server.StandInServer(stand_in_server.make_videos(count)).start()
+        videos = [server.watch_url(video_id) for video_id in server.videos]
+        os.makedirs(os.path.join(folder, "audio"))
+        yd.download_many(videos, directory=os.path.join(folder, "audio"), fetch=lambda **kwargs: stand_in_server.stand_in_download(use_cache=False, **kwargs), resolve_first=False)
+        server.shutdown()
+
+        metrics.write_prometheus(os.path.join(folder, "metrics.prom"))
+
+        with open(trace_file) as file:
+            events = [json.loads(line) for line in file]
+
+        with open(os.path.join(folder, "metrics.prom")) as file:
+            print(file.read())
+
+        metrics._trace.close()
+        metrics._trace = None
+        metrics.TRACE_FILE = os.environ.get("YOUTUBE_SUMMARIZER_TRACE")
+
+    results["trace_events"] = dict(Counter(event["stage"] for event in events))
+    results["passed"] = results["with_trace_us"] < 1000 and results["trace_events"].get("audio.download") == count
+    print(json.dumps(results))
+
+    return results
+
+
+def load_test_service(count: int = 100, clients: int = 16, workers: int = 4, queue_size: int = 8, stages: list = None) -> dict:
+    """
+    Load-tests the job service (youtube_service.py) on a local instance that downloads from the stand-in 
+    for YouTube. Every client submits jobs, waits as told by Retry-After when the queue is full and polls its 
+    jobs until they finish. The workers hold their first downloads until a client was turned away, so the 
+    backpressure is always exercised (it needs more clients than workers and queue together).
+
+    Parameters
+    ----------
+    count: int
+        The number of jobs.
+    clients: int
+        The number of clients submitting at the same time.
+    workers: int
+        The workers of the service.
+    queue_size: int
+        The queue of the service, it is kept small so the backpressure is exercised.
+    stages: list
+        The stages of every job, none by default so only the downloads run (the other stages need the models).
+
+    Returns
+    -------
+    dict
+        The time taken, jobs per second, latency percentiles, the number of times the service turned a client 
+        away, and whether the check passed (every job finished, the queue filled up but never went over its size, 
+        and every client turned away got its job done by retrying).
+    """
+    import threading
+    import urllib.error
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+    import stand_in_server
+    import youtube_service
+
+    stand_in = stand_in_server.StandInServer(stand_in_server.make_videos(count)).start()
+    videos = [stand_in.watch_url(video_id) for video_id in stand_in.videos]
+    if clients <= workers + queue_size:
+        raise ValueError("the service can only be overwhelmed by more clients than its workers and queue together")
+
+    rejected = Counter()
+    peak = Counter()
+    full = threading.Event()    # set once a client was turned away, until then the workers wait
+
+    def fetch(**kwargs) -> str:
+        full.wait(timeout=30)
+        return stand_in_server.stand_in_download(**kwargs)
+
+    with tempfile.TemporaryDirectory() as folder:
+        service = youtube_service.JobService(workers=workers, queue_size=queue_size, directory=folder, fetch=fetch)
+        server = youtube_service.JobServer(service, port=0).start()
+        retry_after, youtube_service.RETRY_AFTER = youtube_service.RETRY_AFTER, 0.05
+
+        def request(method: str, path: str, body: dict = None) -> tuple:
+            data = None if body is None else json.dumps(body).encode()
+            call = urllib.request.Request(server.base_url + path, data=data, method=method, headers={"Content-Type": "application/json"})
+
+            try:
+                with urllib.request.urlopen(call, timeout=30) as response:
+                    return response.status, json.load(response), response.headers
+            except urllib.error.HTTPError as error:
+                return error.code, json.load(error), error.headers
+
+        def client(video: str) -> dict:
+            start = time.perf_counter()
+            retried = False
+
+            while True:
+                status, record, headers = request("POST", "/jobs", {"url": video, "stages": stages or []})
+
+                if status != 503:
+                    break
+
+                rejected["submit"] += 1
+                retried = True
+                full.set()
+                time.sleep(float(headers.get("Retry-After", 1)))
+
+            while record["status"] in ("queued", "running"):
+                time.sleep(0.02)
+                status, record, _ = request("GET", f"/jobs/{record['id']}")
+                peak["queued"] = max(peak["queued"], request("GET", "/health")[1]["queued"])
+
+            return {"status": record["status"], "error": record["error"], "seconds": time.perf_counter() - start, "retried": retried}
+
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            jobs = list(pool.map(client, videos))
+
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        youtube_service.RETRY_AFTER = retry_after
+
+    stand_in.shutdown()
+
+    latencies = sorted(job["seconds"] for job in jobs)
+    failed = [job["error"] for job in jobs if job["status"] != "ok"]
+    results = {
+        "jobs": count, "clients": clients, "seconds": round(elapsed, 3), "jobs_per_s": round(count / elapsed, 1),
+        "p50_s": round(latencies[len(latencies) // 2], 3), "p95_s": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "turned_away": rejected["submit"], "peak_queue": peak["queued"], "failed": len(failed),
+        "retried_ok": sum(job["retried"] and job["status"] == "ok" for job in jobs),
+    }
+    results["passed"] = (
+        len(failed) == 0 and 0 < peak["queued"] <= queue_size and results["turned_away"] > 0 
+        and results["retried_ok"] == sum(job["retried"] for job in jobs)
+    )
+    print(json.dumps(results))
+
+    return results
+
+
+def benchmark_metadata(count: int = 100, workers: int = 16) -> dict:
+    """
+    Looks up stand-in videos with resolve_many twice with a fresh manifest cache, the second round should not 
+    ask the server anything. Then downloads them all with another fresh cache, download_many should look each 
+    one up only once, and compares the requests made with the connections opened.
+
+    Parameters
+    ----------
+    count: int
+        The number of videos.
+    workers: int
+        The most videos looked up or downloaded at the same time.
+
+    Returns
+    -------
+    dict
+        The time of each round, the requests and connections the server saw and whether the check passed.
+    """
+    import youtube_download as yd
+    import stand_in_server
+
+    server = stand_in_server.StandInServer(stand_in_server.make_videos(count)).start()
+    videos = [server.watch_url(video_id) for video_id in server.videos]
+    results = {}
+
+    with tempfile.TemporaryDirectory() as folder:
+        shared = yd.audio_cache, yd.manifest_cache
+        yd.manifest_cache = yd.ManifestCache(folder=os.path.join(folder, "manifests"))
+
+        try:
+            for name in ("first", "second"):
+                before = server.requests["watch"]
+                start = time.perf_counter()
+                manifests = yd.resolve_many(videos, workers=workers, resolver=stand_in_server.stand_in_manifest)
+                results[f"{name}_round"] = {"seconds": round(time.perf_counter() - start, 3), "watch_requests": server.requests["watch"] - before}
+
+            yd.audio_cache = yd.AudioCache(folder=os.path.join(folder, "audio"))
+            yd.manifest_cache = yd.ManifestCache(folder=os.path.join(folder, "downloads"))
+            connections, before = server.connections, server.requests["watch"]
+            yd.download_many(videos, directory=folder, workers=workers, per_host=workers, fetch=lambda **kwargs: stand_in_server.stand_in_download(use_cache=True, **kwargs), resolver=stand_in_server.stand_in_manifest)
+            results["downloads"] = {"audio_requests": server.requests["audio"], "watch_requests": server.requests["watch"] - before, "connections": server.connections - connections}
+        finally:
+            yd.audio_cache, yd.manifest_cache = shared
+
+    server.shutdown()
+
+    results["failed"] = sum(isinstance(manifest, Exception) for manifest in manifests)
+    results["passed"] = results["failed"] == 0 and results["second_round"]["watch_requests"] == 0 and results["downloads"]["watch_requests"] == count and results["downloads"]["connections"] < results["downloads"]["audio_requests"]
+    print(json.dumps(results))
+
+    return results
+
+
+def benchmark_streams(count: int = 20) -> dict:
+    """
+    Downloads the same stand-in videos for every purpose (see select_stream) and reports the streams picked and 
+    the bytes downloaded and saved compared with always taking the first stream.
+
+    Parameters
+    ----------
+    count: int
+        The number of videos.
+
+    Returns
+    -------
+    dict
+        The measurements for every purpose and whether the check passed (speech recognition downloads the least).
+    """
+    import youtube_download as yd
+    import stand_in_server
+
+    server = stand_in_server.StandInServer(stand_in_server.make_videos(count)).start()
+    videos = [server.watch_url(video_id) for video_id in server.videos]
+    results = {}
+
+    with tempfile.TemporaryDirectory() as folder:
+        for purpose in yd.QUALITY_FLOORS:
+            os.makedirs(os.path.join(folder, purpose))
+            downloads = yd.download_many(videos, directory=os.path.join(folder, purpose), fetch=lambda **kwargs: stand_in_server.stand_in_download(use_cache=False, purpose=purpose, **kwargs), resolve_first=False)
+            streams = list()
+
+            for download in downloads:
+                with open(download["path"] + ".json") as file:
+                    streams.append(json.load(file))
+
+            results[purpose] = {
+                "streams": sorted(set(f"{stream['codec']} in {stream['container']} at {stream['abr']}" for stream in streams)),
+                "bytes": sum(stream["bytes"] for stream in streams), "bytes_saved": sum(stream["bytes_saved"] for stream in streams),
+            }
+            print(f"{purpose:>9}: {results[purpose]}")
+
+    server.shutdown()
+
+    results["passed"] = results["asr"]["bytes"] == min(results[purpose]["bytes"] for purpose in yd.QUALITY_FLOORS)
+    print(json.dumps(results))
+
+    return results
+
+
+def benchmark_stream_url(seconds: int = 120) -> dict:
+    """
+    Transcribes a speech fixture served by the stand-in server while it downloads (see transcribe_url) and 
+    compares it with downloading it first and transcribing the file. Skipped without ffmpeg or the Vosk model.
+
+    Parameters
+    ----------
+    seconds: int
+        The length of the speech fixture, one of AUDIO_LENGTHS.
+
+    Returns
+    -------
+    dict
+        The time to the first segment, the total time, how long after the last downloaded byte the last segment 
+        came, the total time of downloading then transcribing, and whether both gave the same transcript.
+    """
+    import shutil
+    import youtube_download as yd
+    import youtube_summarizer as ys
+    import stand_in_server
+
+    # only what is not installed skips the check, anything failing once it runs fails it
+    if shutil.which("ffmpeg") is None:
+        return skipped("ffmpeg is not installed")
+
+    try:
+        ys.models.get()
+    except SystemExit:
+        return skipped("the Vosk model is not installed")
+
+    path = make_fixtures()[f"speech/{seconds}s"]
+    video = {"title": "Speech fixture", "streams": [{"itag": 251, "mime_type": "audio/webm", "abr": "160kbps", "codecs": "opus", "filesize": os.path.getsize(path), "file": path}]}
+    server = stand_in_server.StandInServer({"speech0000": video}).start()
+    url = server.watch_url("speech0000")
+    stream_download = yd.stream_download
+    last_byte = []
+
+    # notes when the last chunk of the download was handed over
+    def timed_download(*args, **kwargs):
+        yield from stream_download(*args, **kwargs)
+        last_byte.append(time.perf_counter())
+
+    yd.stream_download = timed_download
+    results = {}
+
+    try:
+        start = time.perf_counter()
+        first = None
+        streamed = list()
+
+        for segment in ys.transcribe_url(url, resolver=stand_in_server.stand_in_manifest):
+            first = first or time.perf_counter()
+            streamed.append(segment["text"])
+
+        end = time.perf_counter()
+        results["streamed"] = {
+            "first_segment_seconds": round((first or end) - start, 3), "total_seconds": round(end - start, 3),
+            "lag_after_last_byte_seconds": round(end - last_byte[0], 3),
+        }
+
+        with tempfile.TemporaryDirectory() as folder:
+            start = time.perf_counter()
+            mp3 = stand_in_server.stand_in_download(url, directory=folder, use_cache=False, purpose="asr")
+            downloaded = time.perf_counter()
+            saved = ys.mp3_to_text(mp3, stream=True, use_cache=False)
+            end = time.perf_counter()
+
+        results["saved"] = {"download_seconds": round(downloaded - start, 3), "total_seconds": round(end - start, 3)}
+        results["passed"] = streamed == saved
+    except (Exception, SystemExit) as e:
+        results = {"error": repr(e), "passed": False}
+    finally:
+        yd.stream_download = stream_download
+        server.shutdown()
+
+    print(json.dumps(results))
+    return results
+
+
+def make_pcm(wav: str, dest: str) -> str:
+    """
+    Writes the samples of a .wav file as a PCM file like decode_to_pcm makes, without needing ffmpeg.
+    """
+    import youtube_summarizer as ys
+
+    with wave.open(wav) as file, open(dest, "wb") as pcm_file:
+        pcm_file.write(ys.PCM_HEADER.pack(ys.PCM_MAGIC, file.getframerate(), file.getnchannels(), file.getsampwidth()))
+        pcm_file.write(file.readframes(file.getnframes()))
+
+    return dest
+
+
+def benchmark_pcm(seconds: int = 600) -> dict:
+    """
+    Reads one PCM file (see decode_to_pcm) with every consumer of the decoded audio: the voice-activity detection, 
+    the split at silences, the .wav export and the arguments sent to the pool workers of transcribe_segments. 
+    The PCM file is made from a speech fixture so ffmpeg is not needed, with ffmpeg the time of decoding the 
+    audio once with it and of decoding it with pydub (what every consumer used to do) is added.
+
+    Parameters
+    ----------
+    seconds: int
+        The length of the speech fixture, one of AUDIO_LENGTHS.
+
+    Returns
+    -------
+    dict
+        The time of every consumer, the bytes pickled for the pool workers before and now, and whether the 
+        check passed (the .wav export gives back the same samples and the pieces cover the whole audio).
+    """
+    import youtube_summarizer as ys
+
+    fixtures = make_fixtures()
+    results = {}
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = make_pcm(fixtures[f"speech/{seconds}s"], os.path.join(folder, "speech.pcm"))
+
+        with wave.open(fixtures[f"speech/{seconds}s"]) as file:
+            samples = file.readframes(file.getnframes())
+
+        with ys.PcmFile(path) as pcm:
+            start = time.perf_counter()
+            speech = ys.SpeechFilter("energy")
+
+            for _ in speech.filter(pcm.blocks()):
+                pass
+
+            results["vad_seconds"] = round(time.perf_counter() - start, 4)
+
+            start = time.perf_counter()
+            bounds = ys.split_at_silence(pcm)
+            results["split_seconds"] = round(time.perf_counter() - start, 4)
+
+            pieces = [(pcm.offset(begin), pcm.offset(end)) for begin, end in bounds]
+            results["pickled_bytes_before"] = sum(len(pickle.dumps(bytes(pcm.data[begin:end]))) for begin, end in pieces)
+            results["pickled_bytes_now"] = sum(len(pickle.dumps((path, begin, end, ys.MODEL_NAME))) for begin, end in pieces)
+
+        start = time.perf_counter()
+        wav = ys.convert_to_wav(os.path.join(folder, "speech.mp3"), pcm=path)
+        results["wav_seconds"] = round(time.perf_counter() - start, 4)
+
+        with wave.open(wav) as file:
+            same = file.readframes(file.getnframes()) == samples
+
+        # only with ffmpeg: one decode now against the pydub decode every consumer used to do
+        if f"audio/{seconds}s" in fixtures:
+            mp3 = fixtures[f"audio/{seconds}s"]
+            start = time.perf_counter()
+            ys.decode_to_pcm(mp3, os.path.join(folder, "audio.pcm"))
+            results["decode_once_seconds"] = round(time.perf_counter() - start, 3)
+
+            start = time.perf_counter()
+            ys._load("pydub").AudioSegment.from_file(mp3).set_channels(ys.CHANNELS).set_frame_rate(ys.FRAME_RATE)
+            results["pydub_decode_seconds"] = round(time.perf_counter() - start, 3)
+
+    results["passed"] = same and pieces[0][0] == 0 and pieces[-1][1] == len(samples) and all(a[1] == b[0] for a, b in zip(pieces, pieces[1:]))
+    print(json.dumps(results))
+
+    return results
+
+
+def benchmark_latency(filename: str = None, frames: tuple = (100, 250, 500), seconds: int = 120) -> dict:
+    """
+    Compares a RecognizerSession fed small frames with the 45-second blocks of mp3_to_text: the first-word 
+    latency (how much audio after the start of the first word had to be fed before it came out, the audio 
+    is fed as fast as possible so this is the latency a live source would see on top of the compute) and 
+    the real-time factor. Skipped if the Vosk model is not installed.
+
+    Parameters
+    ----------
+    filename: str
+        An audio file with speech (decoded with ffmpeg), by default the speech fixture of `seconds` seconds, 
+        which has no words the recognizer knows so only the real-time factors mean something.
+    frames: tuple
+        The frame sizes in ms of the sessions to measure.
+    seconds: int
+        The length of the speech fixture, one of AUDIO_LENGTHS.
+
+    Returns
+    -------
+    dict
+        The measurements of the blocks and of every frame size.
+    """
+    import youtube_summarizer as ys
+
+    results = {}
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "audio.pcm")
+
+        if filename is None:
+            make_pcm(make_fixtures()[f"speech/{seconds}s"], path)
+        else:
+            ys.decode_to_pcm(filename, path)
+
+        with ys.PcmFile(path) as pcm:
+            length = len(pcm) / 1000
+
+        def first_word_latency(segments: list, fed: float) -> float:
+            words = [word for segment in segments for word in segment["words"]]
+            return None if len(words) == 0 or fed is None else round(fed - words[0]["start"], 3)
+
+        try:
+            ys.models.get()
+
+            # the 45-second blocks: the first word comes out with the block it is in
+            start = time.perf_counter()
+            segments = list(ys.iter_transcript(path))
+            elapsed = time.perf_counter() - start
+            fed = next((segment["end"] for segment in segments if len(segment["text"]) > 0), None)
+            results["blocks"] = {"first_word_latency_s": first_word_latency(segments, fed), "rtf": round(elapsed / length, 4)}
+            print(f"blocks: {results['blocks']}")
+
+            for frame in frames:
+                session = ys.RecognizerSession(frame=frame)
+                start = time.perf_counter()
+
+                with ys.PcmFile(path) as pcm:
+                    segments = session.run(pcm.blocks(block_frames=ys.FRAME_RATE * frame // 1000))
+
+                elapsed = time.perf_counter() - start
+                results[f"session/{frame}ms"] = {"first_word_latency_s": first_word_latency(segments, session.first_word), "rtf": round(elapsed / length, 4)}
+                print(f"session/{frame}ms: {results[f'session/{frame}ms']}")
+        except SystemExit:
+            return skipped("the Vosk model is not installed")
+
+    print(json.dumps(results))
+    return results
+
+
+def benchmark_corpus(count: int = 200, sentences: int = 40, readers: int = 4) -> dict:
+    """
+    Summarizes synthetic transcripts with TF-IDF weights (see CorpusStats) into a new corpus: every transcript 
+    is the filler of make_transcript with a word of its own topic in a third of its sentences. Measures the cost 
+    of each transcript as the corpus grows, the share of the summary sentences about the topic with and without 
+    TF-IDF, the time of a rebuild from the same transcripts, and whether readers running during the updates 
+    ever failed.
+
+    Parameters
+    ----------
+    count: int
+        The number of transcripts.
+    sentences: int
+        The number of filler sentences of each transcript.
+    readers: int
+        The number of threads reading the statistics while the transcripts are added.
+
+    Returns
+    -------
+    dict
+        The measurements and whether the check passed (the rebuild gives the same statistics as the updates and 
+        no reader failed).
+    """
+    import threading
+    import youtube_summarizer as ys
+
+    texts = list()
+
+    for i in range(count):
+        filler = make_transcript(sentences, seed=i).split(". ")
+        texts.append(". ".join(sentence + f" zebra{i}" if j % 3 == 0 else sentence for j, sentence in enumerate(filler)))
+    results = {}
+    errors = list()
+
+    with tempfile.TemporaryDirectory() as folder:
+        corpus = ys.CorpusStats(os.path.join(folder, "corpus.sqlite3"))
+        ys.summarize_text_2(texts[0])   # loads spaCy before anything is timed
+        done = threading.Event()
+
+        def read() -> None:
+            while not done.is_set():
+                try:
+                    documents, found = corpus.frequencies(["video", "speech", "zebra1"])
+                    assert all(df <= documents for df in found.values()), "a word is in more transcripts than there are"
+                except Exception as e:
+                    errors.append(repr(e))
+
+        threads = [threading.Thread(target=read, daemon=True) for _ in range(readers)]
+        timings = list()
+        hits = {"plain": 0, "tfidf": 0}
+
+        for thread in threads:
+            thread.start()
+
+        for i, text in enumerate(texts):
+            start = time.perf_counter()
+            summary = ys.summarize_text_2(text, corpus=corpus)
+            timings.append(time.perf_counter() - start)
+
+            # only the second half, once the corpus knows what the filler is
+            if i >= count // 2:
+                hits["tfidf"] += summary.count(f"zebra{i}") / 3
+                hits["plain"] += ys.summarize_text_2(text).count(f"zebra{i}") / 3
+
+        done.set()
+
+        for thread in threads:
+            thread.join()
+
+        tenth = max(1, count // 10)
+        results["ms_per_transcript_first"] = round(1000 * sum(timings[:tenth]) / tenth, 3)
+        results["ms_per_transcript_last"] = round(1000 * sum(timings[-tenth:]) / tenth, 3)
+        results["topic_in_summary_plain"] = round(hits["plain"] / (count - count // 2), 3)
+        results["topic_in_summary_tfidf"] = round(hits["tfidf"] / (count - count // 2), 3)
+        results["reader_errors"] = len(errors)
+
+        os.makedirs(os.path.join(folder, "transcripts"))
+
+        for i, text in enumerate(texts):
+            with open(os.path.join(folder, "transcripts", f"{i}.txt"), "w") as file:
+                file.write(text)
+
+        rebuilt = ys.CorpusStats(os.path.join(folder, "rebuilt.sqlite3"))
+        start = time.perf_counter()
+        results["rebuild"] = ys.rebuild_corpus([os.path.join(folder, "transcripts")], corpus=rebuilt)
+        results["rebuild_seconds"] = round(time.perf_counter() - start, 3)
+
+        terms = [term for term, in corpus._connection().execute("SELECT term FROM terms")]
+        same = corpus.stats() == rebuilt.stats() and corpus.frequencies(terms) == rebuilt.frequencies(terms)
+
+        # and from the texts it kept, nothing else may be counted
+        before = corpus.frequencies(terms)
+        results["rebuild_kept"] = ys.rebuild_corpus(corpus=corpus)
+        same = same and corpus.frequencies(terms) == before
+
+    results["passed"] = same and len(errors) == 0
+    print(json.dumps(results))
+
+    return results
+
+
+def _run_child(code: str) -> dict:
+    """
+    Runs a measurement in a fresh interpreter, so its model loads and peak memory are not mixed with the others.
+    The code has to leave its measurements in a dict called `result`.
+
+    Returns
+    -------
+    dict
+        The measurements with the child's peak RSS added, or {"skipped": <reason>} if it could not run 
+        (e.g. a model that is not installed).
+    """
+    script = code + "\nimport resource, json\nresult['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\nprint(json.dumps(result))"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, cwd=HERE)
+    lines = output.stdout.strip().splitlines()
+
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, ValueError):
+        reason = (output.stderr.strip().splitlines() or lines or ["no output"])[-1]
+        return {"skipped": reason}
+
+
+def make_fixtures(folder: str = FIXTURES) -> dict:
+    """
+    Generates the synthetic audio and transcripts of the suite once, later runs reuse them.
+
+    Returns
+    -------
+    dict
+        The path of every fixture by name, e.g. "audio/30s" or "text/1000".
+    """
+    os.makedirs(folder, exist_ok=True)
+    fixtures = {}
+
+    for seconds in AUDIO_LENGTHS:
+        path = os.path.join(folder, f"audio_{seconds}s.mp3")
+
+        # without ffmpeg there is no audio, the transcription measurements are then skipped
+        try:
+            if not os.path.exists(path):
+                make_audio(path, seconds)
+
+            fixtures[f"audio/{seconds}s"] = path
+        except (OSError, subprocess.CalledProcessError):
+            pass
+
+    for seconds in AUDIO_LENGTHS:
+        path = os.path.join(folder, f"speech_{seconds}s.wav")
+
+        if not os.path.exists(path):
+            make_speech_audio(path, seconds, seed=seconds)
+
+        fixtures[f"speech/{seconds}s"] = path
+
+    for sentences in TRANSCRIPT_SIZES:
+        path = os.path.join(folder, f"text_{sentences}.txt")
+
+        if not os.path.exists(path):
+            with open(path, "w") as file:
+                file.write(make_transcript(sentences, seed=sentences))
+
+        fixtures[f"text/{sentences}"] = path
+
+    return fixtures
+
+
+def benchmark_vad(mode: str = "energy") -> dict:
+    """
+    Runs the voice-activity detection over the speech fixtures and reports the fraction of the audio it skips, 
+    then the real-time factor of mp3_to_text with and without it (skipped if the Vosk model is not installed).
+
+    Parameters
+    ----------
+    mode: str
+        The detector, "energy" or "webrtc".
+
+    Returns
+    -------
+    dict
+        The measurements for every fixture by name.
+    """
+    import youtube_summarizer as ys
+
+    fixtures = make_fixtures()
+    results = {}
+
+    for seconds in AUDIO_LENGTHS:
+        path = fixtures[f"speech/{seconds}s"]
+        speech = ys.SpeechFilter(mode)
+
+        with wave.open(path) as file:
+            blocks = iter(lambda: file.readframes(ys.STREAM_BLOCK), b"")
+            start = time.perf_counter()
+
+            for _ in speech.filter(blocks):
+                pass
+
+            vad_seconds = time.perf_counter() - start
+
+        result = {"skipped_fraction": round(speech.skipped, 3), "detector_rtf": round(vad_seconds / seconds, 5)}
+
+        for name, vad in (("full", None), ("vad", mode)):
+            child = _run_child(
+                "import time\nimport youtube_summarizer as ys\nys.models.get()\n"
+                f"start = time.perf_counter()\nys.mp3_to_text({path!r}, use_cache=False, vad={vad!r})\n"
+                f"elapsed = time.perf_counter() - start\nresult = {{'rtf': elapsed / {seconds}}}"
+            )
+            if "skipped" in child:
+                result["transcription_skipped"] = child["skipped"]
+                break
+
+            result[f"{name}_rtf"] = round(child["rtf"], 4)
+        else:
+            result["speedup"] = round(result["full_rtf"] / result["vad_rtf"], 2)
+
+        results[f"speech/{seconds}s"] = result
+        print(f"speech/{seconds}s: {result}")
+
+    print(json.dumps(results))
+    return results
+
+
+def _best_of(runs: list) -> dict:
+    """
+    Keeps the best value of every metric over repeated runs of a measurement (the lowest time, real-time factor 
+    and memory, the highest throughput), the one least disturbed by whatever else the machine was doing.
+    """
+    if any("skipped" in run for run in runs):
+        return next(run for run in runs if "skipped" in run)
+
+    return {metric: (max if metric == "tokens_per_s" else min)(run[metric] for run in runs) for metric in runs[0]}
+
+
+def run_suite(repeats: int = REPEATS) -> dict:
+    """
+    Measures every stage of the pipeline offline on the local fixtures: model-load time, the real-time factor of 
+    mp3_to_text, the tokens per second of punctuate_text, summarize_text and summarize_text_2, and the peak memory 
+    of each. Stages whose models are not installed are marked as skipped. Every measurement is taken `repeats` 
+    times and the best one is kept, so a single slow run does not show up as a regression.
+
+    Returns
+    -------
+    dict
+        The "meta" data of the run and the "results" of every measurement by name.
+    """
+    fixtures = make_fixtures()
+    results = {}
+
+    loads = {
+        "load/vosk": "ys.models.get()",
+        "load/punctuation": "ys.get_punctuation_model()",
+        "load/en_core_web_sm": "ys.get_nlp('en_core_web_sm')",
+        "load/sentencizer": "ys.get_nlp('sentencizer')",
+    }
+
+    for name, call in loads.items():
+        # a model is only loaded once per process, so every repeat is a fresh one
+        runs = [_run_child(f"import time\nimport youtube_summarizer as ys\nstart = time.perf_counter()\n{call}\nresult = {{'seconds': time.perf_counter() - start}}") for _ in range(repeats)]
+        results[name] = _best_of(runs)
+
+    for seconds in AUDIO_LENGTHS:
+        if f"audio/{seconds}s" not in fixtures:
+            results[f"mp3_to_text/{seconds}s"] = {"skipped": "ffmpeg is needed to generate the audio"}
+            continue
+
+        path = fixtures[f"audio/{seconds}s"]
+        results[f"mp3_to_text/{seconds}s"] = _run_child(
+            "import time\nimport youtube_summarizer as ys\nys.models.get()\ntimes = []\n"
+            f"for _ in range({repeats}):\n    start = time.perf_counter()\n    ys.mp3_to_text({path!r}, stream=True, use_cache=False)\n"
+            f"    times.append(time.perf_counter() - start)\nelapsed = min(times)\nresult = {{'seconds': elapsed, 'rtf': elapsed / {seconds}}}"
+        )
+
+    stages = {
+        "punctuate_text": "ys.punctuate_text(text, windowed=True, print_text=False)",
+        "summarize_text": "ys.summarize_text(text)",
+        "summarize_text_2": "ys.summarize_text_2(text)",
+    }
+
+    for name, call in stages.items():
+        for sentences in TRANSCRIPT_SIZES:
+            # punctuating 10k sentences on a CPU takes far too long for a benchmark run
+            if name == "punctuate_text" and sentences > 1000:
+                continue
+
+            # the first call on a short text loads the models and libraries, which load/* measures on its own
+            path = fixtures[f"text/{sentences}"]
+            results[f"{name}/{sentences}"] = _run_child(
+                f"import time\nimport youtube_summarizer as ys\ntext = 'Warm up the models.'\n{call}\ntext = open({path!r}).read()\ntimes = []\n"
+                f"for _ in range({repeats}):\n    start = time.perf_counter()\n    {call}\n    times.append(time.perf_counter() - start)\n"
+                "elapsed = min(times)\nresult = {'seconds': elapsed, 'tokens_per_s': len(text.split()) / elapsed}"
+            )
+
+    for name, result in results.items():
+        print(f"{name:<28} {result}")
+
+    meta = {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+    return {"meta": meta, "results": results}
+
+
+def compare(current: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> list[str]:
+    """
+    Compares a suite run against a stored baseline run. A metric is only a regression if it got worse by more 
+    than `threshold` and by more than its NOISE_FLOOR (for the throughput, the floor of its time).
+
+    Parameters
+    ----------
+    current: dict
+        The run to check.
+    baseline: dict
+        The stored run to compare against.
+    threshold: float
+        How much worse (as a fraction) a metric may get before it counts as a regression.
+
+    Returns
+    -------
+    list[str]
+        A description of every regression, empty if there are none.
+    """
+    regressions = list()
+
+    for name, result in current["results"].items():
+        old = baseline["results"].get(name, {})
+
+        for metric, value in result.items():
+            if metric == "skipped" or metric not in old:
+                continue
+
+            # throughput should go up, everything else (time, real-time factor, memory) should go down
+            if metric == "tokens_per_s":
+                change = (old[metric] - value) / old[metric]
+                noise = result.get("seconds", 0) - old.get("seconds", 0) <= NOISE_FLOOR["seconds"]
+            else:
+                change = (value - old[metric]) / old[metric]
+                noise = value - old[metric] <= NOISE_FLOOR.get(metric, 0)
+
+            if change > threshold and not noise:
+                regressions.append(f"{name} {metric}: {old[metric]:.4g} -> {value:.4g} ({change:.0%} worse)")
+
+    return regressions
+
+
+def main(argv) -> None:
+    """
+    Runs the benchmark or check named in the arguments.
+
+    Parameters
+    ----------
+    argv
+        The name of the benchmark followed by its options, e.g. `memory --decode-only`.
+
+    Returns
+    -------
+    None
+    """
+    if len(argv) == 0 or argv[0] not in ("memory", "workers", "startup", "scoring", "downloads", "resume", "cache", "metrics", "vad", "service", "metadata", "streams", "stream-url", "pcm", "latency", "corpus", "suite"):
+        print("Usage: python3 benchmark.py memory [--decode-only]")
+        print("       python3 benchmark.py workers [<audio file with speech>]")
+        print("       python3 benchmark.py startup [<git revision to compare against>]")
+        print("       python3 benchmark.py scoring [<number of sentences>]")
+        print("       python3 benchmark.py downloads [<number of videos>]")
+        print("       python3 benchmark.py resume")
+        print("       python3 benchmark.py cache")
+        print("       python3 benchmark.py metrics")
+        print("       python3 benchmark.py vad [energy|webrtc]")
+        print("       python3 benchmark.py service [<number of jobs>] [<number of clients>]")
+        print("       python3 benchmark.py metadata [<number of videos>]")
+        print("       python3 benchmark.py streams")
+        print("       python3 benchmark.py stream-url [<seconds of speech>]")
+        print("       python3 benchmark.py pcm [<seconds of speech>]")
+        print("       python3 benchmark.py latency [<audio file with speech>]")
+        print("       python3 benchmark.py corpus [<number of transcripts>]")
+        print("       python3 benchmark.py suite [--save <results.json>] [--baseline <baseline.json>] [--threshold <fraction>] [--repeats <n>]")
+        sys.exit(2)
+
+    if argv[0] == "memory":
+        if check_stream_memory(transcribe="--decode-only" not in argv)["passed"] is False:
+            sys.exit(1)
+
+    elif argv[0] == "workers":
+        results = benchmark_workers(filename=argv[1] if len(argv) > 1 else None)
+
+        if results["passed"] is False:
+            sys.exit(1)
+
+    elif argv[0] == "startup":
+        compare_startup(baseline=argv[1] if len(argv) > 1 else None)
+
+    elif argv[0] == "scoring":
+        results = benchmark_scoring(sentences=int(argv[1]) if len(argv) > 1 else 10000)
+
+        if not all(result["identical"] for result in results.values()):
+            sys.exit(1)
+
+    elif argv[0] == "downloads":
+        summary = benchmark_downloads(count=int(argv[1]) if len(argv) > 1 else 200)
+
+        if summary["passed"] is False:
+            sys.exit(1)
+
+    elif argv[0] == "resume":
+        if not check_resume():
+            sys.exit(1)
+
+    elif argv[0] == "cache":
+        if benchmark_cache()["passed"] is False:
+            sys.exit(1)
+
+    elif argv[0] == "metrics":
+        if benchmark_metrics()["passed"] is False:
+            sys.exit(1)
+
+    elif argv[0] == "vad":
+        benchmark_vad(mode=argv[1] if len(argv) > 1 else "energy")
+
+    elif argv[0] == "service":
+        try:
+            results = load_test_service(count=int(argv[1]) if len(argv) > 1 else 100, clients=int(argv[2]) if len(argv) > 2 else 16)
+        except ValueError as e:
+            print(e)
+            sys.exit(2)
+
+        if results["passed"] is False:
+            sys.exit(1)
+
+    elif argv[0] == "metadata":
+        if benchmark_metadata(count=int(argv[1]) if len(argv) > 1 else 100)["passed"] is False:
+            sys.exit(1)
+
+    elif argv[0] == "streams":
+        if benchmark_streams()["passed"] is False:
+            sys.exit(1)
+
+    elif argv[0] == "stream-url":
+        if benchmark_stream_url(seconds=int(argv[1]) if len(argv) > 1 else 120)["passed"] is False:
+            sys.exit(1)
+
+    elif argv[0] == "pcm":
+        if benchmark_pcm(seconds=int(argv[1]) if len(argv) > 1 else 600)["passed"] is False:
+            sys.exit(1)
+
+    elif argv[0] == "latency":
+        benchmark_latency(filename=argv[1] if len(argv) > 1 else None)
+
+    elif argv[0] == "corpus":
+        if benchmark_corpus(count=int(argv[1]) if len(argv) > 1 else 200)["passed"] is False:
+            sys.exit(1)
+
+    elif argv[0] == "suite":
+        options = dict(zip(argv[1::2], argv[2::2]))
+        run = run_suite(repeats=int(options.get("--repeats", REPEATS)))
+
+        if "--save" in options:
+            with open(options["--save"], "w") as file:
+                json.dump(run, file, indent=2)
+
+        if "--baseline" in options:
+            with open(options["--baseline"]) as file:
+                regressions = compare(run, json.load(file), float(options.get("--threshold", REGRESSION_THRESHOLD)))
+
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+
+            if len(regressions) > 0:
+                sys.exit(1)
+
+            print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
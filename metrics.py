@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+
+# resource only exists on Unix, elsewhere the peak memory is left out
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Every stage of the scripts (metadata fetch, download, decode, Vosk, punctuation, spaCy) is measured with
+# trace(). The totals per stage are always kept in memory, which only costs a few clock reads per call.
+# Set YOUTUBE_SUMMARIZER_TRACE to a file to also get one JSON line per call, and YOUTUBE_SUMMARIZER_METRICS to
+# a file to get the totals in the Prometheus text format when the program exits.
+TRACE_FILE = os.environ.get("YOUTUBE_SUMMARIZER_TRACE")
+METRICS_FILE = os.environ.get("YOUTUBE_SUMMARIZER_METRICS")
+
+_lock = threading.Lock()
+_totals = {}    # stage -> {"calls", "errors", "wall_seconds", "cpu_seconds", "bytes_in", "bytes_out"}
+_trace = None   # the open trace file
+
+
+def peak_rss() -> int:
+    """
+    Returns the peak resident memory of the process in kilobytes, None where it cannot be measured.
+    """
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # macOS reports bytes, Linux kilobytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class Span:
+    """
+    Measures one call of a stage: wall time, CPU time of the calling thread, peak RSS and the bytes that went
+    in and out (set by the caller on the span, e.g. `span.bytes_out = len(data)`).
+
+    Parameters
+    ----------
+    stage: str
+        The name of the stage, e.g. "audio.download".
+    bytes_in: int
+        The bytes the stage reads, if known up front.
+    fields
+        Anything else to put in the trace event, e.g. the file name.
+    """
+
+    def __init__(self, stage: str, bytes_in: int = 0, **fields):
+        self.stage = stage
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self.fields = fields
+
+
+    def __enter__(self) -> "Span":
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+
+    def __exit__(self, error_type, error, traceback) -> bool:
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+
+        with _lock:
+            totals = _totals.setdefault(self.stage, {"calls": 0, "errors": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "bytes_in": 0, "bytes_out": 0})
+            totals["calls"] += 1
+            totals["errors"] += error_type is not None
+            totals["wall_seconds"] += wall
+            totals["cpu_seconds"] += cpu
+            totals["bytes_in"] += self.bytes_in or 0
+            totals["bytes_out"] += self.bytes_out or 0
+
+            if TRACE_FILE is not None:
+                event = {
+                    "ts": round(time.time(), 6), "stage": self.stage, "thread": threading.current_thread().name,
+                    "wall_s": round(wall, 6), "cpu_s": round(cpu, 6), "peak_rss_kb": peak_rss(),
+                    "bytes_in": self.bytes_in, "bytes_out": self.bytes_out,
+                    "error": None if error is None else repr(error),
+                }
+                event.update(self.fields)
+                _write_event(event)
+
+        # never swallow the error of the stage
+        return False
+
+
+def trace(stage: str, bytes_in: int = 0, **fields) -> Span:
+    """
+    Returns a Span to measure a stage with, use it as `with trace("audio.decode", bytes_in=size) as span:`.
+    """
+    return Span(stage, bytes_in=bytes_in, **fields)
+
+
+def _write_event(event: dict) -> None:
+    global _trace
+
+    if _trace is None:
+        _trace = open(TRACE_FILE, "a", buffering=1)
+
+    _trace.write(json.dumps(event, default=str) + "\n")
+
+
+def snapshot() -> dict:
+    """
+    Returns a copy of the totals of every stage measured so far.
+    """
+    with _lock:
+        return {stage: dict(totals) for stage, totals in _totals.items()}
+
+
+def write_prometheus(path: str) -> None:
+    """
+    Writes the totals of every stage to a file in the Prometheus text format (for the node exporter's textfile
+    collector or anything else that reads it).
+
+    Parameters
+    ----------
+    path: str
+        The file to write, it is replaced in one go so a reader never sees half of it.
+    """
+    counters = [
+        ("calls", "youtube_summarizer_stage_calls_total", "Number of calls of the stage."),
+        ("errors", "youtube_summarizer_stage_errors_total", "Number of calls of the stage that raised an error."),
+        ("wall_seconds", "youtube_summarizer_stage_wall_seconds_total", "Wall time spent in the stage."),
+        ("cpu_seconds", "youtube_summarizer_stage_cpu_seconds_total", "CPU time of the calling threads spent in the stage."),
+        ("bytes_in", "youtube_summarizer_stage_bytes_in_total", "Bytes read by the stage."),
+        ("bytes_out", "youtube_summarizer_stage_bytes_out_total", "Bytes produced by the stage."),
+    ]
+    totals = snapshot()
+    lines = list()
+
+    for key, name, help_text in counters:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+
+        for stage in sorted(totals):
+            lines.append(f'{name}{{stage="{stage}"}} {totals[stage][key]}')
+
+    if peak_rss() is not None:
+        lines.append("# HELP youtube_summarizer_peak_rss_bytes Peak resident memory of the process.")
+        lines.append("# TYPE youtube_summarizer_peak_rss_bytes gauge")
+        lines.append(f"youtube_summarizer_peak_rss_bytes {peak_rss() * 1024}")
+
+    with open(path + ".tmp", "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+    os.replace(path + ".tmp", path)
+
+
+if METRICS_FILE is not None:
+    atexit.register(write_prometheus, METRICS_FILE)
@@ -0,0 +1,301 @@
+import sys
+import json
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+# a local stand-in for YouTube so the downloaders can be exercised without the network:
+#   GET /watch?v=<id>         -> JSON manifest with the title and the audio streams of the video
+#   GET /audio/<id>/<itag>    -> the bytes of one audio stream
+#   GET /stats                -> how many requests of each kind were served, and over how many connections
+
+
+def fake_audio(video_id: str, itag: int, size: int) -> bytes:
+    """
+    Returns the deterministic fake bytes of one stream, the same video and itag always give the same bytes.
+    """
+    seed = f"{video_id}/{itag}/".encode()
+    pattern = seed + bytes(range(256))
+
+    return (pattern * (size // len(pattern) + 1))[:size]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves the manifests and audio bytes of the videos of the server, keeping connections open between requests.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        super().setup()
+
+        with self.server.lock:
+            self.server.connections += 1
+
+
+    def log_message(self, format, *args) -> None:
+        # keep the output of the benchmarks clean
+        pass
+
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+
+        with self.server.lock:
+            self.server.requests[parts[0]] += 1
+
+        if parts[0] == "watch":
+            video_id = parse_qs(url.query).get("v", [""])[0]
+
+            if video_id not in self.server.videos:
+                return self._send(404, b"unknown video", "text/plain")
+
+            return self._send(200, json.dumps(self.server.manifest(video_id)).encode(), "application/json")
+
+        if parts[0] == "audio" and len(parts) == 3 and parts[1] in self.server.videos:
+            data = self.server.audio(parts[1], int(parts[2]))
+
+            if data is None:
+                return self._send(404, b"unknown stream", "text/plain")
+
+            return self._send_range(data)
+
+        if parts[0] == "stats":
+            with self.server.lock:
+                return self._send(200, json.dumps(dict(self.server.requests, connections=self.server.connections)).encode(), "application/json")
+
+        self._send(404, b"not found", "text/plain")
+
+
+    def _send_range(self, data: bytes) -> None:
+        """
+        Sends the audio bytes, only the asked part of them if there is a Range header (and the server honours 
+        them), and cuts the connection half way through if the server still has disconnects to inject.
+        """
+        status = 200
+        start, end = 0, len(data) - 1
+        requested = self.headers.get("Range")
+
+        if requested is not None and requested.startswith("bytes=") and self.server.ranges:
+            first, _, last = requested[len("bytes="):].partition("-")
+            start = int(first)
+            end = min(int(last), len(data) - 1) if len(last) > 0 else len(data) - 1
+            status = 206
+
+        body = data[start:(end+1)]
+
+        with self.server.lock:
+            self.server.served += 1
+            drop = self.server.disconnects > 0 and self.server.served > self.server.disconnect_after
+            self.server.disconnects -= drop
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Accept-Ranges", "bytes")
+
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+
+        self.end_headers()
+
+        if drop:
+            self.wfile.write(body[:(len(body) // 2)])
+            self.close_connection = True
+            return
+
+        self.wfile.write(body)
+
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    A local HTTP server that pretends to be YouTube.
+
+    Parameters
+    ----------
+    videos: dict
+        The videos to serve, video ID -> {"title": str, "streams": [{"itag": int, "mime_type": str, "abr": str, "filesize": int}]}.
+        When a stream has a "file" its bytes are read from that file instead of being made up.
+    port: int
+        The port to listen on, 0 picks a free one.
+    disconnects: int
+        The number of audio responses to cut off half way, to exercise resuming downloads.
+    disconnect_after: int
+        The number of audio responses served normally before the disconnects start.
+    ranges: bool
+        Set it to false to ignore Range headers and always send the whole stream, like some servers do.
+    """
+    daemon_threads = True
+
+    def __init__(self, videos: dict, port: int = 0, disconnects: int = 0, disconnect_after: int = 0, ranges: bool = True):
+        super().__init__(("127.0.0.1", port), StandInHandler)
+        self.videos = videos
+        self.disconnects = disconnects
+        self.disconnect_after = disconnect_after
+        self.ranges = ranges
+        self.served = 0
+        self.connections = 0
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+    def watch_url(self, video_id: str) -> str:
+        return f"{self.base_url}/watch?v={video_id}"
+
+
+    def manifest(self, video_id: str) -> dict:
+        video = self.videos[video_id]
+        streams = list()
+
+        for stream in video["streams"]:
+            stream = {key: value for key, value in stream.items() if key != "file"}
+            stream["url"] = f"{self.base_url}/audio/{video_id}/{stream['itag']}"
+            streams.append(stream)
+
+        return {"video_id": video_id, "title": video["title"], "streams": streams}
+
+
+    def audio(self, video_id: str, itag: int) -> bytes:
+        for stream in self.videos[video_id]["streams"]:
+            if stream["itag"] == itag:
+                if "file" in stream:
+                    with open(stream["file"], "rb") as file:
+                        return file.read()
+
+                return fake_audio(video_id, itag, stream["filesize"])
+
+        return None
+
+
+    def start(self) -> "StandInServer":
+        """
+        Serves requests in a background thread and returns the server.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def make_videos(count: int, size: int = 256 * 1024) -> dict:
+    """
+    Makes up `count` videos, each with the audio streams YouTube usually has: AAC at 128 kbps and Opus at 
+    50 and 160 kbps.
+
+    Parameters
+    ----------
+    count: int
+        The number of videos.
+    size: int
+        The size in bytes of the 50 kbps stream, the others are bigger in proportion to their bitrate.
+
+    Returns
+    -------
+    dict
+        The videos in the form StandInServer takes.
+    """
+    videos = {}
+
+    for i in range(count):
+        videos[f"video{i:04d}"] = {
+            "title": f"Stand-in video {i}",
+            "streams": [
+                {"itag": 140, "mime_type": "audio/mp4", "abr": "128kbps", "codecs": "mp4a.40.2", "filesize": size * 128 // 50},
+                {"itag": 249, "mime_type": "audio/webm", "abr": "50kbps", "codecs": "opus", "filesize": size},
+                {"itag": 251, "mime_type": "audio/webm", "abr": "160kbps", "codecs": "opus", "filesize": size * 160 // 50},
+            ],
+        }
+
+    return videos
+
+
+def stand_in_manifest(video: str) -> dict:
+    """
+    Looks a video up on the stand-in server, it can be handed to resolve as its `resolver`.
+
+    Parameters
+    ----------
+    video: str
+        The watch URL of the video on the stand-in server.
+
+    Returns
+    -------
+    dict
+        The manifest of the video, the same as youtube_manifest gives for a YouTube video.
+    """
+    from youtube_download import http_pool
+
+    status, _, body = http_pool.request(video)
+
+    if status != 200:
+        raise IOError(f"the stand-in server answered HTTP {status} for {video}")
+
+    return json.loads(body)
+
+
+def stand_in_download(video: str, title: str = "", directory: str = ".", use_cache: bool = False, purpose: str = "listening") -> str:
+    """
+    Downloads a video from the stand-in server with download_audio (so through the manifest and audio caches, 
+    in Range chunks over pooled connections). It can be handed to download_many as its `fetch`.
+
+    Parameters
+    ----------
+    video: str
+        The watch URL of the video on the stand-in server.
+    title: str
+        A new title for the MP3 file, otherwise the title of the video.
+    directory: str
+        The directory or folder to place the MP3 file in.
+    use_cache: bool
+        Set it to true to go through the local caches. It is off by default, the stand-in IDs would otherwise end 
+        up in the real caches of the user.
+    purpose: str
+        What the audio is for (see select_stream), it decides which stream is downloaded.
+
+    Returns
+    -------
+    str
+        The path of the MP3 file, None if the video could not be downloaded.
+    """
+    from youtube_download import download_audio
+
+    return download_audio(video, title, directory, use_cache=use_cache, resolver=stand_in_manifest, purpose=purpose)
+
+
+def main(argv) -> None:
+    """
+    Runs the stand-in server in the foreground.
+
+    Parameters
+    ----------
+    argv
+        The port to listen on and the number of videos to make up, e.g. `8000 50`.
+
+    Returns
+    -------
+    None
+    """
+    port = int(argv[0]) if len(argv) > 0 else 8000
+    count = int(argv[1]) if len(argv) > 1 else 10
+
+    server = StandInServer(make_videos(count), port=port)
+    print(f"Serving {count} stand-in videos on {server.base_url} (e.g. {server.watch_url('video0000')})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
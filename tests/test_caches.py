@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_download as yd
+
+
+def write(path: str, size: int) -> str:
+    with open(path, "wb") as file:
+        file.write(os.urandom(size))
+
+    return path
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
+
+
+class AudioCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.cache = yd.AudioCache(os.path.join(self.folder.name, "cache"), budget=2500)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.folder.name, name)
+
+    def test_hit_and_miss(self):
+        source = write(self.path("a.mp3"), 1000)
+        self.assertFalse(self.cache.get("a", 140, self.path("copy.mp3")))
+
+        self.cache.put("a", 140, source)
+        self.assertTrue(self.cache.get("a", 140, self.path("copy.mp3")))
+        self.assertEqual(read(self.path("copy.mp3")), read(source))
+
+        # another stream of the same video is another entry
+        self.assertFalse(self.cache.get("a", 251, self.path("other.mp3")))
+        self.assertEqual(self.cache.stats, {"hits": 1, "misses": 2, "bytes_saved": 1000})
+
+    def test_least_recently_used_is_dropped(self):
+        self.cache.put("a", 140, write(self.path("a.mp3"), 1000))
+        time.sleep(0.01)
+        self.cache.put("b", 140, write(self.path("b.mp3"), 1000))
+        time.sleep(0.01)
+
+        # using a makes b the least recently used, which goes when c takes the cache over budget
+        self.assertTrue(self.cache.get("a", 140, self.path("copy.mp3")))
+        time.sleep(0.01)
+        self.cache.put("c", 140, write(self.path("c.mp3"), 1000))
+
+        self.assertTrue(self.cache.get("a", 140, self.path("copy.mp3")))
+        self.assertFalse(self.cache.get("b", 140, self.path("copy.mp3")))
+        self.assertTrue(self.cache.get("c", 140, self.path("copy.mp3")))
+        self.assertEqual(sorted(os.listdir(self.cache.folder)), ["a-140", "c-140", "index.json", "index.lock"])
+
+    def test_a_file_over_budget_is_still_kept(self):
+        self.cache.put("big", 140, write(self.path("big.mp3"), 5000))
+        self.assertTrue(self.cache.get("big", 140, self.path("copy.mp3")))
+
+    def test_the_index_is_shared(self):
+        self.cache.put("a", 140, write(self.path("a.mp3"), 1000))
+        other = yd.AudioCache(self.cache.folder, budget=2500)
+
+        self.assertTrue(other.get("a", 140, self.path("copy.mp3")))
+
+
+class ManifestCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+
+    def manifest(self, url: str = "http://127.0.0.1/audio/a/140") -> dict:
+        return {"video_id": "a", "title": "A", "streams": [{"itag": 140, "url": url}]}
+
+    def test_hit_miss_and_ttl(self):
+        cache = yd.ManifestCache(self.folder.name, ttl=0.2)
+        self.assertIsNone(cache.get("a"))
+
+        cache.put("a", self.manifest())
+        self.assertEqual(cache.get("a")["title"], "A")
+
+        # a new process reads it from disk
+        self.assertEqual(yd.ManifestCache(self.folder.name, ttl=0.2).get("a")["title"], "A")
+
+        time.sleep(0.25)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats, {"hits": 1, "misses": 2})
+
+    def test_stream_urls_that_expire_first(self):
+        cache = yd.ManifestCache(self.folder.name, ttl=3600)
+
+        # the URL stops working in 20 minutes, so the entry is only used for 10
+        expire = int(time.time()) + 20 * 60
+        manifest = cache.put("a", self.manifest(f"https://example.googlevideo.com/videoplayback?expire={expire}&itag=140"))
+        self.assertEqual(manifest["expires"], expire - 10 * 60)
+
+        # a URL that is about to expire is never used
+        cache.put("b", self.manifest(f"https://example.googlevideo.com/videoplayback?expire={int(time.time()) + 60}"))
+        self.assertIsNone(cache.get("b"))
+
+    def test_expired_files_are_pruned(self):
+        yd.ManifestCache(self.folder.name, ttl=0.1).put("old", self.manifest())
+        self.assertEqual(len(os.listdir(self.folder.name)), 1)
+
+        # the next process removes it once it expired
+        time.sleep(0.15)
+
+        yd.ManifestCache(self.folder.name, ttl=3600).put("new", self.manifest())
+        self.assertEqual(len(os.listdir(self.folder.name)), 1)
+
+    def test_video_key(self):
+        self.assertEqual(yd.video_key("https://www.youtube.com/watch?v=abc&t=10"), "abc")
+        self.assertEqual(yd.video_key("https://youtu.be/abc"), "abc")
+        self.assertEqual(yd.video_key("http://127.0.0.1:8000/watch?v=abc"), "127.0.0.1:8000/abc")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import http.client
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+import youtube_download as yd
+import stand_in_server
+
+SIZE = 1024 * 1024
+CHUNK = 64 * 1024
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
+
+
+class RangeDownloadTest(unittest.TestCase):
+    """
+    range_download and stream_download against the stand-in server, which cuts responses off half way.
+    """
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.videos = {"clip": {"title": "Clip", "streams": [{"itag": 251, "mime_type": "audio/webm", "abr": "160kbps", "filesize": SIZE}]}}
+        self.expected = stand_in_server.fake_audio("clip", 251, SIZE)
+
+    def serve(self, **kwargs) -> str:
+        server = stand_in_server.StandInServer(self.videos, **kwargs).start()
+        self.addCleanup(server.shutdown)
+        self.server = server
+
+        return f"{server.base_url}/audio/clip/251"
+
+    def test_dropped_chunks_are_fetched_again(self):
+        url = self.serve(disconnects=3)
+        path = yd.range_download(url, os.path.join(self.folder.name, "clip.webm"), chunk_size=CHUNK, parallel=4)
+
+        self.assertEqual(read(path), self.expected)
+        self.assertFalse(os.path.exists(path + ".part.json"))
+        # the size was asked for, then every chunk once and the three that were cut off again
+        self.assertEqual(self.server.requests["audio"], 1 + SIZE // CHUNK + 3)
+
+    def test_an_interrupted_download_resumes(self):
+        chunks = SIZE // CHUNK
+        url = self.serve(disconnects=1, disconnect_after=chunks // 2)
+        path = os.path.join(self.folder.name, "clip.webm")
+
+        with self.assertRaises((OSError, http.client.HTTPException)):
+            yd.range_download(url, path, size=SIZE, chunk_size=CHUNK, retries=0)
+
+        with open(path + ".part.json") as file:
+            done = json.load(file)["done"]
+
+        # the chunk that was cut off is missing, the ones fetched before (or already on their way) were kept
+        saved = len(done)
+        self.assertNotIn(chunks // 2, done)
+        self.assertTrue(chunks // 2 <= saved < chunks)
+        before = self.server.requests["audio"]
+        yd.range_download(url, path, size=SIZE, chunk_size=CHUNK)
+
+        self.assertEqual(read(path), self.expected)
+        self.assertEqual(self.server.requests["audio"] - before, chunks - saved)
+
+    def test_progress_of_another_split_is_not_reused(self):
+        url = self.serve(disconnects=1, disconnect_after=4)
+        path = os.path.join(self.folder.name, "clip.webm")
+
+        with self.assertRaises((OSError, http.client.HTTPException)):
+            yd.range_download(url, path, size=SIZE, chunk_size=CHUNK, retries=0)
+
+        self.assertEqual(read(yd.range_download(url, path, size=SIZE, chunk_size=CHUNK * 2)), self.expected)
+
+    def test_stream_download_yields_the_chunks_in_order(self):
+        url = self.serve(disconnects=2)
+        chunks = list(yd.stream_download(url, chunk_size=100 * 1000, parallel=3))
+
+        self.assertEqual(b"".join(chunks), self.expected)
+        self.assertEqual([len(chunk) for chunk in chunks[:-1]], [100 * 1000] * (len(chunks) - 1))
+        self.assertEqual(os.listdir(self.folder.name), [])
+
+    def test_a_server_that_ignores_range_sends_the_file_once(self):
+        url = self.serve(ranges=False)
+        path = yd.range_download(url, os.path.join(self.folder.name, "clip.webm"), chunk_size=CHUNK)
+
+        self.assertEqual(read(path), self.expected)
+        self.assertEqual(self.server.requests["audio"], 1)
+
+        # with the size known up front, the first chunk gets the whole file
+        self.assertEqual(b"".join(yd.stream_download(url, size=SIZE, chunk_size=CHUNK, parallel=1)), self.expected)
+        self.assertEqual(self.server.requests["audio"], 2)
+
+        # and so may the chunks already on their way
+        path = yd.range_download(url, os.path.join(self.folder.name, "parallel.webm"), size=SIZE, chunk_size=CHUNK, parallel=4)
+        self.assertEqual(read(path), self.expected)
+        self.assertLessEqual(self.server.requests["audio"], 2 + 4)
+
+    def test_a_server_that_ignores_range_and_sends_too_little(self):
+        url = self.serve(ranges=False)
+
+        with self.assertRaises(OSError):
+            yd.range_download(url, os.path.join(self.folder.name, "clip.webm"), size=SIZE + 1, chunk_size=CHUNK)
+
+    def test_stream_download_is_traced(self):
+        url = self.serve()
+        before = metrics.snapshot().get("audio.download", {"calls": 0, "errors": 0, "bytes_in": 0})
+        self.assertEqual(len(b"".join(yd.stream_download(url, chunk_size=CHUNK))), SIZE)
+
+        # a caller that stops early is not an error
+        next(yd.stream_download(url, chunk_size=CHUNK))
+
+        after = metrics.snapshot()["audio.download"]
+        self.assertEqual(after["calls"] - before["calls"], 2)
+        self.assertEqual(after["errors"], before["errors"])
+        self.assertGreaterEqual(after["bytes_in"] - before["bytes_in"], SIZE + CHUNK)
+
+    def test_a_missing_file(self):
+        url = self.serve()
+
+        with self.assertRaises(OSError):
+            yd.range_download(url.replace("251", "140"), os.path.join(self.folder.name, "clip.webm"))
+
+
+class ResolveTest(unittest.TestCase):
+    """
+    The manifest lookups and bulk downloads against the stand-in server, which counts the requests.
+    """
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+
+        self.server = stand_in_server.StandInServer(stand_in_server.make_videos(6, size=32 * 1024)).start()
+        self.addCleanup(self.server.shutdown)
+        self.urls = [self.server.watch_url(f"video{i:04d}") for i in range(6)]
+
+        # the caches of the user are left alone
+        for name, cache in (("manifest_cache", yd.ManifestCache(os.path.join(self.folder, "manifests"))), ("audio_cache", yd.AudioCache(os.path.join(self.folder, "audio")))):
+            patcher = mock.patch.object(yd, name, cache)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_each_video_is_looked_up_once(self):
+        manifests = yd.resolve_many(self.urls + self.urls[:2], resolver=stand_in_server.stand_in_manifest)
+
+        self.assertEqual([manifest["video_id"] for manifest in manifests], [f"video{i:04d}" for i in list(range(6)) + [0, 1]])
+        self.assertLessEqual(self.server.requests["watch"], 8)
+
+        before = self.server.requests["watch"]
+        yd.resolve_many(self.urls, resolver=stand_in_server.stand_in_manifest)
+        self.assertEqual(self.server.requests["watch"], before)
+
+        yd.resolve_many(self.urls, resolver=stand_in_server.stand_in_manifest, use_cache=False)
+        self.assertEqual(self.server.requests["watch"], before + 6)
+
+    def test_a_missing_video_is_an_error_in_its_place(self):
+        manifests = yd.resolve_many([self.urls[0], self.server.watch_url("gone")], resolver=stand_in_server.stand_in_manifest)
+
+        self.assertEqual(manifests[0]["video_id"], "video0000")
+        self.assertIsInstance(manifests[1], IOError)
+
+    def test_download_many(self):
+        def fetch(video: str, directory: str = ".") -> str:
+            return stand_in_server.stand_in_download(video, directory=directory, use_cache=True)
+
+        videos = self.urls + [self.server.watch_url("gone")]
+        results = yd.download_many(videos, directory=self.folder, workers=3, fetch=fetch, resolver=stand_in_server.stand_in_manifest)
+
+        self.assertEqual([result["video"] for result in results], videos)
+        self.assertTrue(all(result["error"] is None and os.path.exists(result["path"]) for result in results[:-1]))
+        self.assertIsNone(results[-1]["path"])
+        self.assertIsNotNone(results[-1]["error"])
+
+        # every lookup was done once up front, the downloads used the cached manifests
+        self.assertEqual(self.server.requests["watch"], 7)
+
+        # the second time nothing is asked of the server
+        audio = self.server.requests["audio"]
+        yd.download_many(self.urls, directory=self.folder, workers=3, fetch=fetch, resolver=stand_in_server.stand_in_manifest)
+        self.assertEqual((self.server.requests["watch"], self.server.requests["audio"]), (7, audio))
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def test_connections_are_reused_and_limited(self):
+        server = stand_in_server.StandInServer(stand_in_server.make_videos(1, size=256 * 1024)).start()
+        self.addCleanup(server.shutdown)
+        pool = yd.ConnectionPool(per_host=2, busy_per_host=2)
+        url = f"{server.base_url}/audio/video0000/249"
+        in_use = {"now": 0, "most": 0}
+        lock = threading.Lock()
+        request = pool._take
+
+        # counted between taking a connection and giving it back
+        def take(key, fresh):
+            with lock:
+                in_use["now"] += 1
+                in_use["most"] = max(in_use["most"], in_use["now"])
+
+            return request(key, fresh)
+
+        def give(key, connection):
+            with lock:
+                in_use["now"] -= 1
+
+            yd.ConnectionPool._give(pool, key, connection)
+
+        with mock.patch.object(pool, "_take", take), mock.patch.object(pool, "_give", give):
+            threads = [threading.Thread(target=pool.request, args=(url,)) for _ in range(8)]
+
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(pool.stats["requests"], 8)
+        self.assertLessEqual(in_use["most"], 2)
+        self.assertLessEqual(server.connections, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
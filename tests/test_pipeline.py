@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_summarizer as ys
+
+
+class RunPipelineTest(unittest.TestCase):
+    """
+    run_pipeline with every stage stubbed: the downloads write a small file and put its transcript in a
+    temporary transcript cache, so nothing is decoded or transcribed.
+    """
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        cache = ys.TranscriptCache(os.path.join(self.folder.name, "transcripts"))
+
+        def download_audio(video: str, directory: str = ".") -> str:
+            # the first videos take the longest, so they finish out of order
+            time.sleep(0.05 / (1 + int(video[-1])))
+
+            if video.startswith("missing"):
+                return None
+
+            path = os.path.join(directory, f"{video}.mp3")
+
+            with open(path, "w") as file:
+                file.write(video)
+
+            cache.put(path, ys._mp3_to_text_settings(True, ys.MODEL_NAME), [f"words of {video}"])
+
+            return path
+
+        def summarize_text(text: str) -> str:
+            if "exits" in text:
+                # what _load does when a module is missing
+                sys.exit()
+
+            return text.upper()
+
+        for name, value in (("download_audio", download_audio), ("transcript_cache", cache), ("summarize_text", summarize_text),
+                            ("punctuate_text", lambda transcript, **kwargs: " ".join(transcript) + ".")):
+            patcher = mock.patch.object(ys, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_results_come_back_in_order(self):
+        videos = [f"video{i}" for i in range(6)]
+        results, stats = ys.run_pipeline(videos, workers={"download": 3}, queue_size=1, directory=self.folder.name)
+
+        self.assertEqual([result["video"] for result in results], videos)
+        self.assertEqual([result["summary"] for result in results], [f"WORDS OF VIDEO{i}." for i in range(6)])
+        self.assertTrue(all(result["error"] is None for result in results))
+
+        for name in ("download", "decode", "transcribe", "punctuate", "summarize"):
+            self.assertEqual(stats[name]["items"], 6)
+            self.assertLessEqual(stats[name]["max_queue"], 1)
+
+    def test_a_failed_video_does_not_stop_the_others(self):
+        videos = ["video0", "missing1", "exits2", "video3"]
+        results, _ = ys.run_pipeline(videos, workers={"download": 2}, directory=self.folder.name)
+
+        self.assertEqual([result["video"] for result in results], videos)
+        self.assertEqual(results[1]["error"], "download: the video could not be converted")
+        self.assertTrue(results[2]["error"].startswith("summarize: "))
+        self.assertEqual(results[2]["text"], "words of exits2.")
+        self.assertEqual((results[0]["summary"], results[3]["summary"]), ("WORDS OF VIDEO0.", "WORDS OF VIDEO3."))
+
+    def test_a_failed_video_skips_the_later_stages(self):
+        results, stats = ys.run_pipeline(["missing0", "video1"], directory=self.folder.name)
+
+        self.assertIsNone(results[0]["transcript"])
+        self.assertEqual(stats["download"]["items"], 2)
+        self.assertEqual(stats["summarize"]["items"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
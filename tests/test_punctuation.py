@@ -0,0 +1,91 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_summarizer as ys
+
+
+class FakePunctuationModel:
+    """
+    Stands in for deepmultilingualpunctuation's PunctuationModel: a word ending in 7 gets a full stop and one
+    ending in 3 a comma, whichever window it is in. Every word is split into two sub-tokens like the real
+    tokenizer does with long words, so the labels have to be picked the way PunctuationModel.predict does.
+    """
+
+    def __init__(self):
+        self.batches = list()
+        self.single = 0
+
+    def label(self, word: str) -> str:
+        return {"7": ".", "3": ","}.get(word[-1], "0")
+
+    def preprocess(self, text: str) -> list[str]:
+        return text.split()
+
+    def pipe(self, texts: list[str], batch_size: int) -> list[list[dict]]:
+        self.batches.append(len(texts))
+        results = list()
+
+        for text in texts:
+            result = list()
+            end = 0
+
+            for word in text.split():
+                # the first sub-token has a label the stitching must not keep
+                result.append({"entity": "?", "score": 0.1, "end": end + 1})
+                end += len(word)
+                result.append({"entity": self.label(word), "score": 0.9, "end": end})
+                end += 1
+
+            results.append(result)
+
+        return results
+
+    def prediction_to_text(self, tagged: list) -> str:
+        return " ".join(word + (label if label != "0" else "") for word, label, _ in tagged)
+
+    def restore_punctuation(self, text: str) -> str:
+        self.single += 1
+        return self.prediction_to_text([[word, self.label(word), 0.9] for word in text.split()])
+
+
+class PunctuateWindowsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.model = FakePunctuationModel()
+        patcher = mock.patch.object(ys, "get_punctuation_model", return_value=self.model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_windows_give_the_single_pass_result(self):
+        text = " ".join(f"w{i}" for i in range(1000))
+        whole = self.model.restore_punctuation(text)
+
+        for window, overlap, batch_size in ((230, 20, 8), (100, 10, 3), (50, 11, 1), (999, 20, 8)):
+            with self.subTest(window=window, overlap=overlap, batch_size=batch_size):
+                self.assertEqual(ys._punctuate_windows(text, window, overlap, batch_size), whole)
+
+    def test_batches_are_bounded(self):
+        text = " ".join(f"w{i}" for i in range(1000))
+        ys._punctuate_windows(text, window=100, overlap=10, batch_size=3)
+
+        # 11 windows of 100 words that start every 90 words
+        self.assertEqual(self.model.batches, [3, 3, 3, 2])
+
+    def test_short_text_is_one_window(self):
+        text = " ".join(f"w{i}" for i in range(50))
+
+        self.assertEqual(ys._punctuate_windows(text, window=50), self.model.restore_punctuation(text))
+        self.assertEqual(self.model.batches, [])
+
+    def test_punctuate_text_windowed(self):
+        transcript = [" ".join(f"w{i}" for i in range(start, start + 100)) for start in range(0, 1000, 100)]
+
+        self.assertEqual(ys.punctuate_text(transcript, windowed=True, print_text=False), ys.punctuate_text(transcript, print_text=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_summarizer as ys
+
+BYTES_PER_SECOND = ys.FRAME_RATE * ys.CHANNELS * ys.SAMPLE_WIDTH
+
+
+def audio(*parts) -> bytes:
+    """
+    Builds 16 kHz mono PCM from (ms, loud) parts: a 440 Hz tone when loud, silence otherwise.
+    """
+    pieces = list()
+
+    for ms, loud in parts:
+        count = ys.FRAME_RATE * ms // 1000
+        samples = 8000 * np.sin(2 * np.pi * 440 * np.arange(count) / ys.FRAME_RATE) if loud else np.zeros(count)
+        pieces.append(samples.astype("<i2").tobytes())
+
+    return b"".join(pieces)
+
+
+def blocks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:(i+size)]
+
+
+class FakeRecognizer:
+    """
+    Stands in for a Vosk KaldiRecognizer: it finishes an utterance every second of audio it is fed, the text
+    of which is the number of bytes in it.
+    """
+
+    def __init__(self):
+        self.buffer = 0
+
+    def AcceptWaveform(self, data: bytes) -> bool:
+        self.buffer += len(data)
+        return self.buffer >= BYTES_PER_SECOND
+
+    def Result(self) -> str:
+        return self._result()
+
+    def FinalResult(self) -> str:
+        return self._result()
+
+    def _result(self) -> str:
+        text, self.buffer = str(self.buffer), 0
+        return json.dumps({"text": text, "result": [{"word": text, "start": 0.0, "end": 0.5, "conf": 1.0}]})
+
+
+class SpeechFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        # two tones far enough apart that the padding around them does not join them
+        self.data = audio((1000, False), (600, True), (2000, False), (600, True), (1000, False))
+        self.speech = ys.SpeechFilter("energy")
+        # blocks that do not line up with the frames
+        self.kept = b"".join(self.speech.filter(blocks(self.data, 1000)))
+
+    def test_keeps_only_the_speech_and_its_padding(self):
+        self.assertEqual(self.speech.total, len(self.data))
+        self.assertEqual(self.speech.kept, len(self.kept))
+        self.assertEqual(len(self.speech.regions), 2)
+        self.assertGreater(self.speech.skipped, 0.5)
+
+        # every loud sample made it through
+        loud = np.count_nonzero(np.frombuffer(self.data, dtype="<i2"))
+        self.assertEqual(np.count_nonzero(np.frombuffer(self.kept, dtype="<i2")), loud)
+
+        # each region is the tone with about VAD_PADDING on either side
+        for (kept, start), tone in zip(self.speech.regions, (1.0, 3.6)):
+            self.assertAlmostEqual(start / BYTES_PER_SECOND, tone - ys.VAD_PADDING / 1000, delta=ys.VAD_FRAME / 1000)
+
+    def test_regions_map_back_to_the_original(self):
+        (first_kept, first), (second_kept, second) = self.speech.regions
+        self.assertEqual(self.speech.starts, [first_kept, second_kept])
+        self.assertEqual(first_kept, 0)
+
+        self.assertEqual(self.speech.original(0.0), first / BYTES_PER_SECOND)
+        self.assertEqual(self.speech.original(0.25), round(first / BYTES_PER_SECOND + 0.25, 3))
+
+        boundary = second_kept / BYTES_PER_SECOND
+        self.assertEqual(self.speech.original(boundary), round(second / BYTES_PER_SECOND, 3))
+        self.assertEqual(self.speech.original(boundary + 0.1), round(second / BYTES_PER_SECOND + 0.1, 3))
+
+        # with end, the time where the pieces meet is the end of the first one
+        self.assertEqual(self.speech.original(boundary, end=True), round((first + second_kept) / BYTES_PER_SECOND, 3))
+
+    def test_the_block_size_does_not_matter(self):
+        other = ys.SpeechFilter("energy")
+        self.assertEqual(b"".join(other.filter(blocks(self.data, 7777))), self.kept)
+        self.assertEqual(other.regions, self.speech.regions)
+
+    def test_silence_is_dropped(self):
+        speech = ys.SpeechFilter("energy")
+        self.assertEqual(b"".join(speech.filter(blocks(audio((2000, False)), 4000))), b"")
+        self.assertEqual(speech.skipped, 1.0)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            ys.SpeechFilter("loudness")
+
+
+class IterBlocksTest(unittest.TestCase):
+
+    def test_segments_cover_the_audio(self):
+        data = audio((3500, True))
+
+        with mock.patch.object(ys.models, "recognizer", return_value=FakeRecognizer()):
+            segments = list(ys._iter_blocks(blocks(data, 8000)))
+
+        self.assertEqual([(segment["start"], segment["end"]) for segment in segments], [(0, 1), (1, 2), (2, 3), (3, 3.5)])
+        self.assertEqual(sum(int(segment["text"]) for segment in segments), len(data))
+
+    def test_times_of_filtered_audio_are_the_original_times(self):
+        data = audio((1000, False), (600, True), (2000, False), (600, True), (1000, False))
+        speech = ys.SpeechFilter("energy")
+
+        with mock.patch.object(ys.models, "recognizer", return_value=FakeRecognizer()):
+            segments = list(ys._iter_blocks(speech.filter(blocks(data, 8000)), speech=speech))
+
+        (_, first), (second_kept, second) = speech.regions
+        self.assertEqual(segments[0]["start"], round(first / BYTES_PER_SECOND, 3))
+        self.assertEqual(segments[-1]["end"], round((second + speech.kept - second_kept) / BYTES_PER_SECOND, 3))
+
+        # the recognizer only got the kept audio, less than half of the recording
+        self.assertEqual(sum(int(segment["text"]) for segment in segments), speech.kept)
+        self.assertLess(speech.kept, len(data) / 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import sys
+import wave
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_summarizer as ys
+import youtube_download as yd
+import stand_in_server
+from test_speech_filter import FakeRecognizer
+
+HAVE_FFMPEG = shutil.which("ffmpeg") is not None
+
+
+def write_wav(path: str, seconds: float, frame_rate: int = 44100) -> None:
+    """
+    Writes a stereo .wav of a 440 Hz tone, not in the format the recognizer takes so ffmpeg has to convert it.
+    """
+    count = int(seconds * frame_rate)
+    tone = (8000 * np.sin(2 * np.pi * 440 * np.arange(count) / frame_rate)).astype("<i2")
+    samples = np.repeat(tone, 2)
+
+    with wave.open(path, "wb") as file:
+        file.setnchannels(2)
+        file.setsampwidth(2)
+        file.setframerate(frame_rate)
+        file.writeframes(samples.tobytes())
+
+
+class StreamingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+
+        # the manifests of the stand-in do not go into the cache of the user
+        patcher = mock.patch.object(yd, "manifest_cache", yd.ManifestCache(os.path.join(self.folder.name, "manifests")))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def serve(self, videos: dict) -> stand_in_server.StandInServer:
+        server = stand_in_server.StandInServer(videos).start()
+        self.addCleanup(server.shutdown)
+
+        return server
+
+    def test_transcribe_url_feeds_the_download_to_the_decoder(self):
+        server = self.serve(stand_in_server.make_videos(1, size=200 * 1000))
+        video = server.watch_url("video0000")
+        stream = yd.select_stream(yd.resolve(video, resolver=stand_in_server.stand_in_manifest), "asr", prefer=("webm", "mpeg"))
+        fed = list()
+
+        # a decoder that passes the encoded bytes on as they are, so the recognizer counts the downloaded ones
+        def stream_pcm(filename: str, block_frames: int = ys.STREAM_BLOCK, chunks=None):
+            for chunk in chunks:
+                fed.append(len(chunk))
+                yield chunk
+
+        with mock.patch.object(ys, "stream_pcm", stream_pcm), mock.patch.object(ys.models, "recognizer", return_value=FakeRecognizer()):
+            segments = list(ys.transcribe_url(video, resolver=stand_in_server.stand_in_manifest))
+
+        self.assertEqual(stream["mime_type"], "audio/webm")
+        self.assertEqual(sum(fed), stream["filesize"])
+        self.assertEqual(sum(int(segment["text"]) for segment in segments), stream["filesize"])
+        self.assertEqual(sorted(os.listdir(self.folder.name)), ["manifests"])
+
+    @unittest.skipUnless(HAVE_FFMPEG, "ffmpeg is not installed")
+    def test_stream_pcm_gives_fixed_blocks_of_16khz_mono(self):
+        path = os.path.join(self.folder.name, "tone.wav")
+        write_wav(path, 3.0)
+        blocks = list(ys.stream_pcm(path, block_frames=4000))
+
+        self.assertTrue(all(len(block) == 4000 * ys.SAMPLE_WIDTH for block in blocks[:-1]))
+        self.assertAlmostEqual(sum(len(block) for block in blocks) / (ys.FRAME_RATE * ys.SAMPLE_WIDTH), 3.0, delta=0.05)
+
+    @unittest.skipUnless(HAVE_FFMPEG, "ffmpeg is not installed")
+    def test_stream_pcm_from_chunks_matches_the_file(self):
+        path = os.path.join(self.folder.name, "tone.wav")
+        write_wav(path, 2.0)
+
+        with open(path, "rb") as file:
+            data = file.read()
+
+        chunks = (data[i:(i+10000)] for i in range(0, len(data), 10000))
+        self.assertEqual(b"".join(ys.stream_pcm(path, chunks=chunks)), b"".join(ys.stream_pcm(path)))
+
+    @unittest.skipUnless(HAVE_FFMPEG, "ffmpeg is not installed")
+    def test_a_failed_download_is_not_the_end_of_the_audio(self):
+        path = os.path.join(self.folder.name, "tone.wav")
+        write_wav(path, 2.0)
+
+        def chunks():
+            with open(path, "rb") as file:
+                yield file.read(50000)
+
+            raise IOError("the connection dropped")
+
+        with self.assertRaises(IOError):
+            list(ys.stream_pcm(path, chunks=chunks()))
+
+    @unittest.skipUnless(HAVE_FFMPEG, "ffmpeg is not installed")
+    def test_an_undecodable_file(self):
+        path = os.path.join(self.folder.name, "noise.mp3")
+
+        with open(path, "wb") as file:
+            file.write(os.urandom(10000))
+
+        with self.assertRaises(RuntimeError):
+            list(ys.stream_pcm(path))
+
+    @unittest.skipUnless(HAVE_FFMPEG, "ffmpeg is not installed")
+    def test_transcribe_url_decodes_a_real_file(self):
+        path = os.path.join(self.folder.name, "tone.wav")
+        write_wav(path, 3.5)
+        server = self.serve({"tone": {"title": "Tone", "streams": [{"itag": 251, "mime_type": "audio/webm", "abr": "160kbps", "filesize": os.path.getsize(path), "file": path}]}})
+
+        with mock.patch.object(ys.models, "recognizer", return_value=FakeRecognizer()):
+            segments = list(ys.transcribe_url(server.watch_url("tone"), resolver=stand_in_server.stand_in_manifest))
+
+        # the fake recognizer finishes an utterance every second
+        self.assertEqual([segment["start"] for segment in segments], [0, 1, 2, 3])
+        self.assertAlmostEqual(segments[-1]["end"], 3.5, delta=0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
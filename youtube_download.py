@@ -1,10 +1,29 @@
 import sys
 import os
 import time
+import json
+import glob
+import shutil
+import subprocess
+import threading
+import http.client
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from types import SimpleNamespace
+from urllib.parse import urlparse, urljoin, parse_qs
+
+import metrics
+
+try:
+    import fcntl    # not on Windows, there only the threads of one process are kept apart
+except ImportError:
+    fcntl = None
 
 # libraries that are possibly not added (use pip)
 try:
     from pytube import YouTube
+    from pytube.helpers import safe_filename
     from pydub import AudioSegment
 except ImportError:
     print(ImportError.msg)
@@ -19,6 +38,569 @@ except ImportError:
     sys.exit()
 
 
+CHUNK_SIZE = 1024 * 1024    # bytes fetched by each HTTP Range request
+RETRIES = 5                 # attempts per chunk before giving up, a dropped connection only costs its chunk
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "youtube-audio-downloader")
+CACHE_BUDGET = 2 * 1024 ** 3    # bytes of audio kept in the cache before the least recently used files are dropped
+MANIFEST_TTL = 3 * 60 * 60      # seconds a title and stream list are reused, YouTube's stream URLs expire after ~6 hours
+POOL_SIZE = 8                   # idle connections kept open per host
+BUSY_PER_HOST = 4               # connections in use at the same time per host, more requests wait for one
+# the lowest bitrate in kbps good enough for each use, the smallest stream at or above it is downloaded. Speech 
+# recognition resamples to 16 kHz mono, so anything above ~48 kbps is thrown away there.
+QUALITY_FLOORS = {"asr": 48, "listening": 128, "archive": 160}
+
+
+class AudioCache:
+    """
+    A persistent cache of downloaded audio keyed by video ID and stream itag, so a video that was already 
+    downloaded (into any folder) is hard-linked or copied instead of fetched again. The cache keeps an index 
+    on disk and drops the least recently used files once they take more than `budget` bytes.
+
+    Parameters
+    ----------
+    folder: str
+        The folder the cached files and their index.json are kept in.
+    budget: int
+        The most bytes of audio to keep.
+    """
+
+    def __init__(self, folder: str = os.path.join(CACHE_DIR, "audio"), budget: int = CACHE_BUDGET):
+        self.folder = folder
+        self.budget = budget
+        self.stats = {"hits": 0, "misses": 0, "bytes_saved": 0}
+        self._lock = threading.Lock()
+
+
+    def get(self, video_id: str, itag: int, dest: str) -> bool:
+        """
+        Places the cached audio of a stream at `dest` if there is one.
+
+        Parameters
+        ----------
+        video_id: str
+            The ID of the YouTube video.
+        itag: int
+            The itag of the audio stream.
+        dest: str
+            Where the file should be placed.
+
+        Returns
+        -------
+        bool
+            True if it was in the cache (a hit), False otherwise.
+        """
+        key = f"{video_id}-{itag}"
+
+        with self._lock, self._index_lock():
+            index = self._read_index()
+            entry = index.get(key)
+
+            if entry is None or not os.path.exists(os.path.join(self.folder, key)):
+                self.stats["misses"] += 1
+                return False
+
+            entry["used"] = time.time()
+            self._write_index(index)
+
+            _place(os.path.join(self.folder, key), dest)
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += entry["size"]
+
+        return True
+
+
+    def put(self, video_id: str, itag: int, path: str) -> None:
+        """
+        Adds a downloaded file to the cache and drops the least recently used files if it is over budget.
+
+        Parameters
+        ----------
+        video_id: str
+            The ID of the YouTube video.
+        itag: int
+            The itag of the audio stream.
+        path: str
+            The downloaded file, it stays where it is.
+        """
+        key = f"{video_id}-{itag}"
+        os.makedirs(self.folder, exist_ok=True)
+
+        with self._lock, self._index_lock():
+            _place(path, os.path.join(self.folder, key))
+
+            index = self._read_index()
+            index[key] = {"size": os.path.getsize(path), "used": time.time()}
+
+            # least recently used first, the file that was just added is always kept
+            for old in sorted(index, key=lambda k: index[k]["used"]):
+                if sum(entry["size"] for entry in index.values()) <= self.budget or old == key:
+                    break
+
+                del index[old]
+
+                if os.path.exists(os.path.join(self.folder, old)):
+                    os.remove(os.path.join(self.folder, old))
+
+            self._write_index(index)
+
+
+    def report(self) -> str:
+        """
+        Returns the hit/miss/bytes-saved statistics as a line of text.
+        """
+        return f"Cache: {self.stats['hits']} hits, {self.stats['misses']} misses, {self.stats['bytes_saved'] / 1024 ** 2:.1f} MB not downloaded"
+
+
+    @contextmanager
+    def _index_lock(self):
+        # the index is read, changed and written back, so other processes using the same cache wait their turn
+        os.makedirs(self.folder, exist_ok=True)
+
+        with open(os.path.join(self.folder, "index.lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+    def _read_index(self) -> dict:
+        # read every time, another process may be using the same cache
+        try:
+            with open(os.path.join(self.folder, "index.json")) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+
+    def _write_index(self, index: dict) -> None:
+        os.makedirs(self.folder, exist_ok=True)
+        temp = os.path.join(self.folder, f"index.json.{os.getpid()}.tmp")
+
+        with open(temp, "w") as file:
+            json.dump(index, file)
+
+        os.replace(temp, os.path.join(self.folder, "index.json"))
+
+
+def _place(src: str, dest: str) -> None:
+    """
+    Hard-links `src` to `dest`, or copies it when a link is not possible (e.g. another drive).
+    """
+    if os.path.exists(dest):
+        os.remove(dest)
+
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+audio_cache = AudioCache()      # shared by every download in this process
+
+
+class ConnectionPool:
+    """
+    Keeps HTTP(S) connections open between requests, so the many chunks of a download and the many videos of a 
+    bulk run reuse a few connections to each host instead of paying for a new TCP and TLS handshake every time.
+
+    Parameters
+    ----------
+    per_host: int
+        The most idle connections kept open to one host.
+    timeout: float
+        The timeout in seconds of every connection.
+    busy_per_host: int
+        The most connections to one host (e.g. the server of the audio) in use at the same time, a request waits 
+        for one of them to be done.
+    """
+
+    def __init__(self, per_host: int = POOL_SIZE, timeout: float = 30, busy_per_host: int = BUSY_PER_HOST):
+        self.per_host = per_host
+        self.timeout = timeout
+        self.busy_per_host = busy_per_host
+        self.idle = {}      # (scheme, host) -> idle connections
+        self.busy = {}      # (scheme, host) -> semaphore of the connections in use
+        self.stats = {"requests": 0, "connections": 0}
+        self._lock = threading.Lock()
+
+
+    def request(self, url: str, headers: dict = None, method: str = "GET", redirects: int = 5) -> tuple:
+        """
+        Sends a request on a pooled connection and reads the whole response, following redirects.
+
+        Parameters
+        ----------
+        url: str
+            The URL to request.
+        headers: dict
+            The headers of the request, e.g. a Range.
+        method: str
+            The HTTP method.
+        redirects: int
+            The most redirects followed.
+
+        Returns
+        -------
+        tuple
+            The status, the headers and the body (bytes) of the response. Errors (4xx/5xx) are returned too.
+        """
+        for _ in range(redirects + 1):
+            parts = urlparse(url)
+            path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            key = (parts.scheme, parts.netloc)
+
+            with self._lock:
+                busy = self.busy.setdefault(key, threading.BoundedSemaphore(self.busy_per_host))
+
+            with busy:
+                # a kept connection may have been closed by the server in the meantime, then a new one is tried once
+                for fresh in (False, True):
+                    connection, reused = self._take(key, fresh)
+
+                    try:
+                        connection.request(method, path, headers=headers or {})
+                        response = connection.getresponse()
+                        break
+                    except (OSError, http.client.HTTPException):
+                        connection.close()
+
+                        if not reused:
+                            raise
+
+                # a response cut off part way is a real failure, it is left to the caller to retry
+                try:
+                    body = response.read()
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    raise
+
+                with self._lock:
+                    self.stats["requests"] += 1
+
+                if response.will_close:
+                    connection.close()
+                else:
+                    self._give(key, connection)
+
+            if response.status in (301, 302, 303, 307, 308) and response.headers.get("Location"):
+                url = urljoin(url, response.headers["Location"])
+                continue
+
+            return response.status, response.headers, body
+
+        raise IOError(f"too many redirects for {url}")
+
+
+    def _take(self, key: tuple, fresh: bool) -> tuple:
+        with self._lock:
+            if not fresh and len(self.idle.get(key, [])) > 0:
+                return self.idle[key].pop(), True
+
+            self.stats["connections"] += 1
+
+        scheme, host = key
+        connection_type = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+
+        return connection_type(host, timeout=self.timeout), False
+
+
+    def _give(self, key: tuple, connection) -> None:
+        with self._lock:
+            idle = self.idle.setdefault(key, [])
+
+            if len(idle) < self.per_host:
+                idle.append(connection)
+                return
+
+        connection.close()
+
+
+http_pool = ConnectionPool()    # shared by every request in this process
+
+
+class ManifestCache:
+    """
+    A persistent cache of the title and audio streams of videos, so repeat runs do not ask YouTube again. An 
+    entry is dropped after `ttl` seconds, or earlier if its stream URLs expire before that.
+
+    Parameters
+    ----------
+    folder: str
+        The folder the manifests are kept in, one JSON file per video.
+    ttl: float
+        The most seconds an entry is used for.
+    """
+
+    def __init__(self, folder: str = os.path.join(CACHE_DIR, "manifests"), ttl: float = MANIFEST_TTL):
+        self.folder = folder
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0}
+        self._memory = {}   # key -> manifest, so a process only reads each file once
+        self._pruned = False
+        self._lock = threading.Lock()
+
+
+    def get(self, key: str) -> dict:
+        """
+        Returns the cached manifest of a video, None if there is none or it expired.
+        """
+        with self._lock:
+            manifest = self._memory.get(key)
+
+            if manifest is None:
+                try:
+                    with open(self._path(key)) as file:
+                        manifest = json.load(file)
+                except (OSError, ValueError):
+                    manifest = None
+
+            if manifest is None or manifest["expires"] <= time.time():
+                self._memory.pop(key, None)
+                self.stats["misses"] += 1
+                return None
+
+            self._memory[key] = manifest
+            self.stats["hits"] += 1
+
+            return manifest
+
+
+    def put(self, key: str, manifest: dict) -> dict:
+        """
+        Caches the manifest of a video and returns it with the time it expires.
+        """
+        expires = time.time() + self.ttl
+
+        # googlevideo URLs carry the time they stop working
+        for stream in manifest["streams"]:
+            expire = parse_qs(urlparse(stream["url"]).query).get("expire")
+
+            if expire is not None:
+                expires = min(expires, int(expire[0]) - 10 * 60)
+
+        manifest = dict(manifest, expires=expires)
+        os.makedirs(self.folder, exist_ok=True)
+
+        with self._lock:
+            self._memory[key] = manifest
+            temp = f"{self._path(key)}.{os.getpid()}.tmp"
+
+            with open(temp, "w") as file:
+                json.dump(manifest, file)
+
+            os.replace(temp, self._path(key))
+
+            # the files that expired are removed once per process
+            if not self._pruned:
+                self._pruned = True
+                self._prune()
+
+        return manifest
+
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, hashlib.sha256(key.encode()).hexdigest()[:32] + ".json")
+
+
+    def _prune(self) -> None:
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+
+            try:
+                with open(path) as file:
+                    if json.load(file)["expires"] <= time.time():
+                        os.remove(path)
+            except (OSError, ValueError, KeyError):
+                pass
+
+
+manifest_cache = ManifestCache()    # shared by every lookup in this process
+
+
+def video_key(video: str) -> str:
+    """
+    Returns the cache key of a video URL: its video ID for YouTube (whatever form the URL has), otherwise the 
+    host and the video ID, so other servers (like the stand-in) never mix with YouTube.
+    """
+    url = urlparse(video.strip())
+    host = url.netloc.lower()
+    video_id = parse_qs(url.query).get("v", [url.path.rstrip("/").split("/")[-1]])[0]
+
+    if host.endswith("youtube.com") or host.endswith("youtu.be"):
+        return video_id
+
+    return f"{host}/{video_id}"
+
+
+def youtube_manifest(video: str) -> dict:
+    """
+    Asks YouTube (through pytube) for the title and audio streams of a video.
+
+    Parameters
+    ----------
+    video: str
+        A YouTube hyperlink or URL.
+
+    Returns
+    -------
+    dict
+        The manifest: "video_id", "title" and the audio "streams", each with its "itag", "mime_type", "abr", 
+        "codecs", "filesize" and "url".
+    """
+    yt = YouTube(video)
+    streams = list()
+
+    for stream in yt.streams.filter(only_audio=True):
+        streams.append({"itag": stream.itag, "mime_type": stream.mime_type, "abr": stream.abr, "codecs": ",".join(stream.codecs), "filesize": stream.filesize, "url": stream.url})
+
+    return {"video_id": yt.video_id, "title": yt.title, "streams": streams}
+
+
+def resolve(video: str, resolver=None, use_cache: bool = True) -> dict:
+    """
+    Returns the manifest of a video (see youtube_manifest), from the manifest cache if it was looked up recently.
+
+    Parameters
+    ----------
+    video: str
+        A YouTube hyperlink or URL.
+    resolver
+        The function that looks the video up, youtube_manifest by default. It can be swapped for a stand-in when testing.
+    use_cache: bool
+        Set it to false to always look the video up and not cache it.
+
+    Returns
+    -------
+    dict
+        The manifest.
+    """
+    key = video_key(video)
+
+    if use_cache:
+        manifest = manifest_cache.get(key)
+
+        if manifest is not None:
+            return manifest
+
+    with metrics.trace("youtube.metadata", video=video):
+        manifest = (resolver or youtube_manifest)(video)
+
+    if use_cache:
+        manifest = manifest_cache.put(key, manifest)
+
+    return manifest
+
+
+def resolve_many(videos: list, workers: int = 8, resolver=None, use_cache: bool = True) -> list:
+    """
+    Looks many videos up at the same time, see resolve.
+
+    Parameters
+    ----------
+    videos: list
+        The YouTube hyperlinks or URLs.
+    workers: int
+        The most videos looked up at the same time.
+    resolver
+        The function that looks a video up, youtube_manifest by default.
+    use_cache: bool
+        Set it to false to always look the videos up.
+
+    Returns
+    -------
+    list
+        The manifest of every video in the given order, or the error (an Exception) for the ones that failed.
+    """
+    def run(video: str):
+        try:
+            return resolve(video, resolver=resolver, use_cache=use_cache)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, videos))
+
+
+def _kbps(stream: dict) -> int:
+    # pytube gives e.g. "128kbps", a stream without it counts as the lowest quality
+    try:
+        return int(str(stream.get("abr")).lower().replace("kbps", ""))
+    except ValueError:
+        return 0
+
+
+def select_stream(manifest: dict, purpose: str = "listening", prefer: tuple = ()) -> dict:
+    """
+    Picks the audio stream to download for a purpose: the smallest one whose bitrate is at least the quality 
+    floor of the purpose (see QUALITY_FLOORS), or the best one if none is good enough.
+
+    Parameters
+    ----------
+    manifest: dict
+        The manifest of the video, see resolve.
+    purpose: str
+        "asr" (speech recognition), "listening" or "archive".
+    prefer: tuple
+        Containers (e.g. "webm") to pick from if any of their streams is good enough.
+
+    Returns
+    -------
+    dict
+        The stream of the manifest.
+    """
+    if purpose not in QUALITY_FLOORS:
+        raise ValueError(f"unknown purpose {purpose!r}, use one of {', '.join(QUALITY_FLOORS)}")
+
+    streams = manifest["streams"]
+    good = [stream for stream in streams if _kbps(stream) >= QUALITY_FLOORS[purpose]]
+    preferred = [stream for stream in good if stream["mime_type"].split("/")[-1] in prefer]
+
+    if len(preferred) > 0:
+        good = preferred
+
+    if len(good) == 0:
+        return max(streams, key=_kbps)
+
+    return min(good, key=lambda stream: (stream["filesize"] or float("inf"), _kbps(stream)))
+
+
+def audio_stream(manifest: dict, title: str = "", purpose: str = "listening"):
+    """
+    Returns the audio stream of a manifest picked for a purpose (see select_stream) with the attributes of a 
+    pytube Stream that save_stream uses (url, filesize, itag, mime_type, codecs, abr and default_filename), 
+    and how many bytes smaller it is than the first stream of the video (`bytes_saved`).
+
+    Parameters
+    ----------
+    manifest: dict
+        The manifest of the video, see resolve.
+    title: str
+        A new title for the file, otherwise the title of the video.
+    purpose: str
+        "asr" (speech recognition), "listening" or "archive".
+
+    Returns
+    -------
+    SimpleNamespace
+        The stream.
+    """
+    stream = select_stream(manifest, purpose)
+    extension = stream["mime_type"].split("/")[-1]
+
+    # the first stream is what was always downloaded before streams were picked
+    saved = (manifest["streams"][0]["filesize"] or 0) - (stream["filesize"] or 0)
+
+    return SimpleNamespace(
+        url=stream["url"], filesize=stream["filesize"], itag=stream["itag"], mime_type=stream["mime_type"],
+        codecs=stream.get("codecs", ""), abr=stream.get("abr"), bytes_saved=saved,
+        default_filename=f"{safe_filename(title or manifest['title'])}.{extension}",
+    )
+
+
 def convert_to_wav(filename: str, title: str = "") -> str:
     """
     Converts an existing mp3 file to a wav file and returns the title of the .wav file created.
@@ -51,7 +633,10 @@ def convert_to_wav(filename: str, title: str = "") -> str:
             
 
         # convert now from mp3 to wav
-        sound = AudioSegment.from_file(video)
+        with metrics.trace("audio.decode", bytes_in=os.path.getsize(video), file=video) as span:
+            sound = AudioSegment.from_file(video)
+            span.bytes_out = len(sound.raw_data)
+
         sound.export(dest, format="wav")
         return dest
     except Exception as e:
@@ -60,8 +645,380 @@ def convert_to_wav(filename: str, title: str = "") -> str:
         return
 
 
+def convert_many(source: str, output_dir: str = None, workers: int = None, frame_rate: int = None, channels: int = None) -> dict:
+    """
+    Converts many .mp3 files to .wav at once. Every file is streamed from the decoder to the encoder by its own 
+    ffmpeg process (so it is never held in memory) and several files are converted in parallel across the cores.
+
+    Parameters
+    ----------
+    source: str
+        A directory (every .mp3 in it is converted) or a glob pattern such as "downloads/*.mp3".
+    output_dir: str
+        The directory to write the .wav files to, otherwise next to each .mp3.
+    workers: int
+        The number of files converted at the same time, by default one per CPU core.
+    frame_rate: int
+        The sampling rate of the .wav files, e.g. 16000 to match the recognizer, otherwise the one of the source.
+    channels: int
+        The number of channels of the .wav files, e.g. 1 for mono, otherwise the one of the source.
+
+    Returns
+    -------
+    dict
+        The "converted" .wav files, the "failed" files with their error, the "bytes_written", the "seconds" it 
+        took and the "files_per_second".
+    """
+    if os.path.isdir(source):
+        files = sorted(glob.glob(os.path.join(glob.escape(source), "*.mp3")))
+    else:
+        files = sorted(glob.glob(source))
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    options = []
+
+    if frame_rate is not None:
+        options += ["-ar", str(frame_rate)]
+
+    if channels is not None:
+        options += ["-ac", str(channels)]
+
+    def convert(path: str) -> tuple:
+        base = os.path.splitext(os.path.basename(path))[0] + ".wav"
+        dest = os.path.join(output_dir if output_dir is not None else os.path.dirname(path), base)
+
+        # one thread per ffmpeg, the parallelism comes from converting several files at once
+        command = ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-threads", "1", "-i", path] + options + [dest]
+        try:
+            result = subprocess.run(command, capture_output=True, text=True)
+        except OSError as e:
+            return path, None, f"could not run ffmpeg ({e})"
+
+        if result.returncode != 0:
+            return path, None, result.stderr.strip() or f"ffmpeg exited with {result.returncode}"
+
+        return path, dest, None
+
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        results = list(pool.map(convert, files))
+
+    elapsed = time.perf_counter() - start
+    converted = [dest for _, dest, error in results if error is None]
+
+    report = {
+        "converted": converted,
+        "failed": {path: error for path, _, error in results if error is not None},
+        "bytes_written": sum(os.path.getsize(dest) for dest in converted),
+        "seconds": round(elapsed, 3),
+        "files_per_second": round(len(converted) / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+    print(f"Converted {len(converted)} of {len(files)} files to .wav in {report['seconds']}s ({report['files_per_second']} files per second, {report['bytes_written'] / 1024 ** 2:.1f} MB written)")
+
+    for path, error in report["failed"].items():
+        print(f"Error in converting INPUT:{path} to .wav file...\nERROR: {error}")
+
+    return report
+
+
+class _RangeIgnored(IOError):
+    """
+    Raised when a server answers a Range request with the whole file (HTTP 200), which is kept in `data` so it 
+    does not have to be downloaded again.
+    """
+
+    def __init__(self, url: str, data: bytes):
+        super().__init__(f"the server ignored the Range request for {url}")
+        self.data = data
+
+
+def _remote_size(url: str, retries: int = RETRIES) -> int:
+    """
+    Returns the size in bytes of a remote file by asking for its first byte.
+    """
+    for attempt in range(retries + 1):
+        try:
+            status, headers, body = http_pool.request(url, headers={"Range": "bytes=0-0"})
+            break
+        except (OSError, http.client.HTTPException):
+            if attempt == retries:
+                raise
+
+            time.sleep(min(0.1 * 2 ** attempt, 5))
+
+    content_range = headers.get("Content-Range")
+
+    if status == 206 and content_range is not None:
+        return int(content_range.split("/")[-1])
+
+    # the whole file came back instead of its first byte
+    if status == 200:
+        raise _RangeIgnored(url, body)
+
+    raise IOError(f"HTTP {status} for {url}")
+
+
+def _fetch_range(url: str, start: int, end: int, retries: int = RETRIES) -> bytes:
+    """
+    Fetches the bytes from `start` to `end` (included) of a remote file, again after a dropped connection until 
+    `retries` attempts have failed. A server that sends the whole file instead raises _RangeIgnored at once.
+    """
+    for attempt in range(retries + 1):
+        try:
+            # the chunks share a few kept-open connections
+            status, headers, data = http_pool.request(url, headers={"Range": f"bytes={start}-{end}"})
+
+            # a server that ignores Range sends the whole file, asking again would only send it again
+            if status == 200:
+                raise _RangeIgnored(url, data)
+
+            if status != 206 or not headers.get("Content-Range", "").startswith(f"bytes {start}-"):
+                raise IOError(f"the server did not honour the Range request (HTTP {status})")
+
+            if len(data) != end - start + 1:
+                raise IOError(f"got {len(data)} of {end - start + 1} bytes")
+
+            return data
+        except _RangeIgnored:
+            raise
+        except (OSError, http.client.HTTPException):
+            if attempt == retries:
+                raise
+
+            time.sleep(min(0.1 * 2 ** attempt, 5))
+
+
+class _RemoteFile:
+    """
+    Fetches the chunks of a remote file with Range requests. When the server ignores Range and sends the whole 
+    file instead, that answer is kept and the chunks are cut from it, so the file is downloaded once (by each 
+    chunk already on its way at most) instead of once per chunk.
+
+    Parameters
+    ----------
+    url: str
+        The URL of the file.
+    size: int
+        The size of the file in bytes if it is known, otherwise it is asked to the server.
+    retries: int
+        How many times a chunk is fetched again after a dropped connection before giving up.
+    """
+
+    def __init__(self, url: str, size: int = None, retries: int = RETRIES):
+        self.url = url
+        self.retries = retries
+        self.whole = None   # the file, once the server sent all of it
+
+        if size is None:
+            try:
+                size = _remote_size(url, retries)
+            except _RangeIgnored as e:
+                size, self.whole = len(e.data), e.data
+
+        self.size = size
+
+
+    def fetch(self, start: int, end: int) -> bytes:
+        """
+        Returns the bytes from `start` to `end` (included).
+        """
+        if self.whole is None:
+            try:
+                return _fetch_range(self.url, start, end, self.retries)
+            except _RangeIgnored as e:
+                if len(e.data) != self.size:
+                    raise IOError(f"got {len(e.data)} of {self.size} bytes of {self.url}") from None
+
+                self.whole = e.data
+
+        return self.whole[start:(end+1)]
+
+
+def stream_download(url: str, size: int = None, chunk_size: int = CHUNK_SIZE, parallel: int = 2, retries: int = RETRIES):
+    """
+    Downloads a file in HTTP Range chunks and yields them in order as they arrive, without writing anything to 
+    disk. The next chunks are already being fetched while the caller works on the current one.
+
+    Parameters
+    ----------
+    url: str
+        The URL of the file.
+    size: int
+        The size of the file in bytes if it is known, otherwise it is asked to the server.
+    chunk_size: int
+        The number of bytes fetched by each request.
+    parallel: int
+        The number of chunks fetched at the same time (and held in memory at most, unless the server ignores 
+        Range and sends the whole file at once).
+    retries: int
+        How many times a chunk is fetched again after a dropped connection before giving up.
+
+    Yields
+    ------
+    bytes
+        The chunks of the file.
+    """
+    remote = _RemoteFile(url, size, retries)
+    size = remote.size
+    pending = list()
+
+    # the chunks are handed on as they come, so the time the caller spends on them is in the wall time too
+    with metrics.trace("audio.download", url=url, streamed=True) as span, ThreadPoolExecutor(max_workers=parallel) as pool:
+        def result(future) -> bytes:
+            data = future.result()
+            span.bytes_in += len(data)
+            span.bytes_out += len(data)
+
+            return data
+
+        try:
+            for start in range(0, size, chunk_size):
+                pending.append(pool.submit(remote.fetch, start, min(size, start + chunk_size) - 1))
+
+                if len(pending) == parallel:
+                    yield result(pending.pop(0))
+
+            for future in pending:
+                yield result(future)
+        except GeneratorExit:
+            # the caller stopped early, which is not an error of the download
+            for future in pending:
+                future.cancel()
+
+
+def range_download(url: str, path: str, size: int = None, chunk_size: int = CHUNK_SIZE, parallel: int = 1, retries: int = RETRIES) -> str:
+    """
+    Downloads a file in HTTP Range chunks. Progress is saved next to the file (<path>.part and <path>.part.json), 
+    so if the download is interrupted, calling it again resumes from the chunks that are missing.
+
+    Parameters
+    ----------
+    url: str
+        The URL of the file.
+    path: str
+        Where the file will be saved.
+    size: int
+        The size of the file in bytes if it is known (pytube gives it), otherwise it is asked to the server.
+    chunk_size: int
+        The number of bytes fetched by each request.
+    parallel: int
+        The number of chunks fetched at the same time.
+    retries: int
+        How many times a chunk is fetched again after a dropped connection before giving up.
+
+    Returns
+    -------
+    str
+        The path of the downloaded file.
+    """
+    remote = _RemoteFile(url, size, retries)
+    size = remote.size
+    part = path + ".part"
+    state_file = path + ".part.json"
+    chunks = -(-size // chunk_size)
+    done = set()
+
+    # resume only if the saved progress is for the same file split the same way
+    if os.path.exists(part) and os.path.exists(state_file):
+        with open(state_file) as file:
+            state = json.load(file)
+
+        if state["size"] == size and state["chunk_size"] == chunk_size:
+            done = set(state["done"])
+
+    if len(done) == 0:
+        with open(part, "wb") as file:
+            file.truncate(size)
+
+    lock = threading.Lock()
+
+    def fetch(index: int) -> None:
+        start = index * chunk_size
+        data = remote.fetch(start, min(size, start + chunk_size) - 1)
+
+        with open(part, "r+b") as file:
+            file.seek(start)
+            file.write(data)
+
+        with lock:
+            done.add(index)
+
+            with open(state_file + ".tmp", "w") as file:
+                json.dump({"url": url, "size": size, "chunk_size": chunk_size, "done": sorted(done)}, file)
+
+            os.replace(state_file + ".tmp", state_file)
+
+    missing = [index for index in range(chunks) if index not in done]
+
+    with metrics.trace("audio.download", url=url) as span:
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            list(pool.map(fetch, missing))
+
+        # what came over the network is what was written to the file
+        span.bytes_in = span.bytes_out = sum(min(size, (index + 1) * chunk_size) - index * chunk_size for index in missing)
+
+    if len(done) != chunks or os.path.getsize(part) != size:
+        raise IOError(f"the download of {path} is incomplete ({os.path.getsize(part)} of {size} bytes)")
+
+    os.replace(part, path)
+    os.remove(state_file)
+
+    return path
+
+
+def save_stream(video_id: str, audio, directory: str = ".", use_cache: bool = True) -> str:
+    """
+    Saves an audio stream as an .mp3 file in a directory, from the cache if it was downloaded before. The bytes 
+    are not transcoded (ffmpeg reads them whatever the name says), so what the file really is, its container, 
+    codec, bitrate and size, is written next to it in <name>.mp3.json.
+
+    Parameters
+    ----------
+    video_id: str
+        The ID of the YouTube video.
+    audio: Stream
+        The audio stream (see audio_stream), its url, filesize, itag and default_filename are used.
+    directory: str
+        The directory or folder to place the MP3 file in.
+    use_cache: bool
+        Set it to false to always download the audio and not add it to the cache.
+
+    Returns
+    -------
+    str
+        The path of the MP3 file.
+    """
+    base, ext = os.path.splitext(os.path.join(directory, audio.default_filename))
+    audio_download = base + ".mp3"
+
+    if not (use_cache and audio_cache.get(video_id, audio.itag, audio_download)):
+        # download the audio in chunks, an interrupted download picks up where it stopped
+        download = range_download(audio.url, base + ext, size=audio.filesize)
+
+        # save the audio
+        os.rename(download, audio_download)
+
+        if use_cache:
+            audio_cache.put(video_id, audio.itag, audio_download)
+
+    stream = {
+        "video_id": video_id, "itag": audio.itag, "container": getattr(audio, "mime_type", "").split("/")[-1], 
+        "codec": getattr(audio, "codecs", ""), "abr": getattr(audio, "abr", None), 
+        "bytes": os.path.getsize(audio_download), "bytes_saved": getattr(audio, "bytes_saved", 0),
+    }
+
+    with open(audio_download + ".json", "w") as file:
+        json.dump(stream, file)
+
+    return audio_download
+
+
 # does not take in user input other than the URL and title if given one by the user
-def download_audio(video: str, title: str="", directory: str=".") -> None:
+def download_audio(video: str, title: str="", directory: str=".", use_cache: bool = True, resolver=None, purpose: str = "listening") -> str:
     """
     Converts a YouTube video into an .mp3 file.
 
@@ -73,43 +1030,127 @@ def download_audio(video: str, title: str="", directory: str=".") -> None:
         A new title for the MP3 file if the user wants to change the name of it, otherwise it will default to the title of the video.
     directory: str
         The directory or folder that we want to place the MP3 file in, otherwise it will default to the same folder. 
+    use_cache: bool
+        Set it to false to download the audio (and look the video up) even if it is in the local caches.
+    resolver
+        The function that looks the video up (see resolve), YouTube through pytube by default. It can be swapped 
+        for a stand-in when testing.
+    purpose: str
+        What the audio is for, "asr", "listening" or "archive": the smallest stream good enough for it is 
+        downloaded (see select_stream). "listening" by default.
 
     Returns
     -------
-    None
+    str
+        The path of the MP3 file, None if the video could not be converted.
     """
 
-    # convert into Youtube obj to get features
-    yt = None
+    # look the video up (title and audio streams), from the manifest cache if it was looked up recently
+    manifest = None
     try:
-        yt = YouTube(video)
+        manifest = resolve(video, resolver=resolver, use_cache=use_cache)
     except Exception as e:
         print("Failure in converting video...")
         print(f"ERROR: {e}")
         return
 
-    if len(title) > 0:
-        yt.title = title
+    if len(title) == 0:
+        title = manifest["title"]
 
-    name = f"\033[1;35;40m {yt.title} \u001b[0m"
+    name = f"\033[1;35;40m {title} \u001b[0m"
 
     # convert to an audio file
-    audio = yt.streams.filter(only_audio=True).first()
+    audio = audio_stream(manifest, title, purpose)
 
-    # download the audio
-    download = audio.download(output_path=directory)
+    # download the audio (or take it from the cache) and save it as .mp3
+    audio_download = save_stream(manifest["video_id"], audio, directory, use_cache=use_cache)
 
-    # save the audio
-    base, ext = os.path.splitext(download)
-    audio_download = base + ".mp3"
-    os.rename(download, audio_download)
+    # a better stream than the first one (e.g. for "archive") can be bigger
+    saved = audio.bytes_saved / 1024 ** 2
+    difference = f"{saved:.1f} MB less than" if saved >= 0 else f"{-saved:.1f} MB more than"
 
-    print(f"{name} has been downloaded\n")
-    time.sleep(0.5)
+    print(f"{name} has been downloaded ({audio.codecs} in {audio.mime_type.split('/')[-1]}, {audio.abr}, {difference} the first stream)\n")
+
+    return audio_download
 
 
 
-def download(video: str) -> str:
+def download_many(videos: list, directory: str = ".", workers: int = 4, per_host: int = None, fetch=download_audio, resolver=None, resolve_first: bool = True) -> list[dict]:
+    """
+    Downloads many YouTube videos at once with a pool of threads. A failure only affects its own video, 
+    the others keep going, and the overall progress is printed as each video finishes. The videos are first 
+    all looked up at once into the manifest cache (see resolve_many), so the downloads start from it instead of 
+    each one waiting for its own lookup, and a video that can not be looked up is not downloaded.
+
+    Parameters
+    ----------
+    videos: list
+        The YouTube hyperlinks or URLs in string format to download.
+    directory: str
+        The directory or folder that we want to place the MP3 files in.
+    workers: int
+        The most videos downloaded at the same time.
+    per_host: int
+        The most videos downloaded at the same time from one site (the host of their URLs, e.g. www.youtube.com), 
+        as many as the workers by default. The connections to the servers of the audio itself are limited by 
+        http_pool (see ConnectionPool).
+    fetch
+        The function that downloads one video, it takes the same arguments as download_audio and returns the path 
+        of the file. It can be swapped for a stand-in when testing.
+    resolver
+        The function the videos are looked up with, youtube_manifest by default. It has to be the one `fetch` 
+        looks them up with.
+    resolve_first: bool
+        Set it to false when `fetch` does not go through the manifest cache, the lookups would be wasted.
+
+    Returns
+    -------
+    list[dict]
+        One result per video in the given order, with the "video", the "path" of the file, the "error" if it 
+        failed (None otherwise) and the "seconds" it took.
+    """
+    limits = {}     # host -> semaphore, so no more than `per_host` videos of one site are downloaded at once
+    per_host = per_host or workers
+    lock = threading.Lock()
+    progress = {"done": 0, "failed": 0}
+    start = time.perf_counter()
+
+    # a lookup is small, so more of them run at the same time than downloads
+    manifests = resolve_many(videos, resolver=resolver) if resolve_first else [None] * len(videos)
+    lookups = dict(zip(videos, manifests))
+
+    def run(video: str) -> dict:
+        host = urlparse(video).netloc.lower()
+
+        with lock:
+            limit = limits.setdefault(host, threading.Semaphore(per_host))
+
+        with limit:
+            began = time.perf_counter()
+
+            try:
+                if isinstance(lookups[video], Exception):
+                    raise lookups[video]
+
+                path = fetch(video=video, directory=directory)
+                error = None if path else "the video could not be converted"
+            except Exception as e:
+                path, error = None, str(e)
+
+        result = {"video": video, "path": path, "error": error, "seconds": round(time.perf_counter() - began, 3)}
+
+        with lock:
+            progress["done"] += 1
+            progress["failed"] += error is not None
+            print(f"[{progress['done']}/{len(videos)}] {progress['failed']} failed, {time.perf_counter() - start:.1f}s elapsed")
+
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, videos))
+
+
+def download(video: str, use_cache: bool = True, purpose: str = "listening") -> str:
     """
     (Default function) Converts a YouTube video into an MP3 file. Here the user will be asked more information regarding their download.
 
@@ -117,6 +1158,10 @@ def download(video: str) -> str:
     ----------
     video: str
         A YouTube hyperlink or URL in string format that the function will convert to an audio file (MP3).
+    use_cache: bool
+        Set it to false to download the audio even if it is in the local audio cache.
+    purpose: str
+        What the audio is for (see select_stream), it decides which stream is downloaded.
 
     Returns
     -------
@@ -124,16 +1169,16 @@ def download(video: str) -> str:
         Title of the video downloaded.
     """
 
-    # convert into Youtube obj to get features
-    yt = None
+    # look the video up (title and audio streams), from the manifest cache if it was looked up recently
+    manifest = None
     try:
-        yt = YouTube(video)
+        manifest = resolve(video, use_cache=use_cache)
     except Exception as e:
         print("Failure in converting current video...")
         print("ERROR: {e}")
         return
 
-    name = yt.title
+    name = manifest["title"]
     title = name
     name = f"\033[1;35;40m {name} \u001b[0m"
 
@@ -156,14 +1201,14 @@ def download(video: str) -> str:
         title = input("Enter the new title for the mp3: ")
 
         name = f"\033[1;35;40m {title} \u001b[0m"
-        yt.title = title
 
         decision = input(
             f"\nThe current title is {name}.\nDo you wish to change it? Enter \033[1;31;40m Y \u001b[0m to do so. Otherwise enter any key to continue: "
         )
 
     # convert to an audio file
-    audio = yt.streams.filter(only_audio=True).first()
+    audio = audio_stream(manifest, title, purpose)
+
     directory = ""
     decision = "Y"
 
@@ -184,13 +1229,8 @@ def download(video: str) -> str:
             "Do you wish to change it?\nEnter \033[1;31;40m Y \u001b[0m to do so. Otherwise enter any key to continue: "
         )
 
-    # download the audio
-    download = audio.download(output_path=directory)
-
-    # save the audio
-    base, ext = os.path.splitext(download)
-    audio_download = base + ".mp3"
-    os.rename(download, audio_download)
+    # download the audio (or take it from the cache) and save it as .mp3
+    save_stream(manifest["video_id"], audio, directory, use_cache=use_cache)
 
     print(f"{name} has been downloaded\n")
 
@@ -253,19 +1293,36 @@ def main(argv) -> None:
     ----------
     argv
         Our arguments in the command line that are strings containing URLs to YouTube videos to convert. 
+        `--wav <directory or glob> [--out <directory>] [--rate <Hz>] [--channels <n>] [--workers <n>]` converts 
+        MP3 files to .wav in bulk instead and exits.
     
     Returns
     -------
     None
     
     """
-    for link in argv:
-        download_audio(video=link)
-
+    if len(argv) > 1 and argv[0] == "--wav":
+        options = dict(zip(argv[2::2], argv[3::2]))
+        convert_many(
+            argv[1],
+            output_dir=options.get("--out"),
+            workers=int(options["--workers"]) if "--workers" in options else None,
+            frame_rate=int(options["--rate"]) if "--rate" in options else None,
+            channels=int(options["--channels"]) if "--channels" in options else None,
+        )
+        return
 
     # By default will look at these as YouTube video link objects in the given argv 
     if len(argv) > 0:
-        print("All the given videos have been downloaded!")
+        results = download_many(argv)
+        failed = [result["video"] for result in results if result["error"] is not None]
+
+        if len(failed) == 0:
+            print("All the given videos have been downloaded!")
+        else:
+            print(f"{len(failed)} of the given videos could not be downloaded: {', '.join(failed)}")
+
+        print(audio_cache.report())
 
 
     prompter()
@@ -0,0 +1,376 @@
+import sys
+import os
+import json
+import time
+import uuid
+import queue
+import shutil
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import youtube_summarizer as ys
+
+
+# a long-running HTTP service around the summarizer, the models are loaded once and shared by every job:
+#   POST /jobs                    -> submit {"url": <YouTube URL>, "stages": [...], "version": 1, "stream": false,
+#                                    "tfidf": false}, or an MP3 file as the body with "Content-Type: audio/mpeg"
+#                                    (?stages=transcript,summary)
+#   GET  /jobs/<id>               -> the status of the job ("queued", "running", "ok" or "error") and its timings
+#   GET  /jobs/<id>/transcript    -> the punctuated transcript
+#   GET  /jobs/<id>/summary       -> the summary
+#   GET  /health                  -> the number of jobs waiting and running
+# When the queue is full, new jobs get "503 Service Unavailable" with a Retry-After header instead of piling up.
+
+
+WORKERS = 2         # jobs run at the same time, they share the loaded models
+QUEUE_SIZE = 16     # jobs waiting for a worker before new ones are turned away
+RETRY_AFTER = 5     # seconds a client turned away is told to wait
+KEEP_JOBS = 1000    # finished jobs remembered for polling, the oldest are forgotten first
+MAX_UPLOAD = 512 * 1024 * 1024  # bytes of the largest MP3 file accepted, bigger ones get 413
+MAX_JSON = 64 * 1024            # bytes of the largest JSON job accepted
+CHUNK_SIZE = 1024 * 1024        # an upload is copied to disk this many bytes at a time
+STAGES = ("wav", "transcript", "summary")
+JOBS_DIR = os.path.join(ys.CACHE_DIR, "jobs")
+
+
+class JobService:
+    """
+    Runs the jobs submitted to the HTTP service in a fixed pool of worker threads fed by a bounded queue.
+
+    Parameters
+    ----------
+    workers: int
+        The number of jobs run at the same time.
+    queue_size: int
+        The number of jobs that can wait for a worker, more are refused (see submit).
+    directory: str
+        Where the uploaded MP3 files go, and the downloads of every job in a folder of its own. Nothing a job 
+        writes can be fetched through the API, so it is all removed once the job is done.
+    fetch
+        The function that downloads a video (see run_job), it can be swapped for a stand-in when testing.
+    """
+
+    def __init__(self, workers: int = WORKERS, queue_size: int = QUEUE_SIZE, directory: str = JOBS_DIR, fetch=ys.download_audio):
+        self.directory = directory
+        self.fetch = fetch
+        self.jobs = OrderedDict()   # job ID -> record, see run_job
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.running = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+
+
+    def warm(self, version: int = 1) -> None:
+        """
+        Loads the Vosk model, the punctuation model and the spaCy pipeline before the first job needs them.
+        """
+        ys.models.get()
+        ys.get_punctuation_model()
+        ys.get_nlp("en_core_web_sm" if version == 1 else "sentencizer")
+
+
+    def submit(self, job: dict) -> dict:
+        """
+        Queues a job (see run_job) and returns its record, or None if the queue is full.
+        """
+        job_id = uuid.uuid4().hex[:16]
+        job = dict(job, id=job_id, directory=os.path.join(self.directory, job_id))
+        record = {"id": job_id, "status": "queued", "submitted": time.time(), "outputs": {}, "timings": {}, "error": None}
+
+        with self.lock:
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                return None
+
+            self.jobs[job_id] = record
+
+            while len(self.jobs) > KEEP_JOBS:
+                oldest = next(iter(self.jobs))
+
+                # never forget a job that is still waiting or running
+                if self.jobs[oldest]["status"] in ("queued", "running"):
+                    break
+
+                del self.jobs[oldest]
+
+        return record
+
+
+    def get(self, job_id: str) -> dict:
+        """
+        Returns a copy of the record of a job, None if there is no such job.
+        """
+        with self.lock:
+            record = self.jobs.get(job_id)
+            return None if record is None else json.loads(json.dumps(record))
+
+
+    def health(self) -> dict:
+        with self.lock:
+            return {"queued": self.queue.qsize(), "running": self.running, "capacity": self.queue.maxsize, "jobs": len(self.jobs)}
+
+
+    def _work(self) -> None:
+        while True:
+            job = self.queue.get()
+
+            with self.lock:
+                self.jobs[job["id"]]["status"] = "running"
+                self.running += 1
+
+            os.makedirs(job["directory"], exist_ok=True)
+            result = ys.run_job(job, fetch=self.fetch)
+
+            # only the transcript and summary can be fetched, the files (the download with its .json, an upload, 
+            # the .wav) would otherwise fill the disk of a long-running service
+            for path in (job["mp3"] if job.get("upload", False) else None, result["outputs"].pop("wav", None)):
+                if path is not None and os.path.exists(path):
+                    os.remove(path)
+
+            result["outputs"].pop("mp3", None)
+            shutil.rmtree(job["directory"], ignore_errors=True)
+
+            with self.lock:
+                self.jobs[job["id"]].update(result)
+                self.running -= 1
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    """
+    Serves the endpoints of the job service.
+    """
+
+    def log_message(self, format, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+
+        if url.path.rstrip("/") != "/jobs":
+            return self._send_json(404, {"error": "not found"})
+
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+        upload = content_type in ("audio/mpeg", "application/octet-stream")
+
+        # without a length the body would be read until the client closes the connection
+        if self.headers.get("Content-Length") is None and upload:
+            self.close_connection = True
+            return self._send_json(400, {"error": "the MP3 file needs a Content-Length"})
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+
+        if length < 0:
+            self.close_connection = True
+            return self._send_json(400, {"error": "Content-Length is not a number of bytes"})
+
+        # the body is not read, so the connection can not be used for another request
+        if length > (MAX_UPLOAD if upload else MAX_JSON):
+            self.close_connection = True
+            return self._send_json(413, {"error": f"the body is over {MAX_UPLOAD if upload else MAX_JSON} bytes"})
+
+        if upload:
+            query = parse_qs(url.query)
+            job = {"stages": query.get("stages", ["transcript,summary"])[0].split(","), "upload": True}
+
+            try:
+                job["version"] = int(query.get("version", ["1"])[0])
+            except ValueError:
+                job["version"] = None
+
+            error = _check_job(job) or ("the MP3 file is empty" if length == 0 else None)
+
+            if error is not None:
+                self.close_connection = True
+                return self._send_json(400, {"error": error})
+
+            job["mp3"] = os.path.join(self.server.service.directory, f"upload-{uuid.uuid4().hex[:16]}.mp3")
+
+            if not self._save_body(length, job["mp3"]):
+                return self._send_json(400, {"error": "the MP3 file ended before Content-Length bytes"})
+        else:
+            try:
+                job = json.loads(self.rfile.read(length))
+            except ValueError:
+                return self._send_json(400, {"error": "the body is not JSON"})
+
+            if not isinstance(job, dict) or not isinstance(job.get("url"), str):
+                return self._send_json(400, {"error": 'give a {"url": <YouTube URL>} or an MP3 file with Content-Type: audio/mpeg'})
+
+            job = {key: job[key] for key in ("url", "stages", "version", "stream", "tfidf", "wav_format") if key in job}
+            error = _check_job(job)
+
+            if error is not None:
+                return self._send_json(400, {"error": error})
+
+        record = self.server.service.submit(job)
+
+        if record is None:
+            if job.get("upload", False):
+                os.remove(job["mp3"])
+
+            return self._send_json(503, {"error": "too many jobs, try again later"}, {"Retry-After": str(RETRY_AFTER)})
+
+        self._send_json(202, record, {"Location": f"/jobs/{record['id']}"})
+
+
+    def _save_body(self, length: int, path: str) -> bool:
+        # copied a chunk at a time, so an upload never has to fit in memory; false (and no file) if it is cut short
+        with open(path, "wb") as file:
+            while length > 0:
+                chunk = self.rfile.read(min(CHUNK_SIZE, length))
+
+                if not chunk:
+                    break
+
+                file.write(chunk)
+                length -= len(chunk)
+
+        if length > 0:
+            os.remove(path)
+            self.close_connection = True
+
+        return length == 0
+
+
+    def do_GET(self) -> None:
+        parts = urlparse(self.path).path.strip("/").split("/")
+
+        if parts == ["health"]:
+            return self._send_json(200, self.server.service.health())
+
+        if parts[0] != "jobs" or len(parts) not in (2, 3):
+            return self._send_json(404, {"error": "not found"})
+
+        record = self.server.service.get(parts[1])
+
+        if record is None:
+            return self._send_json(404, {"error": "unknown job"})
+
+        if len(parts) == 2:
+            return self._send_json(200, record)
+
+        if parts[2] not in ("transcript", "summary"):
+            return self._send_json(404, {"error": "not found"})
+
+        # not there (yet): the client should keep polling the job, or it failed or did not ask for it
+        if parts[2] not in record["outputs"]:
+            return self._send_json(409 if record["status"] in ("queued", "running") else 404, {"status": record["status"], "error": record["error"] or f"the job has no {parts[2]}"})
+
+        self._send(200, record["outputs"][parts[2]].encode(), "text/plain; charset=utf-8")
+
+
+    def _send_json(self, status: int, body: dict, headers: dict = {}) -> None:
+        self._send(status, json.dumps(body).encode(), "application/json", headers)
+
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = {}) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+
+        for name, value in headers.items():
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _check_job(job: dict) -> str:
+    """
+    Returns what is wrong with the options of a submitted job, None if nothing is.
+    """
+    stages = job.get("stages", list(STAGES))
+
+    if not isinstance(stages, list) or not all(isinstance(stage, str) and stage in STAGES for stage in stages):
+        return f"stages must be a list of {', '.join(STAGES)}"
+
+    if job.get("version", 1) not in (1, 2) or isinstance(job.get("version"), bool):
+        return "version must be 1 or 2"
+
+    for option in ("stream", "tfidf"):
+        if not isinstance(job.get(option, False), bool):
+            return f"{option} must be true or false"
+
+    if job.get("wav_format", "source") not in ("source", "pcm"):
+        return 'wav_format must be "source" or "pcm"'
+
+    return None
+
+
+class JobServer(ThreadingHTTPServer):
+    """
+    The HTTP server of the job service.
+
+    Parameters
+    ----------
+    service: JobService
+        The service that runs the jobs.
+    host: str
+        The address to listen on.
+    port: int
+        The port to listen on, 0 picks a free one.
+    verbose: bool
+        Set it to true to log every request.
+    """
+    daemon_threads = True
+
+    def __init__(self, service: JobService, host: str = "127.0.0.1", port: int = 8080, verbose: bool = False):
+        super().__init__((host, port), JobHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+
+    def start(self) -> "JobServer":
+        """
+        Serves requests in a background thread and returns the server.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main(argv) -> None:
+    """
+    Runs the job service in the foreground.
+
+    Parameters
+    ----------
+    argv
+        Options: `--port <n>` (8080), `--host <address>` (127.0.0.1), `--workers <n>`, `--queue <n>` and
+        `--no-warm` to load the models with the first job instead of at start up.
+
+    Returns
+    -------
+    None
+    """
+    pairs = [arg for arg in argv if arg != "--no-warm"]
+    options = dict(zip(pairs[::2], pairs[1::2]))
+    service = JobService(workers=int(options.get("--workers", WORKERS)), queue_size=int(options.get("--queue", QUEUE_SIZE)))
+
+    if "--no-warm" not in argv:
+        print("Loading the models...")
+        service.warm()
+
+    server = JobServer(service, host=options.get("--host", "127.0.0.1"), port=int(options.get("--port", 8080)), verbose=True)
+    print(f"Serving jobs on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
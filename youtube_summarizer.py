@@ -2,43 +2,478 @@ import sys
 import os
 import time
 import json
-from deepmultilingualpunctuation    import PunctuationModel    # for punctuation
+import subprocess
+import threading
+import importlib
+import hashlib
+import queue
+import sqlite3
+import tempfile
+import struct
+import mmap
+import wave
+import metrics
+from concurrent.futures             import ProcessPoolExecutor, ThreadPoolExecutor
 from string                         import punctuation
-from collections                    import Counter
-from heapq                          import nlargest
+from collections                    import OrderedDict, deque
+from bisect                         import bisect_left, bisect_right
 
 
 
 FRAME_RATE = 16000  # for speech recognition, with sampling rate of 1600 Hz 
 CHANNELS = 1        # only will configure audio to single channel over L & R channels
-model = None        # will load model in try
-punctuation_model = PunctuationModel()
-rec = None          # the recognizer
+SAMPLE_WIDTH = 2    # 16-bit PCM, which is what the recognizer expects
+STREAM_BLOCK = 4000 # frames handed to the recognizer per read when streaming (0.25 seconds)
+MODEL_NAME = "vosk-model-small-en-us-0.15"  # the default Vosk model
+STEP = 45000        # ms of audio given to the recognizer at a time by mp3_to_text
+SESSION_FRAME = 200 # ms of audio given to the recognizer at a time by a RecognizerSession
+SEGMENT_LENGTH = 45000  # target length in ms of the pieces transcribed in parallel
+SILENCE_SEARCH = 5000   # how far in ms around each target cut to look for the quietest point
+VAD_FRAME = 30          # ms of audio the voice-activity detection decides on at a time (10, 20 or 30 for webrtcvad)
+VAD_PADDING = 300       # ms kept before and after speech so the first and last words are not clipped
+VAD_THRESHOLD = -45     # dBFS, louder frames count as speech for the energy detector
+VAD_AGGRESSIVENESS = 2  # how strictly webrtcvad filters out non-speech, from 0 to 3
+PUNCTUATION_WINDOW = 230    # words per window, the most the punctuation model takes without clipping the text
+PUNCTUATION_OVERLAP = 20    # words shared by neighbouring windows, the labels of each half come from the window they are central in
+PUNCTUATION_BATCH = 8       # windows run through the punctuation model at once
+PCM_MAGIC = b"YTAPCM01"   # the start of every PCM file written by decode_to_pcm
+PCM_HEADER = struct.Struct("<8sIHH")    # magic, frame rate, channels, sample width: 16 bytes before the samples
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "youtube-audio-downloader")
+CORPUS_DB = os.path.join(CACHE_DIR, "corpus.sqlite3")   # the document frequencies of every transcript, see CorpusStats
+punctuation_model = None    # loaded the first time some text is punctuated
+_punctuation_lock = threading.Lock()
+_nlp_pipelines = {}         # spaCy pipelines by name, loaded the first time they are used
+_nlp_lock = threading.Lock()
+
+
+# The libraries below are heavy (pytube, pydub, vosk, speech_recognition, spaCy and deepmultilingualpunctuation), 
+# so each one is only imported the first time a stage that needs it runs. A download-only run never loads the 
+# NLP or ASR libraries.
+def _load(module: str):
+    """
+    Imports a module the first time it is needed and returns it.
 
+    Parameters
+    ----------
+    module: str
+        The name of the module, e.g. "vosk" or "spacy.lang.en.stop_words".
 
+    Returns
+    -------
+    module
+        The imported module, the program exits if it is not installed.
+    """
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        print(e.msg)
+        print(
+            "\033[1;31;40m Couldn't import module(s)\u001b[0m"
+        )
+        print('The needed command for Python3 would be "pip3 install <MODULE>"')
+        print(
+            "\n***NOTE*** \n\tIt may not work if there are issues with your pip3 OR other...\n"
+        )
+        print("Exiting program...")
+        sys.exit()
 
 
-try:
-    from pytube                         import YouTube
-    from pydub                          import AudioSegment
-    from vosk                           import Model, KaldiRecognizer
-    # may delete this in the future as I found a new model 'vosk' to transcribe audio
-    import speech_recognition           as sr
-    import spacy                                                # For summarization
-    from spacy.lang.en.stop_words       import STOP_WORDS
+def get_punctuation_model():
+    """
+    Returns the punctuation model, loading it the first time it is needed.
+    """
+    global punctuation_model
 
+    with _punctuation_lock:
+        if punctuation_model is None:
+            punctuation_model = _load("deepmultilingualpunctuation").PunctuationModel()
 
-except ImportError:
-    print(ImportError.msg)
-    print(
-        "\033[1;31;40m Couldn't import module(s)\u001b[0m"
-    )
-    print('The needed command for Python3 would be "pip3 install <MODULE>"')
-    print(
-        "\n***NOTE*** \n\tIt may not work if there are issues with your pip3 OR other...\n"
-    )
-    print("Exiting program...")
-    sys.exit()
+    return punctuation_model
+
+
+class ModelRegistry:
+    """
+    Loads every Vosk model once per process and hands out recognizers for it, so a batch of files only pays the 
+    model load once. Several models (small and large, different languages) may stay resident, the least recently 
+    used one is dropped when there are more than `max_models` of them or their size goes over `memory_budget`.
+
+    Parameters
+    ----------
+    max_models: int
+        The most models to keep loaded at once.
+    memory_budget: int
+        The most bytes of models (measured by their size on disk) to keep loaded, None for no limit.
+    """
+
+    def __init__(self, max_models: int = 3, memory_budget: int = None):
+        self.max_models = max_models
+        self.memory_budget = memory_budget
+        self._models = OrderedDict()        # model name -> (Model, size in bytes), oldest first
+        self._lock = threading.Lock()
+        self._local = threading.local()     # recognizers kept per thread
+
+
+    def get(self, name: str = MODEL_NAME):
+        """
+        Returns the loaded Vosk model, loading it first if it is not resident.
+
+        Parameters
+        ----------
+        name: str
+            The name of a Vosk model (downloaded on first use) or the path to a model folder.
+
+        Returns
+        -------
+        Model
+            The loaded model.
+        """
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name][0]
+
+            if os.path.isdir(name):
+                model = _load("vosk").Model(name)
+                path = name
+            else:
+                model = _load("vosk").Model(model_name=name)
+                path = os.path.join(os.path.expanduser("~"), ".cache", "vosk", name)
+
+            self._models[name] = (model, _folder_size(path))
+            self._evict()
+
+            return model
+
+
+    def recognizer(self, name: str = MODEL_NAME, rate: int = FRAME_RATE, words: bool = True):
+        """
+        Returns a new recognizer for the given model, use it for one call.
+
+        Parameters
+        ----------
+        name: str
+            The name or path of the Vosk model.
+        rate: int
+            The sampling rate of the audio that will be fed to the recognizer.
+        words: bool
+            Set it to true to get the word timings in the results.
+
+        Returns
+        -------
+        KaldiRecognizer
+            A fresh recognizer.
+        """
+        rec = _load("vosk").KaldiRecognizer(self.get(name), rate)
+        rec.SetWords(words)
+
+        return rec
+
+
+    def thread_recognizer(self, name: str = MODEL_NAME, rate: int = FRAME_RATE, words: bool = True):
+        """
+        Returns a recognizer that is reused by the current thread, reset so it is ready for new audio.
+
+        Parameters
+        ----------
+        name: str
+            The name or path of the Vosk model.
+        rate: int
+            The sampling rate of the audio that will be fed to the recognizer.
+        words: bool
+            Set it to true to get the word timings in the results.
+
+        Returns
+        -------
+        KaldiRecognizer
+            The recognizer of this thread.
+        """
+        cache = self._local.__dict__.setdefault("recognizers", {})
+        model = self.get(name)
+        key = (name, rate, words)
+
+        # a model that was evicted and loaded again needs a new recognizer
+        if key not in cache or cache[key][0] is not model:
+            rec = _load("vosk").KaldiRecognizer(model, rate)
+            rec.SetWords(words)
+            cache[key] = (model, rec)
+
+        rec = cache[key][1]
+        rec.Reset()
+
+        return rec
+
+
+    def loaded(self) -> list[str]:
+        """
+        Returns the names of the resident models, least recently used first.
+        """
+        with self._lock:
+            return list(self._models.keys())
+
+
+    def _evict(self) -> None:
+        # always keep the model that was just loaded even if it alone is over the budget
+        while len(self._models) > 1:
+            total = sum(size for _, size in self._models.values())
+
+            if len(self._models) <= self.max_models and (self.memory_budget is None or total <= self.memory_budget):
+                break
+
+            self._models.popitem(last=False)
+
+
+def _folder_size(path: str) -> int:
+    """
+    Returns the size in bytes of all the files in a folder, 0 if it does not exist.
+    """
+    size = 0
+
+    for folder, _, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(folder, name))
+
+    return size
+
+
+models = ModelRegistry()    # shared by every call in this process
+
+
+class TranscriptCache:
+    """
+    An on-disk store of transcripts keyed by a hash of the audio content and the transcription settings 
+    (model, FRAME_RATE, CHANNELS and how the audio is cut into pieces). Changing any of the settings changes 
+    the key, so old transcripts are never returned for new settings.
+
+    Parameters
+    ----------
+    folder: str
+        The folder the transcripts are kept in, one JSON file each.
+    """
+
+    def __init__(self, folder: str = os.path.join(CACHE_DIR, "transcripts")):
+        self.folder = folder
+        self._hashes = {}   # (path, size, mtime) -> content hash, so a file is only hashed once per process
+
+
+    def audio_id(self, filename: str) -> str:
+        """
+        Returns the hash of the audio content of a file, the first part of the keys of its transcripts.
+        """
+        stat = os.stat(filename)
+        file_id = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+
+        if file_id not in self._hashes:
+            digest = hashlib.sha256()
+
+            with open(filename, "rb") as file:
+                for block in iter(lambda: file.read(1024 * 1024), b""):
+                    digest.update(block)
+
+            self._hashes[file_id] = digest.hexdigest()
+
+        return self._hashes[file_id]
+
+
+    def key(self, filename: str, settings: dict) -> str:
+        """
+        Returns the key of a transcript: the hash of the audio followed by the hash of the settings.
+        """
+        settings_hash = hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+        return f"{self.audio_id(filename)}-{settings_hash[:16]}"
+
+
+    def get(self, filename: str, settings: dict) -> list[str]:
+        """
+        Returns the stored transcript of the audio for these settings, None if there is none.
+        """
+        try:
+            with open(os.path.join(self.folder, self.key(filename, settings) + ".json")) as file:
+                return json.load(file)["transcript"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+    def put(self, filename: str, settings: dict, transcript: list[str]) -> None:
+        """
+        Stores the transcript of the audio for these settings.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        path = os.path.join(self.folder, self.key(filename, settings) + ".json")
+
+        with open(f"{path}.{os.getpid()}.tmp", "w") as file:
+            json.dump({"settings": settings, "transcript": transcript}, file)
+
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+
+transcript_cache = TranscriptCache()    # shared by every call in this process
+
+
+class CorpusStats:
+    """
+    The document frequencies of the words of every transcript summarized with TF-IDF (see summarize_text_2), 
+    kept in SQLite so each new transcript only updates the rows of its own words instead of the whole corpus 
+    being read again. The database is in WAL mode, so any number of threads and processes can read it while 
+    one writes, and a reader never sees half of an update. A transcript is only counted once, it is known by 
+    the audio it was transcribed from (see TranscriptCache.audio_id) or else by a hash of its text. The text of 
+    every transcript counted is kept as well, so the statistics can be counted again from exactly those.
+
+    Parameters
+    ----------
+    path: str
+        The SQLite database, it is created on first use.
+    """
+
+    def __init__(self, path: str = CORPUS_DB):
+        self.path = path
+        self._local = threading.local()     # SQLite connections can not be shared between threads
+
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+            # the transactions are started by hand, a write takes the lock before it reads anything
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(
+                "CREATE TABLE IF NOT EXISTS documents (id TEXT PRIMARY KEY, terms INTEGER NOT NULL, added REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS texts (id TEXT PRIMARY KEY, text TEXT NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS counts (name TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+                "INSERT OR IGNORE INTO counts VALUES ('documents', 0);"
+            )
+            self._local.connection = connection
+
+        return connection
+
+
+    def add(self, document: str, terms, text: str) -> bool:
+        """
+        Counts the words of a new transcript (see _corpus_terms) and keeps its text, returns false if the 
+        document was already counted.
+        """
+        terms = sorted(set(terms))
+        connection = self._connection()
+
+        connection.execute("BEGIN IMMEDIATE")
+
+        try:
+            if connection.execute("INSERT OR IGNORE INTO documents VALUES (?, ?, ?)", (document, len(terms), time.time())).rowcount == 0:
+                connection.execute("ROLLBACK")
+                return False
+
+            connection.execute("INSERT OR REPLACE INTO texts VALUES (?, ?)", (document, text))
+            connection.executemany("INSERT INTO terms VALUES (?, 1) ON CONFLICT(term) DO UPDATE SET df = df + 1", ((term,) for term in terms))
+            connection.execute("UPDATE counts SET value = value + 1 WHERE name = 'documents'")
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return True
+
+
+    def frequencies(self, terms: list) -> tuple[int, dict]:
+        """
+        Returns the number of transcripts and the number of them each of the given words is in (words in none 
+        of them are left out), read from the same snapshot of the database.
+        """
+        connection = self._connection()
+        terms = list(terms)
+        found = {}
+
+        connection.execute("BEGIN")
+
+        try:
+            documents = connection.execute("SELECT value FROM counts WHERE name = 'documents'").fetchone()[0]
+
+            # older SQLite versions take at most 999 parameters per query
+            for i in range(0, len(terms), 500):
+                chunk = terms[i:(i+500)]
+                query = f"SELECT term, df FROM terms WHERE term IN ({', '.join('?' * len(chunk))})"
+                found.update(connection.execute(query, chunk).fetchall())
+        finally:
+            connection.execute("COMMIT")
+
+        return documents, found
+
+
+    def idf(self, terms: list) -> list[float]:
+        """
+        Returns the smoothed inverse document frequency of each word, log((1 + N) / (1 + df)) + 1: a word in 
+        every transcript gets 1, a word in none of them the most.
+        """
+        np = _load("numpy")
+        documents, found = self.frequencies(terms)
+        df = np.array([found.get(term, 0) for term in terms], dtype=np.float64)
+
+        return np.log((1 + documents) / (1 + df)) + 1
+
+
+    def texts(self):
+        """
+        Yields the ID and the text of every transcript counted.
+        """
+        yield from self._connection().execute("SELECT id, text FROM texts ORDER BY id")
+
+
+    def rebuild(self, documents) -> int:
+        """
+        Replaces the statistics with those of the given transcripts in one transaction, readers see the old 
+        statistics until it is done. Each one is its ID, its list of words (see _corpus_terms) and its text, or 
+        None as the text if it is already kept (see texts). Returns the number of transcripts counted.
+        """
+        counts = dict()
+        keys = dict()
+        texts = dict()
+
+        for key, terms, text in documents:
+            if key not in keys:
+                terms = set(terms)
+                keys[key] = len(terms)
+
+                if text is not None:
+                    texts[key] = text
+
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+
+        try:
+            connection.execute("DELETE FROM documents")
+            connection.execute("DELETE FROM terms")
+            connection.executemany("INSERT INTO documents VALUES (?, ?, ?)", ((key, size, time.time()) for key, size in keys.items()))
+            connection.execute("DELETE FROM texts WHERE id NOT IN (SELECT id FROM documents)")
+            connection.executemany("INSERT OR REPLACE INTO texts VALUES (?, ?)", texts.items())
+            connection.executemany("INSERT INTO terms VALUES (?, ?)", counts.items())
+            connection.execute("UPDATE counts SET value = ? WHERE name = 'documents'", (len(keys),))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return len(keys)
+
+
+    def stats(self) -> dict:
+        """
+        Returns the number of transcripts and of different words counted.
+        """
+        connection = self._connection()
+        documents = connection.execute("SELECT value FROM counts WHERE name = 'documents'").fetchone()[0]
+        terms = connection.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+
+        return {"documents": documents, "terms": terms}
+
+
+corpus_stats = CorpusStats()    # shared by every call in this process, the database is opened on first use
 
 
 def wav_to_text(filename: str) -> str:
@@ -69,6 +504,7 @@ def wav_to_text(filename: str) -> str:
         video = convert_to_wav(video=video)
 
     # initialize the recognizer
+    sr = _load("speech_recognition")
     r = sr.Recognizer()
 
     # open the file
@@ -82,7 +518,7 @@ def wav_to_text(filename: str) -> str:
     return text
 
 
-def convert_to_wav(filename: str, title: str = "") -> str:
+def convert_to_wav(filename: str, title: str = "", pcm: str = None) -> str:
     """
     Converts an existing mp3 file to a wav file and returns the title of the .wav file created.
     
@@ -92,6 +528,9 @@ def convert_to_wav(filename: str, title: str = "") -> str:
         The video string that will be converted *NOTE* that it must be .mp3.
     title: str
         the name of the .wav if the user wants to rename it, otherwise it will use the name from the .mp3 file.
+    pcm: str
+        A PCM file of the same audio from decode_to_pcm (e.g. made for the transcription), the .wav is then 
+        written from it instead of decoding the .mp3 again, in its 16 kHz mono.
 
     Returns
     -------
@@ -113,8 +552,22 @@ def convert_to_wav(filename: str, title: str = "") -> str:
             video = video + ".mp3"
             
 
+        if pcm is not None:
+            with PcmFile(pcm) as audio, wave.open(dest, "wb") as file:
+                file.setnchannels(audio.channels)
+                file.setsampwidth(audio.sample_width)
+                file.setframerate(audio.frame_rate)
+
+                for block in audio.blocks(block_frames=audio.frame_rate):
+                    file.writeframes(block)
+
+            return dest
+
         # convert now from mp3 to wav
-        sound = AudioSegment.from_file(video)
+        with metrics.trace("audio.decode", bytes_in=os.path.getsize(video), file=video) as span:
+            sound = _load("pydub").AudioSegment.from_file(video)
+            span.bytes_out = len(sound.raw_data)
+
         sound.export(dest, format="wav")
         return dest
     except Exception as e:
@@ -123,93 +576,1126 @@ def convert_to_wav(filename: str, title: str = "") -> str:
         return
 
 
-def mp3_to_text(filename: str) -> list[str]:
+def stream_pcm(filename: str, block_frames: int = STREAM_BLOCK, chunks=None):
+    """
+    Decodes an audio file with ffmpeg into 16 kHz mono PCM and yields it in fixed-size blocks, so only one block 
+    is held in memory at a time no matter how long the audio is.
+
+    Parameters
+    ----------
+    filename: str
+        The existing audio file (.mp3 or anything else ffmpeg can read) that will be decoded.
+    block_frames: int
+        The number of frames in each block, by default a quarter of a second of audio.
+    chunks
+        The encoded audio as an iterable of bytes (e.g. a download in progress, see stream_download), fed to 
+        ffmpeg through a pipe instead of reading `filename`, which is then only used in the error messages.
+
+    Yields
+    ------
+    bytes
+        Raw 16-bit little-endian PCM at FRAME_RATE with CHANNELS channels.
+    """
+    command = [
+        "ffmpeg", "-nostdin", "-loglevel", "error",
+        "-i", filename if chunks is None else "pipe:0",
+        "-ac", str(CHANNELS), "-ar", str(FRAME_RATE), "-f", "s16le", "-",
+    ]
+    block_size = block_frames * CHANNELS * SAMPLE_WIDTH
+    failed = list()
+
+    # the errors go to a file, a full stderr pipe nobody reads until the end would make ffmpeg hang
+    errors = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, stdin=None if chunks is None else subprocess.PIPE, stdout=subprocess.PIPE, stderr=errors)
+
+    # the audio is fed to ffmpeg from another thread while this one reads what it has decoded so far
+    def feed() -> None:
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            # ffmpeg stopped reading: it failed (reported below) or the consumer stopped early
+            pass
+        except Exception as e:
+            failed.append(e)
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    if chunks is not None:
+        threading.Thread(target=feed, daemon=True).start()
+
+    try:
+        while True:
+            block = process.stdout.read(block_size)
+
+            if not block:
+                break
+
+            yield block
+    finally:
+        process.stdout.close()
+
+        # the consumer may stop early, in which case ffmpeg is still running
+        if process.poll() is None:
+            process.kill()
+
+        process.wait()
+        # the last lines are enough to say what went wrong
+        errors.seek(max(0, errors.seek(0, os.SEEK_END) - 4096))
+        error = errors.read().decode(errors="replace").strip()
+        errors.close()
+
+    # only reached once every block was read, an early stop by the consumer is not an error. A download that 
+    # failed half way looks like the end of the audio to ffmpeg, so it is checked first
+    if len(failed) > 0:
+        raise failed[0]
+
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode {filename}: {error}")
+
+
+def decode_to_pcm(filename: str, dest: str) -> str:
+    """
+    Decodes an audio file once into a raw file of 16 kHz mono PCM, streaming it through ffmpeg. Every stage that 
+    needs the samples (the recognizer, its pool workers, the voice-activity detection, the .wav export) can then 
+    read them from it with PcmFile instead of decoding the audio again.
+
+    Parameters
+    ----------
+    filename: str
+        The existing audio file.
+    dest: str
+        The name of the PCM file to write, it starts with a PCM_HEADER giving the format of the samples.
+
+    Returns
+    -------
+    str
+        The name of the PCM file.
+    """
+    with metrics.trace("audio.decode", bytes_in=os.path.getsize(filename), file=filename) as span, open(dest, "wb") as file:
+        file.write(PCM_HEADER.pack(PCM_MAGIC, FRAME_RATE, CHANNELS, SAMPLE_WIDTH))
+
+        for block in stream_pcm(filename, block_frames=FRAME_RATE):
+            file.write(block)
+            span.bytes_out += len(block)
+
+    return dest
+
+
+def is_pcm_file(filename: str) -> bool:
+    """
+    Tells whether a file is a PCM file written by decode_to_pcm (rather than an .mp3 or anything else).
+    """
+    try:
+        with open(filename, "rb") as file:
+            return file.read(len(PCM_MAGIC)) == PCM_MAGIC
+    except OSError:
+        return False
+
+
+class PcmFile:
+    """
+    A PCM file written by decode_to_pcm, mapped into memory. The samples are read as slices of one memoryview 
+    over the map, so nothing is copied and every process reading the same file shares the same pages.
+
+    Parameters
+    ----------
+    filename: str
+        The PCM file.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+        with open(filename, "rb") as file:
+            header = file.read(PCM_HEADER.size)
+
+            if len(header) < PCM_HEADER.size or header[:len(PCM_MAGIC)] != PCM_MAGIC:
+                raise ValueError(f"{filename} is not a PCM file written by decode_to_pcm")
+
+            _, self.frame_rate, self.channels, self.sample_width = PCM_HEADER.unpack(header)
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.frame_size = self.channels * self.sample_width
+        self.data = memoryview(self._map)[PCM_HEADER.size:]     # the samples, without the header
+
+
+    def __len__(self) -> int:
+        """
+        The length of the audio in ms, like the length of an AudioSegment.
+        """
+        return len(self.data) * 1000 // (self.frame_rate * self.frame_size)
+
+
+    def __enter__(self) -> "PcmFile":
+        return self
+
+
+    def __exit__(self, error_type, error, traceback) -> bool:
+        self.close()
+        return False
+
+
+    def offset(self, ms: int) -> int:
+        """
+        Returns the byte of the samples where the audio is `ms` in, always at the start of a frame.
+        """
+        return min(len(self.data), ms * self.frame_rate // 1000 * self.frame_size)
+
+
+    def slice(self, start: int, end: int = None) -> memoryview:
+        """
+        Returns the samples from `start` to `end` ms (the end of the audio by default) without copying them.
+        """
+        return self.data[self.offset(start):(len(self.data) if end is None else self.offset(end))]
+
+
+    def blocks(self, start: int = 0, end: int = None, block_frames: int = STREAM_BLOCK):
+        """
+        Yields the samples from byte `start` to byte `end` (see offset) in blocks of `block_frames` frames, 
+        each one a memoryview into the file.
+        """
+        end = len(self.data) if end is None else end
+        block_size = block_frames * self.frame_size
+
+        for i in range(start, end, block_size):
+            yield self.data[i:min(end, i + block_size)]
+
+
+    def close(self) -> None:
+        self.data.release()
+
+        try:
+            self._map.close()
+        except BufferError:
+            # a slice is still in use somewhere, the map is closed once it is garbage collected
+            pass
+
+
+class SpeechFilter:
+    """
+    Voice-activity detection on 16 kHz mono PCM. It passes on only the speech (with VAD_PADDING of audio around 
+    it) so the recognizer does not spend time on intros, pauses and silence, and it remembers where every piece 
+    came from so times in the audio it passed on can be mapped back to the original audio.
+
+    Parameters
+    ----------
+    mode: str
+        "energy" to count frames louder than `threshold` as speech (numpy only), "webrtc" to use webrtcvad.
+    threshold: float
+        The loudness in dBFS above which a frame is speech for the energy detector.
+    padding: int
+        The ms of audio kept before and after speech.
+    frame: int
+        The ms of audio decided on at a time.
+    """
+
+    def __init__(self, mode: str = "energy", threshold: float = VAD_THRESHOLD, padding: int = VAD_PADDING, frame: int = VAD_FRAME):
+        if mode not in ("energy", "webrtc"):
+            raise ValueError(f"unknown voice-activity detection {mode!r}, use 'energy' or 'webrtc'")
+
+        self.mode = mode
+        self.threshold = threshold
+        self.frame_size = FRAME_RATE * frame // 1000 * CHANNELS * SAMPLE_WIDTH
+        self.padding = max(1, padding // frame)
+        self.total = 0      # bytes of audio seen
+        self.kept = 0       # bytes of audio passed on
+        self.regions = []   # (bytes passed on, original byte) where each continuous piece of passed audio starts
+        self.starts = []    # the bytes passed on of every region, kept sorted for original() to bisect
+        self._next = None   # the original byte right after the last one passed on
+        self._vad = _load("webrtcvad").Vad(VAD_AGGRESSIVENESS) if mode == "webrtc" else None
+
+
+    @property
+    def skipped(self) -> float:
+        """
+        The fraction of the audio seen so far that was not passed on.
+        """
+        return 1 - self.kept / self.total if self.total > 0 else 0.0
+
+
+    def filter(self, blocks):
+        """
+        Yields the speech in blocks of PCM, whatever size the blocks are.
+        """
+        buffer = b""
+        offset = 0          # the original byte of the start of the buffer
+        before = deque(maxlen=self.padding)     # the last frames of silence, kept in case speech starts
+        after = 0           # frames of silence still to pass on after speech
+
+        for block in blocks:
+            self.total += len(block)
+            buffer += block
+            count = len(buffer) // self.frame_size
+
+            if count == 0:
+                continue
+
+            frames = [buffer[(i*self.frame_size):((i+1)*self.frame_size)] for i in range(count)]
+            buffer = buffer[(count*self.frame_size):]
+            speech = self._is_speech(frames)
+            out = list()
+
+            for frame, is_speech in zip(frames, speech):
+                if is_speech:
+                    for start, kept in before:
+                        self._pass(start, kept, out)
+
+                    before.clear()
+                    self._pass(offset, frame, out)
+                    after = self.padding
+                elif after > 0:
+                    self._pass(offset, frame, out)
+                    after -= 1
+                else:
+                    before.append((offset, frame))
+
+                offset += len(frame)
+
+            if len(out) > 0:
+                yield b"".join(out)
+
+        # the last few ms that do not fill a frame go with whatever came before them
+        if len(buffer) > 0 and after > 0:
+            out = list()
+            self._pass(offset, buffer, out)
+            yield b"".join(out)
+
+
+    def original(self, seconds: float, end: bool = False) -> float:
+        """
+        Maps a time in the audio that was passed on back to the time in the original audio. With `end` a time 
+        right where two pieces meet is mapped to the end of the first one instead of the start of the second.
+        """
+        bytes_per_second = FRAME_RATE * CHANNELS * SAMPLE_WIDTH
+        position = seconds * bytes_per_second
+        index = (bisect_left(self.starts, position) if end else bisect_right(self.starts, position)) - 1
+
+        if index < 0:
+            return seconds
+
+        kept, start = self.regions[index]
+
+        return round((start + position - kept) / bytes_per_second, 3)
+
+
+    def _is_speech(self, frames: list[bytes]) -> list[bool]:
+        if self._vad is not None:
+            return [self._vad.is_speech(frame, FRAME_RATE) for frame in frames]
+
+        np = _load("numpy")
+        samples = np.frombuffer(b"".join(frames), dtype="<i2").reshape(len(frames), -1).astype(np.float64)
+        rms = np.sqrt(np.mean(samples ** 2, axis=1))
+
+        return list(20 * np.log10(rms / 32768 + 1e-10) > self.threshold)
+
+
+    def _pass(self, start: int, frame: bytes, out: list) -> None:
+        if start != self._next:
+            self.regions.append((self.kept, start))
+            self.starts.append(self.kept)
+
+        out.append(frame)
+        self.kept += len(frame)
+        self._next = start + len(frame)
+
+
+def _mp3_to_text_settings(stream: bool, model_name: str, vad: str = None, decoder: str = None) -> dict:
+    """
+    Returns the settings of mp3_to_text that change its transcript, they are part of the transcript cache key. 
+    The decoder is "ffmpeg" (streamed or through a PCM file) or "pydub", by default the one `stream` uses.
+    """
+    decoder = decoder or ("ffmpeg" if stream else "pydub")
+    settings = {"function": "mp3_to_text", "model": model_name, "frame_rate": FRAME_RATE, "channels": CHANNELS, "stream": stream, "step": STEP, "stream_block": STREAM_BLOCK, "decoder": decoder}
+
+    # only added when it is used, so the transcripts cached before it existed stay valid
+    if vad is not None:
+        settings["vad"] = {"mode": vad, "frame": VAD_FRAME, "padding": VAD_PADDING, "threshold": VAD_THRESHOLD, "aggressiveness": VAD_AGGRESSIVENESS}
+
+    return settings
+
+
+def _segment(result: str, start: float, end: float) -> dict:
+    """
+    Turns a Vosk result into a transcript segment covering the audio from `start` to `end` seconds.
+    """
+    result = json.loads(result)
+    words = [{"word": word["word"], "start": word["start"], "end": word["end"], "conf": word["conf"]} for word in result.get("result", [])]
+
+    return {"text": result["text"], "start": round(start, 3), "end": round(end, 3), "words": words}
+
+
+def _iter_blocks(blocks, model_name: str = MODEL_NAME, speech: SpeechFilter = None):
+    """
+    Feeds blocks of 16 kHz mono PCM to a recognizer as they arrive and yields a segment (see iter_transcript) 
+    every time it finishes an utterance, the last one when the blocks run out. When the blocks are the output 
+    of a SpeechFilter, the filter maps the times back to the original audio.
+    """
+    rec = models.recognizer(model_name)
+    blocks = iter(blocks)
+    bytes_per_second = FRAME_RATE * CHANNELS * SAMPLE_WIDTH
+    fed = 0
+    finished = False
+
+    while not finished:
+        start = fed
+
+        # measured one utterance at a time so the time the caller spends on each segment is left out, when the 
+        # blocks come from stream_pcm the decoding is measured here as well since the two run interleaved
+        with metrics.trace("asr.vosk", model=model_name) as span:
+            # the recognizer tells us when it has finished an utterance, so the text is never cut mid-word
+            for block in blocks:
+                fed += len(block)
+
+                # Vosk only takes bytes, a memoryview from a PcmFile is copied here and nowhere before
+                if rec.AcceptWaveform(bytes(block)):
+                    result = rec.Result()
+                    break
+            else:
+                result = rec.FinalResult()
+                finished = True
+
+            segment = _segment(result, start / bytes_per_second, fed / bytes_per_second)
+            span.bytes_in = fed - start
+
+            if speech is not None:
+                segment["start"], segment["end"] = speech.original(segment["start"]), speech.original(segment["end"], end=True)
+
+                for word in segment["words"]:
+                    word["start"], word["end"] = speech.original(word["start"]), speech.original(word["end"], end=True)
+
+            span.bytes_out = len(segment["text"])
+
+        yield segment
+
+
+def _transcribe_blocks(blocks, model_name: str = MODEL_NAME) -> list[str]:
+    """
+    Feeds blocks of 16 kHz mono PCM to a recognizer as they arrive and returns the text of every utterance.
+    """
+    return [segment["text"] for segment in _iter_blocks(blocks, model_name)]
+
+
+class RecognizerSession:
+    """
+    A recognizer fed small frames of 16 kHz mono PCM as they come, from a file, a pipe or a live source (see 
+    live_blocks). The text of the utterance in progress is handed to `on_partial` every time it changes, and 
+    every finished utterance to `on_result` as a segment (see iter_transcript). FinalResult is only asked for 
+    when the audio ends (see finish), so no word is ever cut at the edge of a block.
+
+    Parameters
+    ----------
+    model_name: str
+        The name or path of the Vosk model to transcribe with.
+    frame: int
+        The ms of audio given to the recognizer at a time, 100 to 500 is a good range: smaller frames give the 
+        partial results sooner, bigger ones cost less per second of audio.
+    on_partial
+        Called with the text of the utterance in progress, e.g. to show it while it is spoken.
+    on_result
+        Called with every finished segment.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, frame: int = SESSION_FRAME, on_partial=None, on_result=None):
+        self.model_name = model_name
+        self.frame_size = FRAME_RATE * frame // 1000 * CHANNELS * SAMPLE_WIDTH
+        self.on_partial = on_partial
+        self.on_result = on_result
+        self.segments = list()
+        self.fed = 0            # bytes of audio given to the recognizer
+        self.first_word = None  # seconds of audio fed when the first word came out
+        self._rec = models.recognizer(model_name)
+        self._buffer = b""      # what is left of the audio fed that does not fill a frame yet
+        self._start = 0         # the byte where the utterance in progress started
+        self._partial = ""
+        self._finished = False
+
+
+    def feed(self, data) -> None:
+        """
+        Feeds some audio (bytes or a memoryview, of any size) to the recognizer a frame at a time.
+        """
+        if self._finished:
+            raise ValueError("the session is finished, start a new one")
+
+        with metrics.trace("asr.vosk", bytes_in=len(data), model=self.model_name) as span:
+            self._buffer += data
+            count = len(self._buffer) // self.frame_size
+
+            for i in range(count):
+                self._accept(self._buffer[(i*self.frame_size):((i+1)*self.frame_size)])
+
+            self._buffer = self._buffer[(count*self.frame_size):]
+            span.bytes_out = len(self._partial)
+
+
+    def finish(self) -> list[dict]:
+        """
+        Feeds what is left of the audio, finishes the last utterance and returns every segment of the session.
+        """
+        if not self._finished:
+            with metrics.trace("asr.vosk", bytes_in=len(self._buffer), model=self.model_name):
+                if len(self._buffer) > 0:
+                    self._accept(self._buffer)
+                    self._buffer = b""
+
+                self._finished = True
+                self._emit(self._rec.FinalResult(), last=True)
+
+        return self.segments
+
+
+    def run(self, blocks) -> list[dict]:
+        """
+        Feeds every block of audio to the session as it comes and finishes it.
+        """
+        for block in blocks:
+            self.feed(block)
+
+        return self.finish()
+
+
+    def _accept(self, frame) -> None:
+        self.fed += len(frame)
+
+        # Vosk only takes bytes
+        if self._rec.AcceptWaveform(bytes(frame)):
+            self._emit(self._rec.Result())
+            return
+
+        partial = json.loads(self._rec.PartialResult())["partial"]
+
+        if partial != self._partial:
+            self._partial = partial
+
+            if self.first_word is None and len(partial) > 0:
+                self.first_word = self.fed / (FRAME_RATE * CHANNELS * SAMPLE_WIDTH)
+
+            if self.on_partial is not None:
+                self.on_partial(partial)
+
+
+    def _emit(self, result: str, last: bool = False) -> None:
+        bytes_per_second = FRAME_RATE * CHANNELS * SAMPLE_WIDTH
+        segment = _segment(result, self._start / bytes_per_second, self.fed / bytes_per_second)
+        self._start = self.fed
+        self._partial = ""
+
+        # the end of the audio only makes a segment if something was said since the last one
+        if last and len(segment["text"]) == 0:
+            return
+
+        if self.first_word is None and len(segment["text"]) > 0:
+            self.first_word = segment["end"]
+
+        self.segments.append(segment)
+
+        if self.on_result is not None:
+            self.on_result(segment)
+
+
+def live_blocks(source: str, frame: int = SESSION_FRAME):
+    """
+    Yields 16 kHz mono PCM from a source in blocks of about `frame` ms, each one as soon as it is there.
+
+    Parameters
+    ----------
+    source: str
+        "-" for raw PCM (16-bit little-endian, 16 kHz, mono) on the standard input, e.g. from 
+        `arecord -f S16_LE -r 16000 -c 1`. A PCM file from decode_to_pcm is read in place, anything else (an 
+        audio file, a named pipe) is decoded through ffmpeg, which needs some audio before it starts.
+    frame: int
+        The ms of audio in each block.
+
+    Yields
+    ------
+    bytes
+        The blocks of audio.
+    """
+    block_frames = FRAME_RATE * frame // 1000
+
+    if source == "-":
+        # os.read returns what has arrived so far instead of waiting for a whole block
+        yield from iter(lambda: os.read(sys.stdin.fileno(), block_frames * CHANNELS * SAMPLE_WIDTH), b"")
+    elif os.path.isfile(source) and is_pcm_file(source):
+        with PcmFile(source) as pcm:
+            yield from pcm.blocks(block_frames=block_frames)
+    else:
+        yield from stream_pcm(source, block_frames=block_frames)
+
+
+def iter_transcript(filename: str, stream: bool = False, model_name: str = MODEL_NAME, vad: str = None):
+    """
+    Transcribes an existing mp3 file and yields the transcript one segment at a time, as soon as the recognizer 
+    has finished it. The caller can punctuate, summarize or show the progress while the rest is transcribed.
+
+    Parameters
+    ----------
+    filename: str
+        The existing .mp3 file that we will convert to text, or a PCM file from decode_to_pcm which is then read 
+        in place instead of being decoded.
+    stream: bool
+        Set it to true to decode the audio in small blocks through an ffmpeg pipe, a segment is then one 
+        utterance. Otherwise the file is decoded at once and a segment is 45 seconds of audio (like mp3_to_text).
+    model_name: str
+        The name or path of the Vosk model to transcribe with, it is only loaded once per process.
+    vad: str
+        "energy" or "webrtc" to only transcribe the parts with speech (see SpeechFilter), a segment is then one 
+        utterance either way. The times are still those of the original audio.
+
+    Yields
+    ------
+    dict
+        A segment: its "text", the "start" and "end" in seconds of the audio it covers and its "words", each one 
+        with the "word", its "start" and "end" in seconds and the "conf" (confidence from 0 to 1) of the recognizer.
+    """
+    speech = SpeechFilter(vad) if vad is not None else None
+
+    if is_pcm_file(filename):
+        with PcmFile(filename) as pcm:
+            if stream or speech is not None:
+                blocks = pcm.blocks()
+                yield from _iter_blocks(speech.filter(blocks) if speech is not None else blocks, model_name, speech)
+            else:
+                yield from _iter_steps(len(pcm), pcm.slice, model_name)
+
+        return
+
+    if stream:
+        blocks = stream_pcm(filename)
+        yield from _iter_blocks(speech.filter(blocks) if speech is not None else blocks, model_name, speech)
+        return
+
+    with metrics.trace("audio.decode", bytes_in=os.path.getsize(filename), file=filename) as span:
+        mp3 = _load("pydub").AudioSegment.from_file(filename)
+        mp3 = mp3.set_channels(CHANNELS)
+        mp3 = mp3.set_frame_rate(FRAME_RATE)
+        span.bytes_out = len(mp3.raw_data)
+
+    if speech is not None:
+        raw = mp3.set_sample_width(SAMPLE_WIDTH).raw_data
+        block_size = STREAM_BLOCK * CHANNELS * SAMPLE_WIDTH
+        blocks = (raw[i:(i+block_size)] for i in range(0, len(raw), block_size))
+        yield from _iter_blocks(speech.filter(blocks), model_name, speech)
+        return
+
+    yield from _iter_steps(len(mp3), lambda start, end: mp3[start:end].raw_data, model_name)
+
+
+def _iter_steps(length: int, piece, model_name: str = MODEL_NAME):
+    """
+    Gives the recognizer 45 seconds of audio at a time and yields a segment (see iter_transcript) for each. 
+    `length` is the length of the audio in ms and `piece(start, end)` returns its PCM from `start` to `end` ms.
+    """
+    rec = models.recognizer(model_name)
+
+    # iterate over 45 seconds of audio
+    step = STEP
+
+    # if audio is shorter than 45 seconds, make the max len of a step that size
+    if step > length:
+        step = length
+
+    # transcribe pieces of audio (45 second intervals) to text
+    for i in range(0, length, step):
+        with metrics.trace("asr.vosk", model=model_name) as span:
+            end = min(length, i + step)
+            raw = piece(i, end)
+            rec.AcceptWaveform(bytes(raw))
+            segment = _segment(rec.Result(), i / 1000, end / 1000)
+            span.bytes_in = len(raw)
+            span.bytes_out = len(segment["text"])
+
+        yield segment
+
+
+def transcribe_url(video: str, model_name: str = MODEL_NAME, vad: str = None, resolver=None):
+    """
+    Transcribes a YouTube video while it downloads: the bytes go from the network through ffmpeg into the 
+    recognizer, nothing is written to disk, and the last segment comes shortly after the last byte.
+
+    Parameters
+    ----------
+    video: str
+        A YouTube hyperlink or URL.
+    model_name: str
+        The name or path of the Vosk model to transcribe with.
+    vad: str
+        "energy" or "webrtc" to only transcribe the parts with speech (see SpeechFilter).
+    resolver
+        The function that looks the video up (see resolve), it can be swapped for a stand-in when testing.
+
+    Yields
+    ------
+    dict
+        The segments of the transcript as they are finished, see iter_transcript.
+    """
+    from youtube_download import resolve, select_stream, stream_download
+
+    manifest = resolve(video, resolver=resolver)
+
+    # a WebM can be decoded from its first byte on, an MP4 may keep its index at the end of the file
+    stream = select_stream(manifest, "asr", prefer=("webm", "mpeg"))
+    speech = SpeechFilter(vad) if vad is not None else None
+
+    blocks = stream_pcm(video, chunks=stream_download(stream["url"], size=stream["filesize"]))
+    yield from _iter_blocks(speech.filter(blocks) if speech is not None else blocks, model_name, speech)
+
+
+def mp3_to_text(filename: str, stream: bool = False, model_name: str = MODEL_NAME, use_cache: bool = True, vad: str = None, pcm: str = None) -> list[str]:
+    """
+    Converts an existing mp3 file to a list of string containing all of the transcribed text of the video.
+    Use iter_transcript to get the text as it is transcribed, with the timings of the words.
+
+    Parameters
+    ----------
+    filename: str
+        The existing .mp3 file that we will convert to text, or a PCM file from decode_to_pcm.
+    stream: bool
+        Set it to true to decode the audio in small blocks through an ffmpeg pipe instead of loading the whole 
+        file into memory. Memory use then stays flat whatever the length of the audio.
+    model_name: str
+        The name or path of the Vosk model to transcribe with, it is only loaded once per process.
+    use_cache: bool
+        Set it to false to transcribe the audio even if it was transcribed before with the same settings.
+    vad: str
+        "energy" or "webrtc" to skip the silence and only give the speech to the recognizer (see SpeechFilter).
+    pcm: str
+        Where to decode the audio (see decode_to_pcm) if it has to be transcribed, so a later stage (e.g. the 
+        .wav export) can read the same PCM file. It is only written when the transcript is not in the cache, 
+        which stays keyed by `filename`.
+
+    Returns
+    -------
+    list[str]
+        Returns a list of strings containing the transribed text of the video. 
+        
+    """
+    if use_cache:
+        # a PCM file is decoded with ffmpeg, which may give slightly other samples than pydub
+        decoder = "ffmpeg" if pcm is not None or is_pcm_file(filename) else None
+        settings = _mp3_to_text_settings(stream, model_name, vad, decoder)
+        transcript = transcript_cache.get(filename, settings)
+
+        if transcript is None:
+            transcript = mp3_to_text(filename, stream=stream, model_name=model_name, use_cache=False, vad=vad, pcm=pcm)
+            transcript_cache.put(filename, settings, transcript)
+
+        return transcript
+
+    if pcm is not None:
+        if not os.path.exists(pcm):
+            decode_to_pcm(filename, pcm)
+
+        filename = pcm
+
+    return [segment["text"] for segment in iter_transcript(filename, stream=stream, model_name=model_name, vad=vad)]
+
+
+def split_at_silence(audio, length: int = SEGMENT_LENGTH, search: int = SILENCE_SEARCH, frame: int = 30) -> list[tuple[int, int]]:
+    """
+    Splits audio into pieces of about `length` ms, cutting each one at the quietest point near its end so no 
+    word is cut in half.
+
+    Parameters
+    ----------
+    audio: PcmFile
+        The decoded audio.
+    length: int
+        The target length of each piece in ms.
+    search: int
+        How far in ms before and after each target cut to look for the quietest frame.
+    frame: int
+        The size in ms of the frames that are compared.
+
+    Returns
+    -------
+    list[tuple[int, int]]
+        The (start, end) of every piece in ms, in order and covering the whole audio.
+    """
+    np = _load("numpy")
+    samples = np.frombuffer(audio.data, dtype=f"<i{audio.sample_width}")     # a view of the file, not a copy
+    per_ms = audio.frame_rate * audio.channels // 1000
+    bounds = list()
+    start = 0
+
+    def rms(i: int) -> float:
+        piece = samples[(i*per_ms):((i+frame)*per_ms)].astype(np.float64)
+        return np.sqrt(np.mean(piece ** 2))
+
+    while len(audio) - start > length + search:
+        target = start + length
+        window = range(max(start + frame, target - search), target + search, frame)
+        cut = min(window, key=rms)
+
+        # cut in the middle of the quiet frame
+        bounds.append((start, cut + frame // 2))
+        start = cut + frame // 2
+
+    bounds.append((start, len(audio)))
+
+    return bounds
+
+
+def _load_worker_model(model_name: str) -> None:
+    """
+    Loads the model once in a pool worker so each piece it is given starts on a warm model.
+    """
+    models.get(model_name)
+
+
+def _transcribe_piece(filename: str, start: int, end: int, model_name: str = MODEL_NAME) -> str:
+    """
+    Transcribes one piece of a PCM file (from byte `start` to byte `end`) with the recognizer of the current 
+    thread/process. Pool workers are only sent the name of the file and the offsets, never the audio itself.
+    """
+    rec = models.thread_recognizer(model_name)
+    text = list()
+
+    with metrics.trace("asr.vosk", bytes_in=end - start, model=model_name) as span, PcmFile(filename) as pcm:
+        for block in pcm.blocks(start, end):
+            if rec.AcceptWaveform(bytes(block)):
+                text.append(json.loads(rec.Result())["text"])
+
+        text.append(json.loads(rec.FinalResult())["text"])
+        span.bytes_out = sum(len(t) for t in text)
+
+    return ' '.join(t for t in text if len(t) > 0)
+
+
+def transcribe_segments(filename: str, workers: int = None, model_name: str = MODEL_NAME, use_cache: bool = True) -> list[str]:
+    """
+    Transcribes an existing mp3 file by splitting it at silences and transcribing the pieces in a pool of processes, 
+    each holding its own warm Vosk model. The pieces are put back together in order, so the result is the same as 
+    transcribing them one after another (workers=1).
+
+    Parameters
+    ----------
+    filename: str
+        The existing .mp3 file that we will convert to text, or a PCM file from decode_to_pcm.
+    workers: int
+        The number of processes to use, by default one per CPU core. With 1 the pieces are transcribed in this process.
+    model_name: str
+        The name or path of the Vosk model to transcribe with.
+    use_cache: bool
+        Set it to false to transcribe the audio even if it was transcribed before with the same settings.
+
+    Returns
+    -------
+    list[str]
+        Returns a list of strings containing the transribed text of every piece, in order.
+    """
+    # the number of workers does not change the transcript, so it is not part of the settings
+    if use_cache:
+        settings = {"function": "transcribe_segments", "model": model_name, "frame_rate": FRAME_RATE, "channels": CHANNELS, "segment_length": SEGMENT_LENGTH, "silence_search": SILENCE_SEARCH, "stream_block": STREAM_BLOCK, "decoder": "ffmpeg"}
+        transcript = transcript_cache.get(filename, settings)
+
+        if transcript is None:
+            transcript = transcribe_segments(filename, workers=workers, model_name=model_name, use_cache=False)
+            transcript_cache.put(filename, settings, transcript)
+
+        return transcript
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # decoded once into a PCM file that every worker maps, unless it already is one
+    with tempfile.TemporaryDirectory() as scratch:
+        if not is_pcm_file(filename):
+            filename = decode_to_pcm(filename, os.path.join(scratch, "audio.pcm"))
+
+        with PcmFile(filename) as pcm:
+            pieces = [(pcm.offset(start), pcm.offset(end)) for start, end in split_at_silence(pcm)]
+
+        files = [filename] * len(pieces)
+        starts = [start for start, _ in pieces]
+        ends = [end for _, end in pieces]
+        names = [model_name] * len(pieces)
+
+        if workers == 1:
+            return list(map(_transcribe_piece, files, starts, ends, names))
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_load_worker_model, initargs=(model_name,)) as pool:
+            return list(pool.map(_transcribe_piece, files, starts, ends, names))
+
+
+def _punctuate_windows(text: str, window: int = PUNCTUATION_WINDOW, overlap: int = PUNCTUATION_OVERLAP, batch_size: int = PUNCTUATION_BATCH) -> str:
+    """
+    Punctuates a long text by splitting it into overlapping windows of words, running them through the model 
+    `batch_size` windows at a time and stitching the labels together in the middle of every overlap. Only one 
+    batch of windows is held by the model at a time.
+
+    Parameters
+    ----------
+    text: str
+        The text to punctuate.
+    window: int
+        The number of words in each window.
+    overlap: int
+        The number of words shared by neighbouring windows.
+    batch_size: int
+        The number of windows run through the model at once.
+
+    Returns
+    -------
+    str
+        The punctuated text.
+    """
+    model = get_punctuation_model()
+    words = model.preprocess(text)
+
+    # short texts fit in one window, which is exactly what the single pass does
+    if len(words) <= window:
+        return model.restore_punctuation(text)
+
+    step = window - overlap
+    starts = list(range(0, len(words) - overlap, step))
+    pieces = list()
+
+    for b in range(0, len(starts), batch_size):
+        batch = [words[start:(start+window)] for start in starts[b:(b+batch_size)]]
+        results = model.pipe([" ".join(chunk) for chunk in batch], batch_size=batch_size)
+
+        for start, chunk, result in zip(starts[b:(b+batch_size)], batch, results):
+            # keep the labels from the middle of each overlap onwards, up to the middle of the next one
+            first = 0 if start == 0 else overlap // 2
+            last = len(chunk) if start == starts[-1] else window - (overlap - overlap // 2)
+
+            tagged = list()
+            char_index = 0
+            result_index = 0
+
+            # a word takes the label of the last of its sub-tokens, the same way PunctuationModel.predict does it
+            for word in chunk[:last]:
+                char_index += len(word) + 1
+                label = "0"
+                score = 0.0
+
+                while result_index < len(result) and char_index > result[result_index]["end"]:
+                    label = result[result_index]["entity"]
+                    score = result[result_index]["score"]
+                    result_index += 1
+
+                tagged.append([word, label, score])
+
+            pieces.append(model.prediction_to_text(tagged[first:]))
+
+    return " ".join(pieces)
+
+
+def punctuate_text(text_object, windowed: bool = False, batch_size: int = PUNCTUATION_BATCH, print_text: bool = True) -> str:
+    """
+    A function that punctuates a piece of text.
+
+    Parameters
+    ----------
+    text_object
+        A list or string containing the full text.
+    windowed: bool
+        Set it to true for long transcripts, the text is then punctuated in overlapping windows that are run 
+        through the model in batches, which bounds the memory and uses the CPU better. Short texts give the 
+        same result either way.
+    batch_size: int
+        The number of windows run through the model at once when windowed.
+    print_text: bool
+        Set it to false to not print the text before it is punctuated.
+    
+    Returns
+    -------
+    str 
+        A string containing the summarized text
+
+    """
+    text = None
+    
+
+    if isinstance(text_object, list):
+        text = ' '.join(text_object).strip()
+
+    else:
+        text = text_object.strip()
+
+    if print_text:
+        print(text)
+
+    if text is None or len(text) == 0:
+        return None
+
+    with metrics.trace("nlp.punctuation", bytes_in=len(text), windowed=windowed) as span:
+        if windowed:
+            result = _punctuate_windows(text, batch_size=batch_size)
+        else:
+            result = get_punctuation_model().restore_punctuation(text)
+
+        span.bytes_out = len(result)
+    #print(result)
+
+    
+
+    return result
+# pip3 install -U pip setuptools wheel
+# pip3 install -U spacy
+# python3 -m spacy download en_core_web_sm
+
+def get_nlp(name: str = "en_core_web_sm"):
+    """
+    Returns a spaCy pipeline, loading it only the first time it is asked for.
+
+    Parameters
+    ----------
+    name: str
+        The name of a spaCy model, or "sentencizer" for a blank English pipeline that only splits sentences.
+
+    Returns
+    -------
+    Language
+        The cached pipeline.
+    """
+    with _nlp_lock:
+        if name not in _nlp_pipelines:
+            spacy = _load("spacy")
+
+            if name == "sentencizer":
+                nlp = spacy.blank("en")
+                nlp.add_pipe('sentencizer')
+
+                # there is no parser or NER in this pipeline, so multi-hour transcripts over 1M characters are safe
+                nlp.max_length = 50_000_000
+            else:
+                nlp = spacy.load(name)
+
+            _nlp_pipelines[name] = nlp
+
+    return _nlp_pipelines[name]
+
+
+def _prepare_text(text_object) -> str:
+    """
+    Returns the text to summarize, a list is assumed to be an unpunctuated transcript and is punctuated first.
+    """
+    if isinstance(text_object, list):
+        text = punctuate_text(text_object=text_object)
+        return "" if text is None else text.strip()
+
+    return text_object.strip()
+
+
+def _term_matrix(doc) -> tuple:
+    """
+    Builds the sparse sentence-by-term count matrix of a parsed document.
+
+    Parameters
+    ----------
+    doc: Doc
+        The parsed document, it must have sentence boundaries.
+
+    Returns
+    -------
+    tuple
+        The list of sentences, the text of every term (column), the column of every token and the 
+        (sentences x terms) count matrix.
+    """
+    np = _load("numpy")
+    sparse = _load("scipy.sparse")
+
+    sents = list(doc.sents)
+    orth = doc.to_array("ORTH")
+    sent_of = np.repeat(np.arange(len(sents)), [sent.end - sent.start for sent in sents])
+
+    terms, column = np.unique(orth, return_inverse=True)
+    counts = sparse.csr_matrix((np.ones(len(orth), dtype=np.int64), (sent_of, column)), shape=(len(sents), len(terms)))
+    words = [doc.vocab.strings[int(term)] for term in terms]
+
+    return sents, words, column, counts
+
+
+def _top_sentences(sents: list, scores, candidates, sentences: int) -> str:
     """
-    Converts an existing mp3 file to a list of string containing all of the transcribed text of the video.
+    Joins the `sentences` best scoring sentences, ties keep the order of the text like sorted() and nlargest() do.
+    """
+    np = _load("numpy")
 
-    Parameters
-    ----------
-    filename: str
-        The existing .mp3 file that we will convert to text.
+    order = candidates[np.argsort(-scores[candidates], kind="stable")]
 
-    Returns
-    -------
-    list[str]
-        Returns a list of strings containing the transribed text of the video. 
-        
-    """
-    
-    model = Model(model_name="vosk-model-small-en-us-0.15")
-    rec = KaldiRecognizer(model, FRAME_RATE)
-    rec.SetWords(True)
+    return ' '.join(sents[i].text for i in order[:sentences])
 
-    mp3 = AudioSegment.from_file(filename)
-    mp3 = mp3.set_channels(CHANNELS)
-    mp3 = mp3.set_frame_rate(FRAME_RATE)
 
-    # iterate over 45 seconds of audio
-    step = 45000
+def _summarize_doc(doc, sentences: int = 3) -> str:
+    """
+    Picks the summary sentences of a parsed document (version 1, keyword frequencies of nouns, verbs and adjectives).
+    Every sentence is scored at once as its row of the sentence-by-term matrix times the keyword frequencies.
+    """
+    np = _load("numpy")
+    symbols = _load("spacy.symbols")
+    stopwords = _load("spacy.lang.en.stop_words").STOP_WORDS
+    pos_tag = [symbols.PROPN, symbols.ADJ, symbols.NOUN, symbols.VERB]
 
-    # if audio is shorter than 45 seconds, make the max len of a step that size
-    if step > len(mp3):
-        step = len(mp3)
+    sents, words, column, counts = _term_matrix(doc)
 
-    transcript = list()
+    # filtering tokens, a keyword is a token with one of the tags whose text is not a stop word or punctuation
+    allowed = np.array([word not in stopwords and word not in punctuation for word in words], dtype=bool)
+    keyword = np.isin(doc.to_array("POS"), pos_tag) & allowed[column]
 
-    # transcribe pieces of audio (45 second intervals) to text
-    for i in range(0, len(mp3), step):
-        # print(f"Progress: {i/len(mp3)}")
-        
-        segment = mp3[i:(i+step)]
-        rec.AcceptWaveform(segment.raw_data)
-        result = rec.Result()
-        text = json.loads(result)["text"]
-        transcript.append(text)
+    if not keyword.any():
+        return ""
 
+    freq_words = np.bincount(column[keyword], minlength=len(words))
 
-    return transcript
+    # normalizing by the highest frequency does not change the ranking, so the exact counts are used
+    scores = counts @ freq_words
+    candidates = np.flatnonzero(counts @ (freq_words > 0).astype(np.int64))
 
+    return _top_sentences(sents, scores, candidates, sentences)
 
-def punctuate_text(text_object) -> str:
+
+def _corpus_terms(words) -> list[str]:
     """
-    A function that punctuates a piece of text.
+    Returns the words of a transcript that are counted in the corpus statistics (see CorpusStats): every 
+    different word that is not a stop word, punctuation or white space.
+    """
+    STOP_WORDS = _load("spacy.lang.en.stop_words").STOP_WORDS
 
-    Parameters
-    ----------
-    text_object
-        A list or string containing the full text.
-    
-    Returns
-    -------
-    str 
-        A string containing the summarized text
+    return [word for word in set(words) if word not in STOP_WORDS and word not in punctuation and not word.isspace()]
 
+
+def _text_id(text: str) -> str:
     """
-    text = None
-    
+    Returns the ID a transcript is counted under in the corpus statistics when the audio it came from is not known.
+    """
+    return "text-" + hashlib.sha256(text.encode()).hexdigest()
 
-    if isinstance(text_object, list):
-        text = ' '.join(text_object).strip()
 
-    else:
-        text = text_object.strip()
+def _summarize_doc_2(doc, sentences: int = 3, corpus: CorpusStats = None, document: str = None) -> str:
+    """
+    Picks the summary sentences of a parsed document (version 2, frequencies of every word that is not a stop word).
+    Every sentence is scored at once as its row of the sentence-by-term matrix times the word frequencies. With a 
+    corpus the document is counted in it (as `document`, by default a hash of its text) and the frequencies are 
+    weighted by the inverse document frequencies.
+    """
+    np = _load("numpy")
+    STOP_WORDS = _load("spacy.lang.en.stop_words").STOP_WORDS
 
-    print(text)
+    sents, words, column, counts = _term_matrix(doc)
 
-    if text is None or len(text) == 0:
-        return None
+    # get word frequencies
+    allowed = np.array([word not in STOP_WORDS and word not in punctuation for word in words], dtype=bool)
+    word_frequencies = np.asarray(counts.sum(axis=0)).ravel() * allowed
 
-    result = punctuation_model.restore_punctuation(text)
-    #print(result)
+    # the words every transcript uses weigh less, only the rows of the words of this document are read
+    if corpus is not None:
+        corpus.add(document or _text_id(doc.text), _corpus_terms(words), doc.text)
+        word_frequencies = word_frequencies * corpus.idf(words)
 
-    
+    #Sort by the number of sentences with the highest importance (based by word frequencies)
+    scores = counts @ word_frequencies
 
-    return result
-# pip3 install -U pip setuptools wheel
-# pip3 install -U spacy
-# python3 -m spacy download en_core_web_sm
+    return _top_sentences(sents, scores, np.arange(len(sents)), sentences)
 
-def summarize_text(text_object, print_text: bool=False) -> str:
+
+def summarize_text(text_object, print_text: bool=False, sentences: int = 3) -> str:
     """
     A text summarizer (version 1 of 'Extractive Summarization') using spaCy.
     Extractive Summarization - A NLP method that works on extracting parts of the main peice of text and combines them to create a summary. The main idea is to extract the most important pieces of text.
@@ -220,6 +1706,8 @@ def summarize_text(text_object, print_text: bool=False) -> str:
         A list or string containing the full text of the text transcript.
     print_text: bool
         Set it to true if you want to print the text after being trasribed
+    sentences: int
+        The number of sentences in the summary.
 
     Returns
     -------
@@ -228,60 +1716,18 @@ def summarize_text(text_object, print_text: bool=False) -> str:
     None 
         If no text is there, it will return None.
     """ 
-    text = None
-
-    # if going inside this if, we will assume no punctuation has occurred, therefore it will be punctuated.
-    if isinstance(text_object, list):
-        text = punctuate_text(text_object=text_object).strip()
-
-        if text is None or text == "":
-            return "There was nothing to summarize!"
-
-    else:
-        text = text_object.strip()
-
-    #print(text)
-
-    # load the spaCy 'English' model and doc object
-    nlp = spacy.load("en_core_web_sm")
-    #nlp.add_pipe('sentencizer')
-    doc = nlp(text.lower())
-    size_text = len(list(doc.sents))
-
-    keyword = []
-    stopwords = list(STOP_WORDS)
-    pos_tag = ['PROPN', 'ADJ', 'NOUN', 'VERB']
-
-    # filtering tokens
-    for token in doc:
-        if token.text in stopwords or token.text in punctuation:
-            continue
-        if token.pos_ in pos_tag:
-            keyword.append(token.text)
-
-    # Calculate the frequency of the words and normalize the frequency of these words in the given text.
-    #print(keyword)
-    freq_words = Counter(keyword)
-    max_freq = Counter(keyword).most_common(1)[0][1]
-
-    for word in freq_words.keys():
-        freq_words[word] = (freq_words[word]/max_freq)
+    # if it is a list, we will assume no punctuation has occurred, therefore it will be punctuated.
+    text = _prepare_text(text_object)
 
-    
-    sentence_strength = {}
+    if isinstance(text_object, list) and text == "":
+        return "There was nothing to summarize!"
 
-    for sent in doc.sents:
-        for word in sent:
-            if word.text in freq_words.keys():
-                if sent in sentence_strength.keys():
-                    sentence_strength[sent] += freq_words[word.text]
-                else:
-                    sentence_strength[sent] = freq_words[word.text]
+    # the spaCy 'English' model is only loaded once
+    nlp = get_nlp("en_core_web_sm")
 
-    # summarize the string by grabbing the highest impact sentences and set in a string format
-    summarized_text = nlargest(min(3, size_text), sentence_strength, key=sentence_strength.get)
-    summary_list = [sent.text for sent in summarized_text]
-    summary = ' '.join(summary_list)
+    with metrics.trace("nlp.spacy", bytes_in=len(text), pipeline="en_core_web_sm") as span:
+        summary = _summarize_doc(nlp(text.lower()), sentences)
+        span.bytes_out = len(summary)
 
     if print_text:
         print(f"Summary: {summary}")
@@ -290,7 +1736,7 @@ def summarize_text(text_object, print_text: bool=False) -> str:
 
 
 
-def summarize_text_2(text_object, print_text: bool = False) -> str:
+def summarize_text_2(text_object, print_text: bool = False, sentences: int = 3, corpus: CorpusStats = None, document: str = None) -> str:
     """
     A text summarizer (version 2 'Extractive Summarization') using spaCy.
     Extractive Summarization - A NLP method that works on extracting parts of the main peice of text and combines them to create a summary. The main idea is to extract the most important pieces of text.
@@ -301,49 +1747,36 @@ def summarize_text_2(text_object, print_text: bool = False) -> str:
         A list or string containing the full text of the text transcript.
     print_text: bool
         Set it to true if you want to print the text after being trasribed
+    sentences: int
+        The number of sentences in the summary.
+    corpus: CorpusStats
+        Set it to a CorpusStats (e.g. corpus_stats) to weigh the words by TF-IDF, so the words used in every 
+        transcript (the filler of a channel) do not pick the summary. The transcript is counted in it as well.
+    document: str
+        What the transcript is counted as in the corpus, e.g. transcript_cache.audio_id of its audio, so the 
+        same video is only counted once. By default a hash of the text.
 
     Returns
     -------
     str
         A string containing the summarized text.
     """
-    text = None
-
-    nlp = spacy.blank("en")
-    nlp.add_pipe('sentencizer')
+    # if it is a list, we will assume no punctuation has occurred, therefore it will be punctuated.
+    text = _prepare_text(text_object)
 
-    # if going inside this if, we will assume no punctuation has occurred, therefore it will be punctuated.
-    if isinstance(text_object, list):
-        text = punctuate_text(text_object=text_object).strip()
-
-        if text is None or text == "":
-            return "There was nothing to summarize!"
-
-    else:
-        text = text_object.strip()
+    if isinstance(text_object, list) and text == "":
+        return "There was nothing to summarize!"
 
     if print_text:
         print("\nTranscribed Text\n")
         print(text + "\n")
 
     # Convert text to lowercase and tokenize without removing stop words and punctuation
-    doc = nlp(text.lower())
-    size_text = len(list(doc.sents))
-
-    # for calculating word frequencies
-    word_frequencies={}
-
-    # get word frequencies
-    for token in doc:
-        if token.text not in STOP_WORDS and token.text not in punctuation:
-            if token.text not in word_frequencies:
-                word_frequencies[token.text] = 1
-            else:
-                word_frequencies[token.text] += 1
+    nlp = get_nlp("sentencizer")
 
-    #Sort by the number of sentences with the highest importance (based by word frequencies)
-    sorted_sentences = sorted(doc.sents, key=lambda sent: sum(word_frequencies[token.text] for token in sent if token.text in word_frequencies), reverse=True)
-    summary = " ".join(sent.text for sent in sorted_sentences[:min(3, size_text)])
+    with metrics.trace("nlp.spacy", bytes_in=len(text), pipeline="sentencizer") as span:
+        summary = _summarize_doc_2(nlp(text.lower()), sentences, corpus, document)
+        span.bytes_out = len(summary)
 
     if print_text:
         print(f"Summarized Text: {summary}\n")
@@ -352,10 +1785,116 @@ def summarize_text_2(text_object, print_text: bool = False) -> str:
     return summary
 
 
+def summarize_many(text_objects: list, version: int = 1, batch_size: int = 64, n_process: int = 1, sentences: int = 3, corpus: CorpusStats = None, documents: list = None) -> list[str]:
+    """
+    Summarizes many transcripts at once by running them through spaCy's `nlp.pipe`, which is much faster than 
+    calling summarize_text/summarize_text_2 on each one.
+
+    Parameters
+    ----------
+    text_objects: list
+        The transcripts, each one a list or string like the ones summarize_text takes.
+    version: int
+        1 to summarize like summarize_text, 2 like summarize_text_2.
+    batch_size: int
+        The number of texts spaCy processes in each batch.
+    n_process: int
+        The number of processes spaCy uses.
+    sentences: int
+        The number of sentences in each summary.
+    corpus: CorpusStats
+        With version 2, weigh the words by TF-IDF like summarize_text_2 does.
+    documents: list
+        What each transcript is counted as in the corpus (see summarize_text_2), by default hashes of the texts.
+
+    Returns
+    -------
+    list[str]
+        The summaries in the same order as the transcripts.
+    """
+    texts = [_prepare_text(text_object) for text_object in text_objects]
+
+    if version == 1:
+        nlp, summarize = get_nlp("en_core_web_sm"), lambda doc, sentences, document: _summarize_doc(doc, sentences)
+    else:
+        nlp, summarize = get_nlp("sentencizer"), lambda doc, sentences, document: _summarize_doc_2(doc, sentences, corpus, document)
+
+    summaries = list()
+
+    with metrics.trace("nlp.spacy", bytes_in=sum(len(text) for text in texts), version=version, texts=len(texts)) as span:
+        docs = nlp.pipe((text.lower() for text in texts), batch_size=batch_size, n_process=n_process)
+
+        for text_object, text, doc, document in zip(text_objects, texts, docs, documents or [None] * len(texts)):
+            if isinstance(text_object, list) and text == "":
+                summaries.append("There was nothing to summarize!")
+            else:
+                summaries.append(summarize(doc, sentences, document))
+
+        span.bytes_out = sum(len(summary) for summary in summaries)
+
+    return summaries
+
 
-def download_audio(video: str, title: str="", directory: str=".") -> None:
+def rebuild_corpus(paths: list = None, corpus: CorpusStats = None, batch_size: int = 64) -> dict:
     """
-    Converts a YouTube video into an .mp3 file.
+    Counts the corpus statistics again from scratch (see CorpusStats.rebuild), e.g. after changing how the words 
+    are counted or to start over from a folder of old transcripts.
+
+    Parameters
+    ----------
+    paths: list
+        Transcripts: .txt files, .json files of the transcript cache, or folders of them. They replace the 
+        transcripts counted so far. By default the transcripts that were counted are counted again.
+    corpus: CorpusStats
+        The statistics to rebuild, by default corpus_stats.
+    batch_size: int
+        The number of texts spaCy processes in each batch.
+
+    Returns
+    -------
+    dict
+        The number of transcripts and of different words counted.
+    """
+    corpus = corpus or corpus_stats
+    files = list()
+
+    for path in paths or []:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith((".txt", ".json"))))
+        else:
+            files.append(path)
+
+    # yields the ID, the text and the text to keep (None when it is kept already) of every transcript. One of 
+    # the cache is known by its audio (its key starts with the hash of it), so the transcripts of the same audio 
+    # with other settings are only counted once. They are not punctuated, which does not change their words.
+    def texts():
+        if paths is None:
+            for document, text in corpus.texts():
+                yield document, text, None
+            return
+
+        for name in files:
+            with open(name) as file:
+                if name.endswith(".json"):
+                    text = " ".join(json.load(file)["transcript"]).lower()
+                    yield os.path.basename(name).split("-")[0], text, text
+                else:
+                    text = file.read().lower()
+                    yield _text_id(text), text, text
+
+    nlp = get_nlp("sentencizer")
+
+    with metrics.trace("nlp.spacy", pipeline="sentencizer") as span:
+        docs = nlp.pipe(((text, (document, store)) for document, text, store in texts()), as_tuples=True, batch_size=batch_size)
+        span.bytes_out = corpus.rebuild((document, _corpus_terms(token.text for token in doc), store) for doc, (document, store) in docs)
+
+    return corpus.stats()
+
+
+def download_audio(video: str, title: str="", directory: str=".", use_cache: bool = True, resolver=None, purpose: str = "asr") -> str:
+    """
+    Converts a YouTube video into an .mp3 file with youtube_download.download_audio, by default picking the 
+    smallest stream good enough for speech recognition.
 
     Parameters
     ----------
@@ -365,129 +1904,186 @@ def download_audio(video: str, title: str="", directory: str=".") -> None:
         A new title for the MP3 file if the user wants to change the name of it, otherwise it will default to the title of the video.
     directory: str
         The directory or folder that we want to place the MP3 file in, otherwise it will default to the same folder. 
+    use_cache: bool
+        Set it to false to download the audio (and look the video up) even if it is in the local caches.
+    resolver
+        The function that looks the video up (see resolve), YouTube through pytube by default. It can be swapped 
+        for a stand-in when testing.
+    purpose: str
+        What the audio is for, "asr", "listening" or "archive": the smallest stream good enough for it is 
+        downloaded (see select_stream). "asr" by default.
 
     Returns
     -------
-    None
+    str
+        The path of the MP3 file, None if the video could not be converted.
     """
+    import youtube_download
 
-    # convert into Youtube obj to get features
-    yt = None
-    try:
-        yt = YouTube(video)
-    except Exception as e:
-        print("Failure in converting video...")
-        print(f"ERROR: {e}")
-        return
+    return youtube_download.download_audio(video, title, directory, use_cache=use_cache, resolver=resolver, purpose=purpose)
 
-    if len(title) > 0:
-        yt.title = title
 
-    name = f"\033[1;35;40m {yt.title} \u001b[0m"
+def download(video: str, use_cache: bool = True) -> str:
+    """
+    (Default function) Converts a YouTube video into an MP3 file, asking the user about the title and folder 
+    (see youtube_download.download). The stream is picked for speech recognition.
 
-    # convert to an audio file
-    audio = yt.streams.filter(only_audio=True).first()
+    Parameters
+    ----------
+    video: str
+        A YouTube hyperlink or URL in string format that the function will convert to an audio file (MP3).
+    use_cache: bool
+        Set it to false to download the audio even if it is in the local audio cache.
 
-    # download the audio
-    download = audio.download(output_path=directory)
+    Returns
+    -------
+    str
+        Title of the video downloaded.
+    """
+    import youtube_download
 
-    # save the audio
-    base, ext = os.path.splitext(download)
-    audio_download = base + ".mp3"
-    os.rename(download, audio_download)
+    return youtube_download.download(video, use_cache=use_cache, purpose="asr")
 
-    print(f"{name} has been downloaded\n")
-    time.sleep(0.5)
+PIPELINE_WORKERS = {"download": 4, "decode": 2, "transcribe": os.cpu_count() or 1, "punctuate": 1, "summarize": 1}
 
 
-def download(video: str) -> str:
+def run_pipeline(videos: list, workers: dict = None, queue_size: int = 2, directory: str = ".", version: int = 1, model_name: str = MODEL_NAME) -> tuple[list[dict], dict]:
     """
-    (Default function) Converts a YouTube video into an MP3 file. Here the user will be asked more information regarding their download.
+    Runs videos through download -> decode -> transcribe -> punctuate -> summarize as a pipeline: every stage 
+    has its own threads and a bounded queue in front of it, so video N+1 downloads while video N is transcribed 
+    and video N-1 is summarized. A full queue makes the stage before it wait, so no stage runs far ahead.
 
     Parameters
     ----------
-    video: str
-        A YouTube hyperlink or URL in string format that the function will convert to an audio file (MP3).
+    videos: list
+        The YouTube hyperlinks or URLs in string format.
+    workers: dict
+        The number of threads of each stage, the stages left out use PIPELINE_WORKERS.
+    queue_size: int
+        The most videos waiting in front of each stage.
+    directory: str
+        The directory or folder that the MP3 files are placed in.
+    version: int
+        1 to summarize like summarize_text, 2 like summarize_text_2.
+    model_name: str
+        The name or path of the Vosk model to transcribe with.
 
     Returns
     -------
-    str
-        Title of the video downloaded.
+    tuple[list[dict], dict]
+        One result per video in the given order (with its "path", "transcript", "text", "summary" and "error") 
+        and the statistics of every stage (items, busy seconds, throughput per second and queue depth).
     """
+    workers = dict(PIPELINE_WORKERS, **(workers or {}))
+    summarize = summarize_text if version == 1 else summarize_text_2
+    scratch = tempfile.TemporaryDirectory()
 
-    # convert into Youtube obj to get features
-    yt = None
-    try:
-        yt = YouTube(video)
-    except Exception as e:
-        print("Failure in converting current video...")
-        print("ERROR: {e}")
-        return
+    def download_stage(item: dict) -> None:
+        item["path"] = download_audio(video=item["video"], directory=directory)
 
-    name = yt.title
-    title = name
-    name = f"\033[1;35;40m {name} \u001b[0m"
+        if item["path"] is None:
+            raise RuntimeError("the video could not be converted")
 
-    print("\n")
-    # ask if the user wants to download the audio for the given video
-    decision = input(
-        f"Do you want to download the audio for this video? -> {name} \nEnter \033[1;31;40m N \u001b[0m to \033[1;31;40m NOT \u001b[0m download it. Otherwise enter any key to continue: "
-    )
+    def decode_stage(item: dict) -> None:
+        # a transcript that is already in the cache skips decoding and transcribing
+        item["transcript"] = transcript_cache.get(item["path"], _mp3_to_text_settings(True, model_name))
 
-    if decision.capitalize().strip() == "N":
-        print("\n")
-        return
+        if item["transcript"] is None:
+            item["pcm"] = decode_to_pcm(item["path"], os.path.join(scratch.name, f"{item['index']}.pcm"))
 
-    # determine whether the user wants to change the title of the mp3 audio
-    decision = input(
-        f"the current title name is {name}. \nDo you wish to change it? Enter \033[1;31;40m Y \u001b[0m to do so. Otherwise enter any key to continue: "
-    )
+    def transcribe_stage(item: dict) -> None:
+        if item["transcript"] is None:
+            with PcmFile(item["pcm"]) as pcm:
+                item["transcript"] = _transcribe_blocks(pcm.blocks(), model_name)
 
-    while decision.capitalize().strip() == "Y":
-        title = input("Enter the new title for the mp3: ")
+            transcript_cache.put(item["path"], _mp3_to_text_settings(True, model_name), item["transcript"])
+            os.remove(item.pop("pcm"))
 
-        name = f"\033[1;35;40m {title} \u001b[0m"
-        yt.title = title
+    def punctuate_stage(item: dict) -> None:
+        item["text"] = punctuate_text(item["transcript"], windowed=True, print_text=False)
 
-        decision = input(
-            f"\nThe current title is {name}.\nDo you wish to change it? Enter \033[1;31;40m Y \u001b[0m to do so. Otherwise enter any key to continue: "
-        )
+    def summarize_stage(item: dict) -> None:
+        item["summary"] = summarize(item["text"]) if item["text"] is not None else "There was nothing to summarize!"
 
-    # convert to an audio file
-    audio = yt.streams.filter(only_audio=True).first()
-    directory = ""
-    decision = "Y"
+    stages = [
+        ("download", download_stage), ("decode", decode_stage), ("transcribe", transcribe_stage), 
+        ("punctuate", punctuate_stage), ("summarize", summarize_stage),
+    ]
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages] + [queue.Queue()]
+    stats = {name: {"workers": workers[name], "items": 0, "busy_seconds": 0.0, "max_queue": 0, "queue_total": 0, "gets": 0} for name, _ in stages}
+    remaining = {name: workers[name] for name, _ in stages}
+    lock = threading.Lock()
+    done = object()     # passed down the queues once there are no more videos
 
-    while decision.capitalize().strip() == "Y":
-        print("\n")
-        print(
-            "Give a folder/directory to place the mp3 file or leave blank to leave it in current folder/directory"
-        )
-        directory = str(input(" >> "))
+    def run_stage(position: int) -> None:
+        name, stage = stages[position]
 
-        if len(directory) == 0:
-            directory = "."
+        while True:
+            item = queues[position].get()
 
-        print(
-            f"\nThe given directory for the audio file {name} is \033[1;35;40m '{directory}' \u001b[0m"
-        )
-        decision = input(
-            "Do you wish to change it?\nEnter \033[1;31;40m Y \u001b[0m to do so. Otherwise enter any key to continue: "
-        )
+            with lock:
+                depth = queues[position].qsize()
+                stats[name]["max_queue"] = max(stats[name]["max_queue"], depth)
+                stats[name]["queue_total"] += depth
+                stats[name]["gets"] += 1
+
+            if item is done:
+                break
+
+            # a video that failed earlier is only passed on
+            if item["error"] is None:
+                start = time.perf_counter()
+
+                # a missing module exits in _load, which must not take the whole stage down with it
+                try:
+                    stage(item)
+                except (Exception, SystemExit) as e:
+                    item["error"] = f"{name}: {e}"
+
+                with lock:
+                    stats[name]["busy_seconds"] += time.perf_counter() - start
+                    stats[name]["items"] += 1
+
+            queues[position + 1].put(item)
+
+        # the last thread of a stage to finish tells every thread of the next stage
+        with lock:
+            remaining[name] -= 1
+            last = remaining[name] == 0
+
+        if last:
+            for _ in range(workers[stages[position + 1][0]] if position + 1 < len(stages) else 1):
+                queues[position + 1].put(done)
+
+    threads = [threading.Thread(target=run_stage, args=(position,), daemon=True) for position, (name, _) in enumerate(stages) for _ in range(workers[name])]
+    start = time.perf_counter()
+
+    for thread in threads:
+        thread.start()
 
-    # download the audio
-    download = audio.download(output_path=directory)
+    for index, video in enumerate(videos):
+        queues[0].put({"index": index, "video": video, "path": None, "transcript": None, "text": None, "summary": None, "error": None})
 
-    # save the audio
-    base, ext = os.path.splitext(download)
-    audio_download = base + ".mp3"
-    os.rename(download, audio_download)
+    for _ in range(workers["download"]):
+        queues[0].put(done)
 
-    print(f"{name} has been downloaded\n")
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.perf_counter() - start
+    scratch.cleanup()
+
+    results = sorted(iter(queues[-1].get_nowait, done), key=lambda item: item["index"])
+
+    for name, stage_stats in stats.items():
+        stage_stats["throughput"] = round(stage_stats["items"] / elapsed, 4) if elapsed > 0 else 0.0
+        stage_stats["mean_queue"] = round(stage_stats.pop("queue_total") / stage_stats.pop("gets"), 2)
+        stage_stats["busy_seconds"] = round(stage_stats["busy_seconds"], 3)
+
+    stats["total_seconds"] = round(elapsed, 3)
+
+    return results, stats
 
-    # returns the title name with the 'mp3' appended to it
-    title = title + ".mp3"
-    return title
 
 def prompter() -> None:
     """
@@ -513,7 +2109,6 @@ def prompter() -> None:
         url = input("Enter the URL of the video: ")
         title = download(video=url)
 
-
         decision = input(
             f"Would you like to convert video to text?\nEnter \033[1;31;40m Y \u001b[0m to do so. Otherwise press any key to continue: "
         )
@@ -545,7 +2140,6 @@ def prompter() -> None:
 
         if decision.capitalize().strip() == "Y":
             title = convert_to_wav(filename=title)
-            
 
         decision = input(
             f"Would you like to download {output} video?\nEnter \033[1;31;40m Y \u001b[0m to do so. Otherwise press any key to exit: "
@@ -553,20 +2147,193 @@ def prompter() -> None:
 
 
 def own_mp3_prompter() -> None:
-    user_input = input("Enter the name of the MP3 file that you would like to convert to text. Otherwise type \033[1;31;40m'Exit'\u001b[0m")
+    """
+    Prompts the user for MP3 files in their directory and prints the summary of each one until they type 'Exit'.
 
-    while user_input != "E":
-        user_input = input("Enter the name of the MP3 file that you would like to convert to text. Otherwise type \033[1;31;40m'Exit'\u001b[0m")
-        user_input.strip()
+    Parameters
+    ----------
+    None
 
-        if ".mp3" in user_input:
-            pass
-        else:
-            user_input + ".mp3"
+    Returns
+    -------
+    None
+    """
+    user_input = input("Enter the name of the MP3 file that you would like to convert to text. Otherwise type \033[1;31;40m'Exit'\u001b[0m").strip()
+
+    while user_input.capitalize() not in ("Exit", "E"):
+        if ".mp3" not in user_input:
+            user_input = user_input + ".mp3"
 
         print(summarize_text_2(punctuate_text(mp3_to_text(user_input))))
-    
 
+        user_input = input("Enter the name of the MP3 file that you would like to convert to text. Otherwise type \033[1;31;40m'Exit'\u001b[0m").strip()
+
+
+def _job_id(job: dict) -> str:
+    """
+    Returns the ID of a job, the one given in the job file or a hash of the job.
+    """
+    if "id" in job:
+        return str(job["id"])
+
+    return hashlib.sha256(json.dumps(job, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def run_job(job: dict, fetch=download_audio) -> dict:
+    """
+    Runs one job of a batch: downloads the video (or takes a local MP3) and produces the outputs it asks for.
+
+    Parameters
+    ----------
+    job: dict
+        {"url": <YouTube URL>} or {"mp3": <MP3 file>}, with "stages" being any of "wav", "transcript" and "summary" 
+        (all of them by default). Optional: "id", "directory" for the download, "version" of the summarizer and 
+        "stream": true to transcribe a video while it downloads without saving it (see transcribe_url, only when 
+        the job does not ask for the "wav"), "tfidf": true to weigh the words of the summary of version 2 by 
+        TF-IDF over every transcript summarized that way (see CorpusStats), "wav_format": "source" (the default) 
+        for a .wav of the downloaded audio as it is or "pcm" for a 16 kHz mono one, which shares its decoding 
+        with the transcription.
+    fetch
+        The function that downloads the video, it takes the same arguments as download_audio and returns the path 
+        of the MP3 file. It can be swapped for a stand-in when testing.
+
+    Returns
+    -------
+    dict
+        The result record: "id", "status" ("ok" or "error"), the "outputs" of every stage, the "timings" of every 
+        step in seconds and the "error" if there was one.
+    """
+    stages = job.get("stages", ["wav", "transcript", "summary"])
+    record = {"id": _job_id(job), "status": "ok", "outputs": {}, "timings": {}, "error": None}
+    scratch = None  # holds the decoded audio while the job runs, see below
+    pcm = None
+
+    def timed(step: str, function, *args, **kwargs):
+        start = time.perf_counter()
+        output = function(*args, **kwargs)
+        record["timings"][step] = round(time.perf_counter() - start, 3)
+
+        return output
+
+    # a missing module exits in _load, which must only fail this job
+    try:
+        streamed = "url" in job and job.get("stream", False) and "wav" not in stages
+
+        # streamed, nothing is written to disk, so there is no "mp3" output and the download is timed with the 
+        # transcription
+        if not streamed:
+            if "url" in job:
+                mp3 = timed("download", fetch, video=job["url"], directory=job.get("directory", "."))
+
+                if mp3 is None:
+                    raise RuntimeError("the video could not be converted")
+            else:
+                mp3 = job["mp3"]
+
+            record["outputs"]["mp3"] = mp3
+
+        # a 16 kHz mono .wav is written from a PCM file, which a transcription that is not in the cache decodes 
+        # into for both
+        if "wav" in stages and job.get("wav_format", "source") == "pcm":
+            scratch = tempfile.TemporaryDirectory()
+            pcm = os.path.join(scratch.name, "audio.pcm")
+
+        if "transcript" in stages or "summary" in stages:
+            if streamed:
+                transcript = timed("transcribe", lambda: [segment["text"] for segment in transcribe_url(job["url"])])
+            else:
+                transcript = timed("transcribe", mp3_to_text, mp3, stream=True, pcm=pcm)
+
+            text = timed("punctuate", punctuate_text, transcript, windowed=True, print_text=False)
+
+            if "transcript" in stages:
+                record["outputs"]["transcript"] = text or ""
+
+            if "summary" in stages:
+                if job.get("version", 1) == 1:
+                    summarize = summarize_text
+                else:
+                    # counted in the corpus as the video (whatever form its URL has) or the audio, not as its words
+                    from youtube_download import video_key
+
+                    document = "video-" + video_key(job["url"]) if "url" in job else transcript_cache.audio_id(mp3)
+                    summarize = lambda text: summarize_text_2(text, corpus=corpus_stats if job.get("tfidf", False) else None, document=document)
+
+                record["outputs"]["summary"] = timed("summary", summarize, text) if text is not None else "There was nothing to summarize!"
+
+        if "wav" in stages:
+            if pcm is not None and not os.path.exists(pcm):
+                timed("decode", decode_to_pcm, mp3, pcm)
+
+            record["outputs"]["wav"] = timed("wav", convert_to_wav, filename=mp3, pcm=pcm)
+
+            if record["outputs"]["wav"] is None:
+                raise RuntimeError(f"{mp3} could not be converted to .wav")
+    except (Exception, SystemExit) as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+    finally:
+        if scratch is not None:
+            scratch.cleanup()
+
+    return record
+
+
+def run_jobs(jobs_file: str, output: str = None, workers: int = 2) -> list[dict]:
+    """
+    Runs every job of a JSONL job file (one job per line, see run_job) without prompting, several at once, and 
+    writes one JSONL result record per job as soon as it finishes. When the results go to a file, jobs that 
+    already succeeded in it are skipped, so a batch can be run again after a failure.
+
+    Parameters
+    ----------
+    jobs_file: str
+        The JSONL file of jobs.
+    output: str
+        The JSONL file the results are appended to, the standard output if None.
+    workers: int
+        The number of jobs run at the same time.
+
+    Returns
+    -------
+    list[dict]
+        The result records of the jobs that were run.
+    """
+    with open(jobs_file) as file:
+        jobs = [json.loads(line) for line in file if len(line.strip()) > 0]
+
+    finished = set()
+
+    if output is not None and os.path.exists(output):
+        with open(output) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+
+                if record.get("status") == "ok":
+                    finished.add(record["id"])
+
+    jobs = [job for job in jobs if _job_id(job) not in finished]
+    out = sys.stdout if output is None else open(output, "a")
+    lock = threading.Lock()
+
+    def run(job: dict) -> dict:
+        record = run_job(job)
+
+        with lock:
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+
+        return record
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(run, jobs))
+    finally:
+        if output is not None:
+            out.close()
 
 
 def main(argv) -> None:
@@ -578,18 +2345,82 @@ def main(argv) -> None:
     ----------
     argv
         Our arguments in the command line that are strings containing URLs to YouTube videos to convert. 
+        If the first one is --summarize, the videos are downloaded, transcribed and summarized in a pipeline 
+        instead and the program exits without prompting. `--jobs <file.jsonl> [--out <results.jsonl>] [--workers <n>]` 
+        runs a batch of jobs (see run_jobs) without prompting. `--transcribe <file.mp3> [--stream] [--vad energy|webrtc]` 
+        prints the transcript of a file segment by segment as it is transcribed, with the timings. Given a URL 
+        instead of a file, the video is transcribed while it downloads (see transcribe_url). `--live <file|pipe|-> 
+        [--frame <ms>]` transcribes a source as it comes (see live_blocks), showing the words while they are spoken. 
+        `--rebuild-corpus [<transcripts or folders>]` counts the TF-IDF statistics again (see rebuild_corpus).
     
     Returns
     -------
     None
     
     """
-    for link in argv:
-        download_audio(video=link)
+    if len(argv) > 1 and argv[0] == "--jobs":
+        options = dict(zip(argv[2::2], argv[3::2]))
+        run_jobs(argv[1], output=options.get("--out"), workers=int(options.get("--workers", 2)))
+        return
+
+    if len(argv) > 1 and argv[0] == "--transcribe":
+        vad = argv[argv.index("--vad") + 1] if "--vad" in argv[:-1] else None
+
+        if argv[1].startswith(("http://", "https://")):
+            segments = transcribe_url(argv[1], vad=vad)
+        else:
+            segments = iter_transcript(argv[1], stream="--stream" in argv, vad=vad)
+
+        for segment in segments:
+            print(f"[{segment['start']:>8.2f}s - {segment['end']:>8.2f}s] {segment['text']}")
+
+        return
+
+    if len(argv) > 0 and argv[0] == "--rebuild-corpus":
+        stats = rebuild_corpus(argv[1:] or None)
+        print(f"Counted {stats['documents']} transcripts with {stats['terms']} different words in {corpus_stats.path}")
+        return
+
+    if len(argv) > 1 and argv[0] == "--live":
+        frame = int(argv[argv.index("--frame") + 1]) if "--frame" in argv[:-1] else SESSION_FRAME
+
+        # the utterance in progress is rewritten in place until it is finished
+        session = RecognizerSession(
+            frame=frame, 
+            on_partial=lambda text: print(f"\r\033[K{text}", end="", flush=True),
+            on_result=lambda segment: print(f"\r\033[K[{segment['start']:>8.2f}s - {segment['end']:>8.2f}s] {segment['text']}", flush=True),
+        )
+        session.run(live_blocks(argv[1], frame=frame))
+        return
+
+    if len(argv) > 0 and argv[0] == "--summarize":
+        results, stats = run_pipeline(argv[1:])
 
+        for result in results:
+            print(f"\n\033[1;35;40m {result['video']} \u001b[0m")
+            print(result["summary"] if result["error"] is None else f"ERROR: {result['error']}")
+
+        print("\nstage       items  busy (s)  per second  max queue  mean queue")
+
+        for name, stage in stats.items():
+            if name != "total_seconds":
+                print(f"{name:<11} {stage['items']:>5}  {stage['busy_seconds']:>8}  {stage['throughput']:>10}  {stage['max_queue']:>9}  {stage['mean_queue']:>10}")
+
+        print(f"total {stats['total_seconds']} seconds")
+        return
 
     if len(argv) > 0:
-        print("All the given videos have been downloaded!")
+        from youtube_download import download_many, audio_cache
+
+        results = download_many(argv, fetch=download_audio)
+        failed = [result["video"] for result in results if result["error"] is not None]
+
+        if len(failed) == 0:
+            print("All the given videos have been downloaded!")
+        else:
+            print(f"{len(failed)} of the given videos could not be downloaded: {', '.join(failed)}")
+
+        print(audio_cache.report())
 
 
     prompter()